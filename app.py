@@ -1,21 +1,68 @@
-import os, uuid, shutil, time
+import os, uuid, time
 import matplotlib.pyplot as plt
 import streamlit as st
 import pandas as pd
 import diatribe.el_audio as el_audio
+import diatribe.jobs as jobs
 from dotenv import load_dotenv
-from diatribe.dialogues import Character, Dialogue, get_voice_id, save_dialogue, characters_match, export_dialogue
-from diatribe.sidebar import create_sidebar
+from diatribe.dialogues import Character, CharacterRegistry, Dialogue, save_dialogue, characters_match, export_dialogue
+from diatribe.sidebar import SidebarData, create_sidebar, get_usage_percent
 from diatribe.saved_dialogues import get_selected_characters, get_selected_dialogue, on_load_saved, create_saved_dialogues
 from diatribe.generate import create_dialogue_generation, create_continue_dialogue
 from diatribe.utils import log
-from diatribe.audio_edit import create_edit_dialogue_line
+from diatribe.audio_edit import create_edit_dialogue_line, create_batch_edit
+from diatribe.tasks import synthesize_task, join_task, background_task, project_task, batch_edit_task, pipeline_task, scenes_task
+from diatribe.manifest import update_manifest_line, plan_resynthesis, manifest_signature, line_key
+from diatribe.quota import QuotaPlan, plan_quota, remaining_characters
 
 load_dotenv()
 plt.style.use('dark_background')
 
+JOB_POLL_SECONDS = 0.5
+running_jobs: list[jobs.Job] = []
+
 def show_final_audio() -> bool:
   return "final_audio" in st.session_state and st.session_state.final_audio
+
+def get_session_job(key: str) -> jobs.Job:
+  """Get the background job whose ID is stored in the session state under the key."""
+  job_id = st.session_state.get(key)
+  if job_id is None:
+    return None
+  job = jobs.get_job(st.session_state.session_id, job_id)
+  if job is None:
+    del st.session_state[key]
+  return job
+
+def poll_job(key: str, progress_text: str) -> jobs.Job:
+  """
+  Show the progress of a background job while it runs and schedule a rerun to check on it again.
+  Once the job has finished it is returned a single time and forgotten by the session.
+  """
+  job = get_session_job(key)
+  if job is None:
+    return None
+  if job.active:
+    st.progress(job.progress, text=job.message or progress_text)
+    running_jobs.append(job)
+  else:
+    del st.session_state[key]
+    jobs.forget_job(job.job_id)
+  return job
+
+def estimate_synthesis(dialogue: list[Dialogue], sidebar_data: SidebarData, remaining: int) -> (list[Dialogue], QuotaPlan):
+  """
+  Plan which lines need synthesizing and what they will bill. The plan is kept in the session
+  and only made again once the dialogue, voice settings, line files or remaining quota change.
+  """
+  audio_dir = el_audio.get_audio_dir()
+  signature = (manifest_signature(audio_dir), tuple(line_key(line, sidebar_data) for line in dialogue), remaining)
+  estimate = st.session_state.get("synthesis_estimate")
+  if estimate is None or estimate[0] != signature:
+    pending_lines = plan_resynthesis(dialogue, sidebar_data, audio_dir).synthesize
+    estimate = (signature, pending_lines, plan_quota(pending_lines, sidebar_data, remaining))
+    st.session_state["synthesis_estimate"] = estimate
+  return estimate[1], estimate[2]
     
 
 if __name__ == "__main__":
@@ -73,16 +120,9 @@ if __name__ == "__main__":
   
   characters_available = not character_table.empty
   if characters_available:
-    characters: list[Character] = []
-    for _, row in character_table.iterrows():
-      c = Character(
-        row["Name"], 
-        row["Voice"], 
-        get_voice_id(row["Voice"], sidebar.voices),
-        description=row["Description"]
-      )
-      characters.append(c)
-    character_names = [character.name for character in characters]
+    characters = Character.from_dataframe(character_table, sidebar.voices)
+    character_registry = CharacterRegistry(characters)
+    character_names = character_registry.names()
     
     st.header("Dialogue")
     if sidebar.enable_instructions:
@@ -90,6 +130,75 @@ if __name__ == "__main__":
     
     generated_dialogue = create_dialogue_generation(sidebar, saves, characters)
 
+    # generate the audio while the dialogue is being written
+    pipeline_request = st.session_state.pop("pipeline_request", None)
+    if pipeline_request:
+      st.session_state["final_audio"] = False
+      el_audio.clear_joined_audio()
+      for key in ["audio_process_error", "audio_files", "deferred_lines", "pipeline_metrics"]:
+        if key in st.session_state:
+          del st.session_state[key]
+      pipeline_job = jobs.submit_job(
+        st.session_state.session_id,
+        "pipeline",
+        pipeline_task,
+        pipeline_request["system_prompt"],
+        pipeline_request["input_prompt"],
+        characters,
+        sidebar,
+        el_audio.get_audio_dir(),
+        sidebar.synthesis_concurrency,
+        pipeline_request["expected_lines"]
+      )
+      st.session_state["pipeline_job"] = pipeline_job.job_id
+    pipeline_job = poll_job("pipeline_job", "Generating dialogue and audio...")
+    if pipeline_job and pipeline_job.active:
+      ready_lines = set(pipeline_job.data.get("ready_lines", []))
+      for i, row in enumerate(pipeline_job.data.get("rows", []), 1):
+        st.markdown(f"`{i}.` **{row['Speaker']}**: \"{row['Text']}\"")
+        if i in ready_lines:
+          st.audio(f"{el_audio.get_audio_dir()}/line{i}.mp3")
+    elif pipeline_job:
+      get_usage_percent.clear()
+      if pipeline_job.status == "failed":
+        log(pipeline_job.error)
+        st.error("An error occured while generating the dialogue. Please try again.")
+      else:
+        result = pipeline_job.result
+        log(f"lines produced: {len(result['rows'])}")
+        generated_dialogue = pd.DataFrame(result["rows"], columns=["Speaker", "Text"])
+        st.session_state["audio_files"] = result["audio_files"]
+        st.session_state["pipeline_metrics"] = result["metrics"]
+        if result["failed"]:
+          st.error(f"""An error occured while generating the audio. Please check your API key.
+          Error occurred while processing: {result["failed"]}
+          """)
+
+    # write a long-form script scene by scene
+    scenes_request = st.session_state.pop("scenes_request", None)
+    if scenes_request:
+      for key in ["audio_files", "final_audio"]:
+        if key in st.session_state:
+          del st.session_state[key]
+      scenes_job = jobs.submit_job(
+        st.session_state.session_id,
+        "scenes",
+        scenes_task,
+        characters,
+        scenes_request["plot"],
+        scenes_request["number_of_lines"],
+        sidebar
+      )
+      st.session_state["scenes_job"] = scenes_job.job_id
+    scenes_job = poll_job("scenes_job", "Writing scenes...")
+    if scenes_job and scenes_job.status == "failed":
+      log(scenes_job.error)
+      st.error("An error occured while generating the dialogue. Please try again.")
+    elif scenes_job and not scenes_job.active:
+      log(f"lines produced: {len(scenes_job.result['rows'])}")
+      generated_dialogue = pd.DataFrame(scenes_job.result["rows"], columns=["Speaker", "Text"])
+      st.session_state["story_summary"] = scenes_job.result["summary"]
+
     if "generated_dialogue" in st.session_state:
       characters_matched = characters_match(character_table, st.session_state["generated_dialogue"])
       if not characters_matched:
@@ -139,15 +248,7 @@ if __name__ == "__main__":
     
     # extract Dialogues from the dialogue table
     if not dialogue_table.empty:
-      dialogue: list[Dialogue] = []
-      for i, row in dialogue_table.iterrows():
-        try:
-          character_index = character_names.index(row["Speaker"])
-          character = characters[character_index]
-          dialogue.append(Dialogue(character, i+1, row["Text"]))
-        except:
-          print(f"Error: {row['Speaker']} is not a valid character.")
-          pass        
+      dialogue = Dialogue.from_dataframe(dialogue_table, character_registry, line_offset=1)
       dialogue.sort(key=lambda x: x.line)
       
       # continue generated dialogue
@@ -160,12 +261,29 @@ if __name__ == "__main__":
             st.rerun()
       
       # generate audio dialogue files
+      synthesis_running = get_session_job("synthesis_job") is not None or get_session_job("pipeline_job") is not None
+      remaining = None
+      if sidebar.el_key and not synthesis_running:
+        # pre-flight estimate of the characters the changed lines will bill
+        remaining = remaining_characters(get_usage_percent(sidebar.el_key))
+        pending_lines, quota_plan = estimate_synthesis(dialogue, sidebar, remaining)
+        if pending_lines:
+          st.caption(
+            f"Generating will bill about {quota_plan.billed_characters + quota_plan.deferred_characters:,} characters "
+            f"for {len(pending_lines) - len(quota_plan.cached)} lines ({len(quota_plan.cached)} lines cached) "
+            f"with {remaining:,} characters remaining."
+          )
+        if not quota_plan.fits:
+          st.warning(
+            f"Not enough characters remain for the whole dialogue. Lines {quota_plan.deferred[0].line} onward "
+            f"({quota_plan.deferred_characters:,} characters) will be skipped until your quota resets."
+          )
       existing_audio_files = el_audio.get_generated_audio()
       show_existing_audio_files = len(existing_audio_files) > 0 and "imported_file" in st.session_state
       if show_existing_audio_files:
         col1, col2 = st.columns([1, 1])
         with col1:      
-          generate_btn = st.button("Generate Audio Dialogue", use_container_width=True) 
+          generate_btn = st.button("Generate Audio Dialogue", use_container_width=True, disabled=synthesis_running) 
         with col2:
           use_existing_btn = st.button(
             "Use Existing Audio", 
@@ -174,25 +292,40 @@ if __name__ == "__main__":
           if use_existing_btn:
             st.session_state["audio_files"] = existing_audio_files
       else:
-        generate_btn = st.button("Generate Audio Dialogue", use_container_width=True)
+        generate_btn = st.button("Generate Audio Dialogue", use_container_width=True, disabled=synthesis_running)
       if generate_btn:
         st.session_state["final_audio"] = False
-        el_audio.clear_audio_files()
-        audio_files: list[str] = []
-        progress_text = "Generating audio..."
-        if "audio_process_error" in st.session_state:
-          del st.session_state["audio_process_error"]
-        generate_audio_bar = st.progress(0, text=progress_text)
-        for i, line in enumerate(dialogue):
-          try:
-            audio_file = el_audio.generate_and_save(line.text, line.character.voice_id, line.line, sidebar) 
-            audio_files.append(audio_file)
-          except Exception as e:
-            print(e)
-            st.session_state["audio_process_error"] = f"{line.character.name} with the voice {line.character.voice} (voice_id: {line.character.voice_id})"
-            break
-          generate_audio_bar.progress(round((i+1) / len(dialogue), 2), text=progress_text)          
-        generate_audio_bar.empty()
+        el_audio.clear_joined_audio()
+        for key in ["audio_process_error", "audio_files", "pipeline_metrics"]:
+          if key in st.session_state:
+            del st.session_state[key]
+        synthesis_job = jobs.submit_job(
+          st.session_state.session_id,
+          "synthesize",
+          synthesize_task,
+          dialogue,
+          sidebar,
+          el_audio.get_audio_dir(),
+          sidebar.synthesis_concurrency,
+          remaining
+        )
+        st.session_state["synthesis_job"] = synthesis_job.job_id
+      
+      synthesis_job = poll_job("synthesis_job", "Generating audio...")
+      if synthesis_job and synthesis_job.active:
+        if sidebar.enable_streaming:
+          ready_lines = set(synthesis_job.data.get("ready_lines", []))
+          for line in dialogue:
+            if line.line in ready_lines:
+              st.markdown(f"`{line.line}.` **{line.character.name}**: \"{line.text}\"")
+              st.audio(f"{el_audio.get_audio_dir()}/line{line.line}.mp3")
+      elif synthesis_job:
+        # the synthesis used characters so look the usage up again
+        get_usage_percent.clear()
+        if synthesis_job.status == "failed":
+          st.session_state["audio_process_error"] = synthesis_job.error
+        elif synthesis_job.result["failed"]:
+          st.session_state["audio_process_error"] = synthesis_job.result["failed"]
         
         if "audio_process_error" in st.session_state:
           st.error(f"""An error occured while generating the audio. Please check your API key.
@@ -201,23 +334,71 @@ if __name__ == "__main__":
           if "audio_files" in st.session_state:
             del st.session_state["audio_files"]
         else:
-          st.session_state["audio_files"] = audio_files
+          st.session_state["audio_files"] = synthesis_job.result["audio_files"]
+          if synthesis_job.result["deferred_lines"]:
+            st.session_state["deferred_lines"] = synthesis_job.result["deferred_lines"]
+          elif "deferred_lines" in st.session_state:
+            del st.session_state["deferred_lines"]
       
       if saves.prepare_project:
         export_dialogue(character_table, dialogue_table, sidebar.voices, f"./session/{st.session_state.session_id}/export/dialogue.txt")
-        el_audio.export_audio()
-        project_path = f"./session/{st.session_state.session_id}/project"
-        os.makedirs(project_path, exist_ok=True)
-        shutil.make_archive(f"{project_path}/project", "zip", f"./session/{st.session_state.session_id}/export")
+        project_job = jobs.submit_job(
+          st.session_state.session_id,
+          "project",
+          project_task,
+          el_audio.get_audio_dir(),
+          f"./session/{st.session_state.session_id}/export",
+          f"./session/{st.session_state.session_id}/project"
+        )
+        st.session_state["project_job"] = project_job.job_id
+      project_job = poll_job("project_job", "Preparing project...")
+      if project_job and project_job.status == "done":
         st.rerun()
+      elif project_job and project_job.status == "failed":
+        st.error(f"An error occured while preparing the project: {project_job.error}")
       
       if "audio_files" in st.session_state:   
         # display generated audio
         st.header("Audio Dialogue")
+        if "deferred_lines" in st.session_state:
+          st.warning(f"{len(st.session_state.deferred_lines)} lines were skipped because your character quota ran out. Click `Generate Audio Dialogue` after it resets to generate them.")
+        if "pipeline_metrics" in st.session_state:
+          metrics = st.session_state.pipeline_metrics
+          st.caption(
+            f"Wrote and voiced {metrics['lines']} lines ({metrics['reused']} reused) in {metrics['total']:.1f}s: first line written after {metrics['first_row'] or 0:.1f}s, "
+            f"first audio after {metrics['first_audio'] or 0:.1f}s, writing finished after {metrics['generation']:.1f}s. "
+            f"Each line took {metrics['average_synthesis']:.1f}s to voice after waiting {metrics['average_queue_wait']:.1f}s on average."
+          )
         if sidebar.enable_instructions:
           st.markdown("The dialogue text has now been coverted into audio. You can listen to the audio by clicking the play button. If you want to regenerate the audio, you can click the `Generate Audio Dialogue` button above. If you are happy with the audio, you can join the audio files together by clicking the `Join Dialogue` button below. You can also click the `Redo` button to regenerate the audio for a specific line.")
-          with st.expander("**WARNING**: deleting dialogue lines requires audio regeneration"):
-            st.info("If you delete dialogue lines, you will have to regenerate the audio by clicking the `Generate Audio Dialogue` button above. Adding or modifying dialogue lines will not require regeneration of all lines, but you will likely need to click the `Redo` button for the affected lines.")
+          with st.expander("**NOTE**: only changed dialogue lines are regenerated"):
+            st.info("Clicking `Generate Audio Dialogue` again only generates audio for lines that were added or whose text, speaker, or voice settings changed. Lines that moved because rows were added or deleted keep their existing audio, including any edits.")
+
+        if sidebar.enable_audio_editing:
+          batch_running = get_session_job("batch_job") is not None
+          batch_lines, batch_preset = create_batch_edit(dialogue, disabled=batch_running)
+          if batch_lines:
+            batch_files = [f"{el_audio.get_audio_dir()}/line{line.line}.mp3" for line in batch_lines]
+            batch_job = jobs.submit_job(
+              st.session_state.session_id,
+              "batch_edit",
+              batch_edit_task,
+              [f for f in batch_files if os.path.exists(f)],
+              batch_preset
+            )
+            st.session_state["batch_job"] = batch_job.job_id
+          batch_job = poll_job("batch_job", "Applying batch edits...")
+          if batch_job and batch_job.status == "failed":
+            st.error(f"An error occured while applying the batch edits: {batch_job.error}")
+          elif batch_job and not batch_job.active:
+            result = batch_job.result
+            st.toast(
+              f"Edited {len(result['audio_files'])} lines in {result['elapsed']:.1f}s "
+              f"({result['lines_per_second']:.1f} lines/s, {result['realtime_factor']:.0f}x realtime)",
+              icon="👍"
+            )
+            if result["failed"]:
+              st.error(f"Some lines could not be edited: {', '.join(os.path.basename(f) for f in result['failed'])}")
                     
         for i, line in enumerate(dialogue):
           st.markdown(f"#### `{i + 1}.` **{line.character.name}**: \"{line.text}\"")
@@ -238,7 +419,9 @@ if __name__ == "__main__":
             redo_btn = st.button("Redo", key=redo_key)
           if redo_btn:
             with st.spinner("Generating audio..."):
-              el_audio.generate_and_save(line.text, line.character.voice_id, line.line, sidebar)
+              # a redo asks for a new take instead of the cached one
+              el_audio.generate_and_save(line.text, line.character.voice_id, line.line, sidebar, use_cache=False)
+              update_manifest_line(el_audio.get_audio_dir(), line, sidebar)
             st.rerun()
             
           # dialogue audio editing
@@ -248,11 +431,31 @@ if __name__ == "__main__":
           
       # join final audio
       if "audio_files" in st.session_state:
-        join_dialogue = st.button("Join Dialogue", use_container_width=True)
+        join_running = get_session_job("join_job") is not None
+        join_dialogue = st.button("Join Dialogue", use_container_width=True, disabled=join_running)
         line_indices = [d.line for d in dialogue]
         if join_dialogue:          
-          el_audio.join_audio(line_indices, sidebar.join_gap, sidebar.enable_normalization)
+          audio_files = [f"{el_audio.get_audio_dir()}/line{i}.mp3" for i in line_indices]
+          audio_files = [f for f in audio_files if os.path.exists(f)]
+          log(f"joining {len(audio_files)} audio files: {line_indices}")
+          join_job = jobs.submit_job(
+            st.session_state.session_id,
+            "join",
+            join_task,
+            audio_files,
+            f"{el_audio.get_audio_dir()}/dialogue.mp3",
+            sidebar.join_gap,
+            sidebar.enable_normalization
+          )
+          st.session_state["join_job"] = join_job.job_id
+          st.session_state["final_audio"] = False
+        join_job = poll_job("join_job", "Joining audio...")
+        if join_job and join_job.status == "done":
           st.session_state["final_audio"] = True
+          if "background_added" in st.session_state:
+            del st.session_state["background_added"]
+        elif join_job and join_job.status == "failed":
+          st.error(f"An error occured while joining the audio: {join_job.error}")
       
       # show final audio
       if show_final_audio():
@@ -280,11 +483,28 @@ if __name__ == "__main__":
           with background_volume:
             lower_db = st.slider("Lower Background Volume (dB)", 0, 25, 0, 1, help="lowers the background audio by specified decibels")
 
-          add_background_btn = st.button("Add Background", use_container_width=True)
+          background_running = get_session_job("background_job") is not None
+          add_background_btn = st.button("Add Background", use_container_width=True, disabled=background_running)
           if add_background_btn and background_name:
-            with st.spinner("Adding background audio..."):
-              el_audio.apply_background_audio(background_name, fade_in, fade_out, lower_db, sidebar.enable_normalization)
-              st.toast("Background audio has been added.", icon="👍")
+            background_job = jobs.submit_job(
+              st.session_state.session_id,
+              "background",
+              background_task,
+              el_audio.get_background_file(background_name),
+              f"{el_audio.get_audio_dir()}/dialogue.mp3",
+              f"{el_audio.get_audio_dir()}/dialogue_background.mp3",
+              fade_in,
+              fade_out,
+              lower_db,
+              sidebar.enable_normalization
+            )
+            st.session_state["background_job"] = background_job.job_id
+          background_job = poll_job("background_job", "Adding background audio...")
+          if background_job and background_job.status == "done":
+            st.session_state["background_added"] = True
+            st.toast("Background audio has been added.", icon="👍")
+          elif background_job and background_job.status == "failed":
+            st.error(f"An error occured while adding the background audio: {background_job.error}")
         
         if "background_added" in st.session_state:
           log("using background audio")
@@ -307,15 +527,28 @@ if __name__ == "__main__":
           with col1:
             st.markdown("<p style='font-size:14px'>Original</p>", unsafe_allow_html=True)
             st.audio(org_path)    
-            st.pyplot(org_plot)
+            st.image(org_plot, use_column_width=True)
           with col2:
             st.markdown("<p style='font-size:14px'>Normalized</p>", unsafe_allow_html=True)
             st.audio(normalized_path)                      
-            st.pyplot(normalized_plot)
+            st.image(normalized_plot, use_column_width=True)
         else:                  
           st.audio(dialogue_path)
-          _, fig = el_audio.generate_waveform_from_file(dialogue_path)       
-          st.pyplot(fig)
+          dialogue_duration = el_audio.get_audio_duration(dialogue_path)
+          if dialogue_duration and dialogue_duration > 1:
+            timeline = st.slider(
+              "Timeline (seconds)",
+              0.0,
+              round(dialogue_duration, 1),
+              (0.0, round(dialogue_duration, 1)),
+              0.1,
+              key="timeline_zoom",
+              help="Zoom the waveform into part of the dialogue."
+            )
+          else:
+            timeline = (0.0, None)
+          _, fig = el_audio.generate_waveform_from_file(dialogue_path, start=timeline[0], end=timeline[1])       
+          st.image(fig, use_column_width=True)
           
         with open(dialogue_path, "rb") as mp3_audio:
           st.download_button(
@@ -325,4 +558,8 @@ if __name__ == "__main__":
             mime="audio/mp3",
             use_container_width=True
           )
-    
\ No newline at end of file
+
+  # check on background jobs again until they finish
+  if running_jobs:
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,111 @@
+"""
+Golden check that the NumPy basic edits produce byte identical audio to the pydub chain, and time both.
+A fixed set of edge cases runs first, then random cases from the seed. Exits non zero if any case differs,
+so run it after changing diatribe/basic_edit.py.
+
+python bench/basic_edit_check.py --cases 300 --seconds 8
+"""
+import argparse, os, sys, random, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+from pydub import AudioSegment as seg
+from diatribe.basic_edit import apply_basic_edits, apply_basic_segments
+
+def make_audio(seconds: float, frame_rate: int, channels: int, sample_width: int, rng: np.random.Generator) -> seg:
+  """Noise with full scale peaks so clipping and rounding are exercised."""
+  dtype = {2: np.int16, 4: np.int32}[sample_width]
+  info = np.iinfo(dtype)
+  frames = int(seconds * frame_rate) + int(rng.integers(0, frame_rate // 1000 + 1))
+  samples = rng.integers(info.min, info.max, size=(frames, channels), dtype=np.int64, endpoint=True).astype(dtype)
+  return seg(samples.tobytes(), frame_rate=frame_rate, channels=channels, sample_width=sample_width)
+
+def random_edits(duration: int, rng: random.Random) -> dict:
+  """Slider values the edit tab can produce, biased towards the edges."""
+  def pick(low: int, high: int) -> int:
+    return rng.choice([0, low, high, rng.randint(low, high)])
+  trim = sorted([pick(0, duration), pick(0, duration)])
+  fade = sorted([pick(0, duration), pick(0, duration)])
+  return {
+    "volume": rng.choice([0, rng.randint(-25, 25)]),
+    "trim_in": trim[0],
+    "trim_out": duration - trim[1],
+    "extend_in": rng.choice([0, pick(0, 5000), rng.randint(1, 100)]),
+    "extend_out": rng.choice([0, pick(0, 5000), rng.randint(1, 100)]),
+    "fade_in": rng.choice([fade[0], rng.randint(1, 100)]),
+    "fade_out": rng.choice([duration - fade[1], rng.randint(1, 100)])
+  }
+
+def edge_cases(duration: int) -> list[dict]:
+  """Edits at the limits of the sliders for audio of the duration in milliseconds."""
+  none = dict(volume=0, trim_in=0, trim_out=0, extend_in=0, extend_out=0, fade_in=0, fade_out=0)
+  return [
+    none,
+    {**none, "volume": 25},
+    {**none, "volume": -25},
+    {**none, "trim_in": duration},
+    {**none, "trim_out": duration},
+    {**none, "trim_in": duration // 2, "trim_out": duration - duration // 2},
+    {**none, "extend_in": 1},
+    {**none, "extend_in": 5000, "extend_out": 5000},
+    {**none, "fade_in": duration},
+    {**none, "fade_out": duration},
+    {**none, "fade_in": duration + 100, "fade_out": duration + 100},
+    {**none, "trim_in": 10, "fade_in": duration},
+    dict(volume=-10, trim_in=1, trim_out=1, extend_in=17, extend_out=33, fade_in=50, fade_out=50)
+  ]
+
+def check(audio: seg, edits: dict) -> (bool, float, float):
+  """Run both chains on the audio, returning whether they agree and the time each took."""
+  start = time.perf_counter()
+  try:
+    expected = apply_basic_segments(audio, **edits).raw_data
+  except Exception as e:
+    expected = type(e)
+  pydub_time = time.perf_counter() - start
+  start = time.perf_counter()
+  try:
+    actual = apply_basic_edits(audio, **edits).raw_data
+  except Exception as e:
+    actual = type(e)
+  numpy_time = time.perf_counter() - start
+  return expected == actual, pydub_time, numpy_time
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Check and time the NumPy basic edits against pydub.")
+  parser.add_argument("--cases", type=int, default=300)
+  parser.add_argument("--seconds", type=float, default=8)
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  rng = random.Random(args.seed)
+  np_rng = np.random.default_rng(args.seed)
+  failures = total = 0
+  pydub_time = numpy_time = 0.0
+  for frame_rate, channels, sample_width, seconds in [(44100, 1, 2, 1), (24000, 2, 2, 0.05), (48000, 2, 4, 2), (22050, 1, 4, 0.001)]:
+    audio = make_audio(seconds, frame_rate, channels, sample_width, np_rng)
+    for edits in edge_cases(int(audio.duration_seconds * 1000)):
+      total += 1
+      matches, _, _ = check(audio, edits)
+      if not matches:
+        failures += 1
+        print(f"edge case differs: {frame_rate}Hz {channels}ch {sample_width * 8}bit {edits}")
+
+  for case in range(args.cases):
+    frame_rate = rng.choice([16000, 22050, 24000, 44100, 48000])
+    channels = rng.choice([1, 2])
+    sample_width = rng.choice([2, 2, 4])
+    audio = make_audio(rng.uniform(0.05, args.seconds), frame_rate, channels, sample_width, np_rng)
+    edits = random_edits(int(audio.duration_seconds * 1000), rng)
+    total += 1
+    matches, pydub_case, numpy_case = check(audio, edits)
+    pydub_time += pydub_case
+    numpy_time += numpy_case
+    if not matches:
+      failures += 1
+      print(f"case {case} differs: {frame_rate}Hz {channels}ch {sample_width * 8}bit {edits}")
+  print(f"{total - failures}/{total} cases identical")
+  print(f"pydub {pydub_time:.2f}s, numpy {numpy_time:.2f}s ({pydub_time / max(numpy_time, 1e-9):.1f}x)")
+  sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+  main()
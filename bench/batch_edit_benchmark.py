@@ -0,0 +1,51 @@
+"""
+Compare applying a soundboard preset line by line on one core against the batch edit process pool.
+
+python bench/batch_edit_benchmark.py --lines 40 --line-ms 4000
+"""
+import argparse, os, sys, shutil, tempfile, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydub.generators import Sine
+from diatribe.batch_edit import BatchPreset, BATCH_WORKERS, apply_preset, render_line
+from diatribe.soundboard import Soundboard
+
+ROBOT_PRESET = BatchPreset(
+  volume=2,
+  fade_in=50,
+  fade_out=200,
+  soundboard=Soundboard(chorus_rate_hz=8.0, chorus_depth=0.6, chorus_centre_delay=7.0, reverb_room_size=0.3, reverb_damping=0.5, reverb_web_level=0.33, reverb_dry_level=0.4, distortion_db=12)
+)
+
+def make_lines(audio_dir: str, lines: int, line_ms: int) -> list[str]:
+  template = f"{audio_dir}/template.mp3"
+  Sine(220).to_audio_segment(line_ms).set_channels(1).export(template, format="mp3")
+  audio_files = [f"{audio_dir}/line{i}.mp3" for i in range(1, lines + 1)]
+  for audio_file in audio_files:
+    shutil.copy(template, audio_file)
+  return audio_files
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark batch soundboard rendering.")
+  parser.add_argument("--lines", type=int, default=40)
+  parser.add_argument("--line-ms", type=int, default=4000)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as audio_dir:
+    audio_files = make_lines(audio_dir, args.lines, args.line_ms)
+    start = time.perf_counter()
+    for audio_file in audio_files:
+      render_line(audio_file, ROBOT_PRESET)
+    sequential = time.perf_counter() - start
+    print(f"sequential: {sequential:6.2f}s ({args.lines / sequential:.1f} lines/s)")
+
+    audio_files = make_lines(audio_dir, args.lines, args.line_ms)
+    # start the pool outside the timing, the app keeps it running between batches
+    apply_preset(audio_files[:1], ROBOT_PRESET)
+    result = apply_preset(audio_files, ROBOT_PRESET)
+    print(
+      f"pool ({BATCH_WORKERS} workers): {result.elapsed:6.2f}s ({result.lines_per_second:.1f} lines/s, "
+      f"{result.realtime_factor:.0f}x realtime, {sequential / result.elapsed:.1f}x faster)"
+    )
+
+if __name__ == "__main__":
+  main()
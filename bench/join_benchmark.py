@@ -0,0 +1,46 @@
+"""
+Compare the pairwise AudioSegment concatenation join against the streaming joiner.
+
+python bench/join_benchmark.py --lines 50 100 200 400
+"""
+import argparse, os, sys, tempfile, time, tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pydub import AudioSegment as seg
+from pydub.generators import Sine
+from diatribe.el_audio import join_audio_files
+
+def pairwise_join(audio_files: list[str], output_file: str, join_gap: int) -> None:
+  """The original join, kept here as the baseline."""
+  gap = seg.silent(join_gap)
+  segments = [seg.from_mp3(f) for f in audio_files]
+  final_audio = segments[0]
+  for s in segments[1:]:
+    final_audio += gap + s
+  final_audio.export(output_file, format="mp3")
+
+def measure(join, audio_files: list[str], output_file: str) -> (float, float):
+  tracemalloc.start()
+  start = time.perf_counter()
+  join(audio_files, output_file, 200)
+  elapsed = time.perf_counter() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return elapsed, peak / 1024 / 1024
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark joining dialogue lines.")
+  parser.add_argument("--lines", type=int, nargs="+", default=[50, 100, 200, 400])
+  parser.add_argument("--line-ms", type=int, default=3000)
+  args = parser.parse_args()
+
+  with tempfile.TemporaryDirectory() as audio_dir:
+    line_file = f"{audio_dir}/line.mp3"
+    Sine(220).to_audio_segment(args.line_ms).set_channels(1).export(line_file, format="mp3")
+    for lines in args.lines:
+      audio_files = [line_file] * lines
+      for name, join in [("pairwise", pairwise_join), ("streaming", join_audio_files)]:
+        elapsed, peak_mb = measure(join, audio_files, f"{audio_dir}/dialogue_{name}.mp3")
+        print(f"{name:>9} lines={lines:>4} elapsed={elapsed:6.2f}s peak={peak_mb:8.1f}MB")
+
+if __name__ == "__main__":
+  main()
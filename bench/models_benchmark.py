@@ -0,0 +1,54 @@
+"""
+Time building characters and dialogue from the data editor tables and serializing them for very large scripts.
+
+python bench/models_benchmark.py --lines 10000 50000 --characters 200
+"""
+import argparse, json, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from diatribe.dialogues import Character, CharacterRegistry, Dialogue, dumps_dialogue_details
+
+def timed(fn) -> (object, float):
+  start = time.perf_counter()
+  result = fn()
+  return result, (time.perf_counter() - start) * 1000
+
+def iterrows_build(characters_df: pd.DataFrame, dialogue_df: pd.DataFrame) -> list[Dialogue]:
+  """The original row by row construction, kept here as the baseline."""
+  characters = [Character(r["Name"], r["Voice"], "", description=r["Description"]) for _, r in characters_df.iterrows()]
+  registry = CharacterRegistry(characters)
+  return [Dialogue(registry.get(r["Speaker"]), i + 1, r["Text"]) for i, r in dialogue_df.iterrows()]
+
+def vectorized_build(characters_df: pd.DataFrame, dialogue_df: pd.DataFrame) -> list[Dialogue]:
+  registry = CharacterRegistry(Character.from_dataframe(characters_df, []))
+  return Dialogue.from_dataframe(dialogue_df, registry, line_offset=1)
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark dialogue models.")
+  parser.add_argument("--lines", type=int, nargs="+", default=[10000, 50000])
+  parser.add_argument("--characters", type=int, default=200)
+  args = parser.parse_args()
+
+  characters_df = pd.DataFrame(
+    [{"Name": f"Character {i}", "Voice": f"Voice {i}", "Description": ""} for i in range(args.characters)],
+    columns=["Name", "Voice", "Description"]
+  )
+  for lines in args.lines:
+    dialogue_df = pd.DataFrame(
+      [{"Speaker": f"Character {i % args.characters}", "Text": f"Line {i}"} for i in range(lines)],
+      columns=["Speaker", "Text"]
+    )
+    _, iterrows_ms = timed(lambda: iterrows_build(characters_df, dialogue_df))
+    dialogue, vectorized_ms = timed(lambda: vectorized_build(characters_df, dialogue_df))
+    _, first_dict_ms = timed(lambda: [d.to_dict() for d in dialogue])
+    details, cached_dict_ms = timed(lambda: {"characters": [], "plot": "", "dialogue": [d.to_dict() for d in dialogue]})
+    _, json_ms = timed(lambda: json.dumps(details, indent=2))
+    _, fast_json_ms = timed(lambda: dumps_dialogue_details(details))
+    print(
+      f"lines={lines:>6} iterrows={iterrows_ms:8.1f}ms vectorized={vectorized_ms:7.1f}ms "
+      f"to_dict={first_dict_ms:6.1f}ms cached to_dict={cached_dict_ms:6.1f}ms "
+      f"json={json_ms:7.1f}ms encoder={fast_json_ms:7.1f}ms"
+    )
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,50 @@
+"""
+Compare linear speaker resolution against the character registry on synthetic dialogues.
+
+python bench/registry_benchmark.py --lines 1000 5000 10000 --characters 200
+"""
+import argparse, os, sys, time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from diatribe.dialogues import Character, CharacterRegistry, Dialogue, parse_saved_dialogue
+
+def synthetic_save(lines: int, characters: int) -> dict:
+  return {
+    "characters": [
+      {"Name": f"Character {i}", "Voice": f"Voice {i}", "Voice_ID": f"voice{i}", "Description": ""}
+      for i in range(characters)
+    ],
+    "plot": "",
+    "dialogue": [
+      {"Speaker": f"Character {(i * 7919) % characters}", "Line": i, "Text": f"Line {i}"}
+      for i in range(lines)
+    ]
+  }
+
+def linear_parse(data: dict) -> list[Dialogue]:
+  """The original per line scan over every character, kept here as the baseline."""
+  characters = [Character(c["Name"], c["Voice"], c["Voice_ID"]) for c in data["characters"]]
+  return [
+    Dialogue(next((c for c in characters if c.name == d["Speaker"]), None), d["Line"], d["Text"])
+    for d in data["dialogue"]
+  ]
+
+def registry_parse(data: dict) -> list[Dialogue]:
+  return parse_saved_dialogue(data)["dialogue"]
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark speaker resolution.")
+  parser.add_argument("--lines", type=int, nargs="+", default=[1000, 5000, 10000])
+  parser.add_argument("--characters", type=int, default=200)
+  args = parser.parse_args()
+
+  for lines in args.lines:
+    data = synthetic_save(lines, args.characters)
+    for name, parse in [("linear", linear_parse), ("registry", registry_parse)]:
+      start = time.perf_counter()
+      dialogue = parse(data)
+      elapsed = time.perf_counter() - start
+      assert all(d.character is not None for d in dialogue)
+      print(f"{name:>8} lines={lines:>6} characters={args.characters} elapsed={elapsed * 1000:8.1f}ms")
+
+if __name__ == "__main__":
+  main()
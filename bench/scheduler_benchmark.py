@@ -0,0 +1,56 @@
+"""
+Generate a dialogue against the stub server while it injects throttling, with and without retries.
+
+python bench/scheduler_benchmark.py --lines 60 --max-concurrent 3 --error-rate 0.1
+"""
+import argparse, os, sys, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_tts_server import start_server, StubTTSHandler
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark the speech request scheduler.")
+  parser.add_argument("--lines", type=int, default=60)
+  parser.add_argument("--latency", type=float, default=0.3)
+  parser.add_argument("--workers", type=int, default=8)
+  parser.add_argument("--max-concurrent", type=int, default=3)
+  parser.add_argument("--error-rate", type=float, default=0.1)
+  args = parser.parse_args()
+
+  server = start_server(latency=args.latency, max_concurrent=args.max_concurrent, error_rate=args.error_rate)
+  os.environ["ELEVEN_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+  os.environ.setdefault("ELEVEN_API_KEY", "stub")
+
+  from diatribe.dialogues import Character, Dialogue
+  from diatribe.sidebar import SidebarData
+  from diatribe.synthesis import synthesize_dialogue
+  from diatribe.scheduler import tts_schedulers
+  from diatribe.tts_cache import tts_cache
+
+  sidebar = SidebarData(
+    el_key="stub", model_id="eleven_turbo_v2", voices=[], voice_names=[],
+    enable_instructions=False, enable_audio_editing=False, enable_normalization=False,
+    stability=0.35, simarlity_boost=0.8, style=0.0, join_gap=200, synthesis_concurrency=args.workers, enable_streaming=False,
+    openai_api_key="", openai_model="", openai_temp=1.0, openai_max_tokens=1024, openai_cache=False
+  )
+  scheduler = tts_schedulers.get(sidebar.el_key)
+  characters = [Character(f"Speaker {i}", "Stub", f"voice{i}") for i in range(4)]
+
+  for label, concurrency, retries in [("no retries", args.workers, 0), ("scheduled", args.max_concurrent, 5)]:
+    # unique text per run so the speech cache never answers
+    dialogue = [Dialogue(characters[i % len(characters)], i + 1, f"{label} line {i + 1}.") for i in range(args.lines)]
+    scheduler.set_concurrency(concurrency)
+    scheduler.max_retries = retries
+    StubTTSHandler.requests_rejected = 0
+    with tempfile.TemporaryDirectory() as audio_dir:
+      result = synthesize_dialogue(dialogue, sidebar, audio_dir, args.workers)
+    stats = scheduler.stats()
+    failed = f"failed at line {result.failed_line.line}" if result.failed_line else "completed"
+    print(
+      f"{label:>10}: {failed}, lines={len(result.audio_files)} elapsed={result.elapsed:.2f}s "
+      f"rejected={StubTTSHandler.requests_rejected} retries={stats.retries} "
+      f"latency avg={stats.average_latency:.2f}s p95={stats.p95_latency:.2f}s"
+    )
+  server.shutdown()
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,101 @@
+"""
+A local stand-in for the ElevenLabs text to speech endpoint so synthesis can be benchmarked offline.
+
+python bench/stub_tts_server.py --port 8011 --latency 0.8
+
+Point the app or a benchmark at it with ELEVEN_BASE_URL=http://127.0.0.1:8011/v1
+
+Throttling can be injected to exercise the request scheduler:
+--max-concurrent answers 429 too_many_concurrent_requests once more requests than this are in flight
+--error-rate answers a random share of requests with 429 or 503
+"""
+import argparse, json, random, re, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# MPEG-1 layer III, 128kbps, 44.1kHz, mono. A zeroed frame body decodes as silence.
+MP3_FRAME_HEADER = bytes([0xFF, 0xFB, 0x90, 0xC0])
+MP3_FRAME_SIZE = 417
+MP3_FRAME_MS = 1152 / 44100 * 1000
+SILENT_MP3_FRAME = MP3_FRAME_HEADER + bytes(MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+MS_PER_CHARACTER = 60
+
+def silent_mp3(text: str) -> bytes:
+  """Build a silent mp3 whose length roughly follows the length of the spoken text."""
+  frames = max(1, int(len(text) * MS_PER_CHARACTER / MP3_FRAME_MS))
+  return SILENT_MP3_FRAME * frames
+
+class StubTTSHandler(BaseHTTPRequestHandler):
+  latency: float = 0.5
+  max_concurrent: int = 0
+  error_rate: float = 0
+  requests_served: int = 0
+  requests_rejected: int = 0
+  in_flight: int = 0
+  lock = threading.Lock()
+
+  def reject(self, status: int, detail: str) -> None:
+    with StubTTSHandler.lock:
+      StubTTSHandler.requests_rejected += 1
+    body = json.dumps({"detail": {"status": detail, "message": detail}}).encode("utf-8")
+    self.send_response(status)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def do_POST(self) -> None:
+    match = re.match(r"^/v1/text-to-speech/([^/?]+)", self.path)
+    if not match:
+      self.send_error(404)
+      return
+    length = int(self.headers.get("Content-Length", 0))
+    body = json.loads(self.rfile.read(length) or b"{}")
+    if self.error_rate and random.random() < self.error_rate:
+      self.reject(random.choice([429, 503]), "injected_error")
+      return
+    with StubTTSHandler.lock:
+      StubTTSHandler.in_flight += 1
+      over_limit = self.max_concurrent and StubTTSHandler.in_flight > self.max_concurrent
+    try:
+      if over_limit:
+        self.reject(429, "too_many_concurrent_requests")
+        return
+      time.sleep(self.latency)
+    finally:
+      with StubTTSHandler.lock:
+        StubTTSHandler.in_flight -= 1
+    audio = silent_mp3(body.get("text", ""))
+    with StubTTSHandler.lock:
+      StubTTSHandler.requests_served += 1
+    self.send_response(200)
+    self.send_header("Content-Type", "audio/mpeg")
+    self.send_header("Content-Length", str(len(audio)))
+    self.end_headers()
+    self.wfile.write(audio)
+
+  def log_message(self, format: str, *args) -> None:
+    pass
+
+def start_server(port: int = 0, latency: float = 0.5, max_concurrent: int = 0, error_rate: float = 0) -> ThreadingHTTPServer:
+  """Start the stub server on a background thread and return it."""
+  StubTTSHandler.latency = latency
+  StubTTSHandler.max_concurrent = max_concurrent
+  StubTTSHandler.error_rate = error_rate
+  server = ThreadingHTTPServer(("127.0.0.1", port), StubTTSHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Stub ElevenLabs text to speech server.")
+  parser.add_argument("--port", type=int, default=8011)
+  parser.add_argument("--latency", type=float, default=0.5, help="seconds to wait before answering each request")
+  parser.add_argument("--max-concurrent", type=int, default=0, help="reject requests over this many in flight, 0 for no limit")
+  parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with 429 or 503")
+  args = parser.parse_args()
+  server = start_server(args.port, args.latency, args.max_concurrent, args.error_rate)
+  print(f"stub tts server listening on http://127.0.0.1:{server.server_port}/v1")
+  try:
+    while True:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    server.shutdown()
@@ -0,0 +1,50 @@
+"""
+Compare sequential and concurrent line synthesis against the stub server.
+
+python bench/synthesis_benchmark.py --lines 50 --latency 0.5 --workers 8
+"""
+import argparse, os, sys, tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_tts_server import start_server
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="Benchmark concurrent dialogue synthesis.")
+  parser.add_argument("--lines", type=int, default=50)
+  parser.add_argument("--latency", type=float, default=0.5)
+  parser.add_argument("--workers", type=int, default=8)
+  args = parser.parse_args()
+
+  server = start_server(latency=args.latency)
+  os.environ["ELEVEN_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+  os.environ.setdefault("ELEVEN_API_KEY", "stub")
+
+  from diatribe.dialogues import Character, Dialogue
+  from diatribe.sidebar import SidebarData
+  from diatribe.synthesis import synthesize_dialogue
+  from diatribe.scheduler import tts_schedulers
+  from diatribe.tts_cache import tts_cache
+
+  sidebar = SidebarData(
+    el_key="stub", model_id="eleven_turbo_v2", voices=[], voice_names=[],
+    enable_instructions=False, enable_audio_editing=False, enable_normalization=False,
+    stability=0.35, simarlity_boost=0.8, style=0.0, join_gap=200, synthesis_concurrency=args.workers, enable_streaming=False,
+    openai_api_key="", openai_model="", openai_temp=1.0, openai_max_tokens=1024, openai_cache=False
+  )
+  characters = [Character(f"Speaker {i}", "Stub", f"voice{i}") for i in range(4)]
+  scheduler = tts_schedulers.get(sidebar.el_key)
+
+  # keep the benchmark out of the real speech cache
+  with tempfile.TemporaryDirectory() as cache_dir:
+    tts_cache.cache_dir = cache_dir
+    for workers in [1, args.workers]:
+      # unique text per run so the speech cache never answers
+      dialogue = [Dialogue(characters[i % len(characters)], i + 1, f"Run {workers}, line number {i + 1}.") for i in range(args.lines)]
+      scheduler.set_concurrency(workers)
+      with tempfile.TemporaryDirectory() as audio_dir:
+        result = synthesize_dialogue(dialogue, sidebar, audio_dir, workers)
+        assert result.failed_line is None, result.error
+        print(f"workers={workers:>2} lines={len(result.audio_files)} elapsed={result.elapsed:.2f}s")
+  server.shutdown()
+
+if __name__ == "__main__":
+  main()
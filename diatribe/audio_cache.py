@@ -0,0 +1,57 @@
+import os, threading
+from collections import OrderedDict
+from pydub import AudioSegment as seg
+
+DEFAULT_MAX_BYTES = int(os.getenv("DIATRIBE_DECODED_CACHE_MB", "256")) * 1024 * 1024
+
+class DecodedAudioCache:
+  """A process wide LRU cache of decoded audio keyed on the file path, modification time and size."""
+
+  def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    self.max_bytes = max_bytes
+    self.size_bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self._entries: OrderedDict[tuple, seg] = OrderedDict()
+    self._lock = threading.Lock()
+
+  @staticmethod
+  def make_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+  def load(self, path: str) -> seg:
+    """Return the decoded audio for the file, decoding it only if it is not cached or has changed."""
+    key = self.make_key(path)
+    with self._lock:
+      audio = self._entries.get(key)
+      if audio is not None:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return audio
+      self.misses += 1
+
+    audio = seg.from_file(path)
+    with self._lock:
+      self._discard_stale(key[0])
+      self._entries[key] = audio
+      self.size_bytes += len(audio.raw_data)
+      while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+        _, evicted = self._entries.popitem(last=False)
+        self.size_bytes -= len(evicted.raw_data)
+    return audio
+
+  def _discard_stale(self, path: str) -> None:
+    for key in [k for k in self._entries if k[0] == path]:
+      self.size_bytes -= len(self._entries.pop(key).raw_data)
+
+  def invalidate(self, path: str) -> None:
+    """Drop any decoded audio for the file."""
+    with self._lock:
+      self._discard_stale(os.path.abspath(path))
+
+decoded_audio_cache = DecodedAudioCache()
+
+def load_audio(path: str) -> seg:
+  """Load decoded audio for a file through the process wide cache."""
+  return decoded_audio_cache.load(path)
@@ -1,8 +1,154 @@
 import streamlit as st
 import diatribe.el_audio as el_audio
 from diatribe.dialogues import Dialogue
+from diatribe.batch_edit import BatchPreset
 from diatribe.utils import log
 
+def create_soundboard_controls(key: str) -> el_audio.Soundboard:
+    """Create the soundboard tabs, keying the sliders so several soundboards can be shown at once."""
+    compressor_tab, chorus_tab, distortion_tab, limiter_tab, noise_gate_tab, reverb_tab = st.tabs([
+        "Compressor", 
+        "Chorus",
+        "Distortion",
+        "Limiter",
+        "Noise Gate",
+        "Reverb"
+    ])
+    with compressor_tab:
+        st.markdown("A compressor controls the dynamic range of an audio signal. In other words, it reduces loud volumes by \"compressing\" the audio range.")
+        compressor_threshold_db = st.slider(
+            "Threshold (dB)",
+            -20.0, 0.0, 0.0, 0.5,
+            key=f"compressor_threshold_db_{key}",
+            help="The threshold above which compression is applied."
+        )
+        compressor_ratio = st.slider(
+            "Ratio",
+            1.0, 20.0, 2.0, 0.5,
+            key=f"compressor_ratio_{key}",
+            help="The amount of compression applied when the threshold is exceeded."
+        )          
+    with chorus_tab:
+        st.markdown("A chorus effect makes a sound seem like it is being played by multiple sources at once which creates a \"shimmering\" sound.")
+        chorus_rate_hz = st.slider(
+            "Rate (Hz)",
+            0.0, 20.0, 0.0, 0.1,
+            key=f"chorus_rate_hz_{key}",
+            help="The low-frequency oscillator (LFO) in hertz (cycles per second)."
+        )                  
+        chorus_depth = st.slider(
+            "Depth",
+            0.25, 1.0, 0.25, 0.05,
+            key=f"chorus_depth_{key}",
+            help="Amount of modulation applied as set by the LFO."
+        )
+        chorus_centre_delay = st.slider(
+            "Delay (ms)",
+            0.0, 20.0, 7.0, 0.5,
+            key=f"chorus_delay_{key}",
+            help="The delay effect around the LFO."
+        )
+        chorus_feedback = st.slider(
+            "Feedback",
+            0.0, 1.0, 0.0, 0.1,
+            key=f"chorus_feedback_{key}",
+            help="The amount of output signal feed back into the input."
+        )                                                              
+    with distortion_tab:
+        st.markdown("A distortion effect adds a \"gritty\" sound to the audio.")
+        distortion_db = st.slider(
+            "Drive (Db)",
+            0.0, 50.0, 0.0, 0.5,
+            key=f"distortion_db_{key}",
+            help="The amount of distortion."
+        )                    
+    with limiter_tab:
+        st.markdown("A limiter is similar to a compressor, but it is a more extreme form of compression. It will compress the dynamic range by making the quiet parts louder and and the loud parts quieter. This will often be used in combination with the compressor.")
+        limiter_threshold_db = st.slider(
+            "Threshold (dB)",
+            -10.0, 0.0, 0.0, 0.5,
+            key=f"limiter_threshold_db_{key}",
+            help="The threshold above which the limiter is applied."
+        )
+    with noise_gate_tab:
+        st.markdown("A noise gate removes unwanted noise from the audio, often background noise. It is similar to the compressor, but a noise gate cuts off audio above a threshold instead of compressing it.")
+        noise_gate_threshold_db = st.slider(
+            "Threshold (dB)",
+            -20.0, 0.0, 0.0, 0.5,
+            key=f"noise_gate_threshold_db_{key}",
+            help="The threshold above which audio is cut off."
+        )                 
+        noise_gate_ratio = st.slider(
+            "Ratio",
+            0.0, 20.0, 2.0, 0.5,
+            key=f"noise_gate_ratio_{key}",
+            help="The amount that should be cut off when the threshold is exceeded."
+        )                        
+    with reverb_tab:
+        st.markdown("A reverb effect simulates the sound of a room. It is often used to make a sound seem more natural.")
+        reverb_room_size = st.slider(
+            "Room Size",
+            0.0, 1.0, 0.0, 0.01,
+            key=f"reverb_room_size_{key}",
+            help="The perceived size of the room."
+        )   
+        reverb_damping = st.slider(
+            "Damping",
+            0.0, 1.0, 0.5, 0.1,
+            key=f"reverb_damping_{key}",
+            help="The amount of absorption of sound in the room."
+        )  
+        reverb_wet_level = st.slider(
+            "Wet Level",
+            0.0, 1.0, 0.33, 0.01,
+            key=f"reverb_wet_level_{key}",
+            help="The level of the reverberated signal."
+        )  
+        reverb_dry_level = st.slider(
+            "Dry Level",
+            0.0, 1.0, 0.4, 0.01,
+            key=f"reverb_dry_level_{key}",
+            help="The level of the original signal."
+        )
+
+    return el_audio.Soundboard(
+        compressor_threshold_db, 
+        compressor_ratio,
+        chorus_rate_hz,
+        chorus_depth,
+        chorus_centre_delay,
+        chorus_feedback,
+        reverb_room_size,
+        reverb_damping,
+        reverb_wet_level,
+        reverb_dry_level,
+        distortion_db,
+        noise_gate_threshold_db,
+        noise_gate_ratio,
+        limiter_threshold_db
+    )
+
+def create_batch_edit(dialogue: list[Dialogue], disabled: bool = False) -> (list[Dialogue], BatchPreset):
+    """Create the batch edit controls, returning the lines and preset to apply once the apply button is clicked."""
+    with st.expander("Batch Edit"):
+        st.markdown("Apply the same edits to every line of the selected speakers, for example to give a character a robot voice.")
+        speakers = sorted({line.character.name for line in dialogue})
+        selected_speakers = st.multiselect("Speakers", speakers, default=speakers, key="batch_speakers")
+        basic_tab, soundboard_tab = st.tabs(["Basic", "Soundboard"])
+        with basic_tab:
+            volume = st.slider("Volume (dB)", -25, 25, 0, 1, key="volume_batch")
+            fade_in = st.slider("Fade In (ms)", 0, 2000, 0, 10, key="fade_in_batch")
+            fade_out = st.slider("Fade Out (ms)", 0, 2000, 0, 10, key="fade_out_batch")
+            extend_in = st.slider("Extend In (ms)", 0, 5000, 0, key="extend_in_batch")
+            extend_out = st.slider("Extend Out (ms)", 0, 5000, 0, key="extend_out_batch")
+        with soundboard_tab:
+            soundboard = create_soundboard_controls("batch")
+        apply_batch = st.button("Apply to Lines", key="apply_batch", use_container_width=True, disabled=disabled)
+    if not apply_batch:
+        return None, None
+    lines = [line for line in dialogue if line.character.name in selected_speakers]
+    return lines, BatchPreset(volume, fade_in, fade_out, extend_in, extend_out, soundboard)
+
 def create_edit_dialogue_line(line: Dialogue) -> None:
     edit_audio_line_key = f"editing_audio_line_{line.line}"                                 
 
@@ -15,6 +161,7 @@ def create_edit_dialogue_line(line: Dialogue) -> None:
         
     should_show_audio_edit = st.session_state[edit_audio_line_key]
     if should_show_audio_edit:    
+        audio_file = f"{el_audio.get_audio_dir()}/line{line.line}.mp3"
         speech_duration = el_audio.get_audio_duration(audio_file)  
         speech_duration_int = int(speech_duration * 1000)        
         basic_tab, soundboard_tab, special_tab,  = st.tabs(["Basic", "Soundboard", "Special Effect"])
@@ -77,128 +224,7 @@ def create_edit_dialogue_line(line: Dialogue) -> None:
         
         with soundboard_tab:
             st.markdown("### 👂💫 Soundboard")
-            compressor_tab, chorus_tab, distortion_tab, limiter_tab, noise_gate_tab, reverb_tab = st.tabs([
-                "Compressor", 
-                "Chorus",
-                "Distortion",
-                "Limiter",
-                "Noise Gate",
-                "Reverb"
-            ])
-            with compressor_tab:
-                st.markdown("A compressor controls the dynamic range of an audio signal. In other words, it reduces loud volumes by \"compressing\" the audio range.")
-                compressor_threshold_db = st.slider(
-                    "Threshold (dB)",
-                    -20.0, 0.0, 0.0, 0.5,
-                    key=f"compressor_threshold_db_{line.line}",
-                    help="The threshold above which compression is applied."
-                )
-                compressor_ratio = st.slider(
-                    "Ratio",
-                    1.0, 20.0, 2.0, 0.5,
-                    key=f"compressor_ratio_{line.line}",
-                    help="The amount of compression applied when the threshold is exceeded."
-                )          
-            with chorus_tab:
-                st.markdown("A chorus effect makes a sound seem like it is being played by multiple sources at once which creates a \"shimmering\" sound.")
-                chorus_rate_hz = st.slider(
-                    "Rate (Hz)",
-                    0.0, 20.0, 0.0, 0.1,
-                    key=f"chorus_rate_hz_{line.line}",
-                    help="The low-frequency oscillator (LFO) in hertz (cycles per second)."
-                )                  
-                chorus_depth = st.slider(
-                    "Depth",
-                    0.25, 1.0, 0.25, 0.05,
-                    key=f"chorus_depth_{line.line}",
-                    help="Amount of modulation applied as set by the LFO."
-                )
-                chorus_centre_delay = st.slider(
-                    "Delay (ms)",
-                    0.0, 20.0, 7.0, 0.5,
-                    key=f"chorus_delay_{line.line}",
-                    help="The delay effect around the LFO."
-                )
-                chorus_feedback = st.slider(
-                    "Feedback",
-                    0.0, 1.0, 0.0, 0.1,
-                    key=f"chorus_feedback_{line.line}",
-                    help="The amount of output signal feed back into the input."
-                )                                                              
-            with distortion_tab:
-                st.markdown("A distortion effect adds a \"gritty\" sound to the audio.")
-                distortion_db = st.slider(
-                    "Drive (Db)",
-                    0.0, 50.0, 0.0, 0.5,
-                    key=f"distortion_db_{line.line}",
-                    help="The amount of distortion."
-                )                    
-            with limiter_tab:
-                st.markdown("A limiter is similar to a compressor, but it is a more extreme form of compression. It will compress the dynamic range by making the quiet parts louder and and the loud parts quieter. This will often be used in combination with the compressor.")
-                limiter_threshold_db = st.slider(
-                    "Threshold (dB)",
-                    -10.0, 0.0, 0.0, 0.5,
-                    key=f"limiter_threshold_db_{line.line}",
-                    help="The threshold above which the limiter is applied."
-                )
-            with noise_gate_tab:
-                st.markdown("A noise gate removes unwanted noise from the audio, often background noise. It is similar to the compressor, but a noise gate cuts off audio above a threshold instead of compressing it.")
-                noise_gate_threshold_db = st.slider(
-                    "Threshold (dB)",
-                    -20.0, 0.0, 0.0, 0.5,
-                    key=f"noise_gate_threshold_db_{line.line}",
-                    help="The threshold above which audio is cut off."
-                )                 
-                noise_gate_ratio = st.slider(
-                    "Ratio",
-                    0.0, 20.0, 2.0, 0.5,
-                    key=f"noise_gate_ratio_{line.line}",
-                    help="The amount that should be cut off when the threshold is exceeded."
-                )                        
-            with reverb_tab:
-                st.markdown("A reverb effect simulates the sound of a room. It is often used to make a sound seem more natural.")
-                reverb_room_size = st.slider(
-                    "Room Size",
-                    0.0, 1.0, 0.0, 0.01,
-                    key=f"reverb_room_size_{line.line}",
-                    help="The perceived size of the room."
-                )   
-                reverb_damping = st.slider(
-                    "Damping",
-                    0.0, 1.0, 0.5, 0.1,
-                    key=f"reverb_damping_{line.line}",
-                    help="The amount of absorption of sound in the room."
-                )  
-                reverb_wet_level = st.slider(
-                    "Wet Level",
-                    0.0, 1.0, 0.33, 0.01,
-                    key=f"reverb_wet_level_{line.line}",
-                    help="The level of the reverberated signal."
-                )  
-                reverb_dry_level = st.slider(
-                    "Dry Level",
-                    0.0, 1.0, 0.4, 0.01,
-                    key=f"reverb_dry_level_{line.line}",
-                    help="The level of the original signal."
-                )                                                                        
-                            
-            
-            soundboard = el_audio.Soundboard(
-                compressor_threshold_db, 
-                compressor_ratio,
-                chorus_rate_hz,
-                chorus_depth,
-                chorus_centre_delay,
-                chorus_feedback,
-                reverb_room_size,
-                reverb_damping,
-                reverb_wet_level,
-                reverb_dry_level,
-                distortion_db,
-                noise_gate_threshold_db,
-                noise_gate_ratio,
-                limiter_threshold_db
-            )
+            soundboard = create_soundboard_controls(str(line.line))
                         
         with special_tab:
             st.markdown("### 💥 Special Effect")
@@ -209,9 +235,9 @@ def create_edit_dialogue_line(line: Dialogue) -> None:
                 key=f"upload_effect_{line.line}"
             )
             if uploaded_special_effect:
-                audio_file = uploaded_special_effect.getvalue()
-                el_audio.save_sound_effect(audio_file, uploaded_special_effect.name)
-                st.toast("Special effect has been uploaded. Please click refresh to see it.", icon="👍")
+                effect_file = uploaded_special_effect.getvalue()
+                el_audio.save_sound_effect(effect_file, uploaded_special_effect.name)
+                st.toast("Special effect has been uploaded.", icon="👍")
                 
             col1, col2 = st.columns([8, 1])
             with col1:
@@ -313,11 +339,11 @@ def create_edit_dialogue_line(line: Dialogue) -> None:
             with org_audio_waveform:
                 st.markdown("<p style='font-size:14px'>Original</p>", unsafe_allow_html=True)
                 y_max, plot = el_audio.generate_waveform_from_file(audio_file)
-                st.pyplot(plot)                  
+                st.image(plot, use_column_width=True)                  
             with new_audio_waveform:
                 st.markdown("<p style='font-size:14px'>Updated</p>", unsafe_allow_html=True)
                 _, plot = el_audio.generate_waveform_from_bytes(preview_audio, y_max)
-                st.pyplot(plot) 
+                st.image(plot, use_column_width=True) 
         else:
             st.toast("There are no audio edits selected.", icon="ℹ️")
                             
@@ -334,5 +360,7 @@ def create_edit_dialogue_line(line: Dialogue) -> None:
                 soundboard                
             )
             new_line_audio.export(audio_file, format="mp3")
+            el_audio.decoded_audio_cache.invalidate(audio_file)
+            el_audio.write_sidecars(audio_file, new_line_audio)
             log(f"saving audio {audio_file}")
             st.rerun()
@@ -0,0 +1,116 @@
+import os, json
+from dataclasses import dataclass, asdict
+from pydub import AudioSegment as seg
+from diatribe.utils import log
+
+METADATA_SUFFIX = ".meta.json"
+
+# indexed by [mpeg 1, mpeg 2/2.5][layer I, II, III][bitrate index]
+MP3_BITRATES = [
+  [
+    [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+  ],
+  [
+    [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+  ]
+]
+# indexed by version bits (2.5, reserved, 2, 1)
+MP3_SAMPLE_RATES = {0: [11025, 12000, 8000], 2: [22050, 24000, 16000], 3: [44100, 48000, 32000]}
+
+@dataclass
+class AudioMetadata:
+  duration: float
+  peak_dbfs: float = None
+  rms_dbfs: float = None
+  size: int = 0
+  mtime_ns: int = 0
+
+def metadata_path(audio_file: str) -> str:
+  return os.path.splitext(audio_file)[0] + METADATA_SUFFIX
+
+def _id3v2_size(data: bytes) -> int:
+  if len(data) < 10 or data[:3] != b"ID3":
+    return 0
+  size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+  footer = 10 if data[5] & 0x10 else 0
+  return 10 + size + footer
+
+def _parse_frame_header(data: bytes, pos: int) -> (int, int, int):
+  """Parse the frame header at the position returning (frame length, samples, sample rate) or None."""
+  b1, b2 = data[pos + 1], data[pos + 2]
+  if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+    return None
+  version = (b1 >> 3) & 0x03
+  layer = 4 - ((b1 >> 1) & 0x03)
+  bitrate_index = b2 >> 4
+  sample_rate_index = (b2 >> 2) & 0x03
+  if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+    return None
+  mpeg1 = version == 3
+  bitrate = MP3_BITRATES[0 if mpeg1 else 1][layer - 1][bitrate_index] * 1000
+  sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+  padding = (b2 >> 1) & 0x01
+  if layer == 1:
+    return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+  if layer == 3 and not mpeg1:
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate
+  return 144 * bitrate // sample_rate + padding, 1152, sample_rate
+
+def probe_mp3(path: str) -> (float, int):
+  """Read the duration and sample rate of an mp3 by walking its frame headers without decoding any audio."""
+  with open(path, "rb") as f:
+    data = f.read()
+  pos = _id3v2_size(data)
+  end = len(data) - 128 if data[-128:-125] == b"TAG" else len(data)
+  duration = 0.0
+  frame_rate = None
+  first_frame = True
+  while pos + 4 <= end:
+    header = _parse_frame_header(data, pos)
+    if header is None:
+      pos += 1
+      continue
+    frame_length, samples, sample_rate = header
+    # the first frame of a lame encoded file only holds the Xing/Info tag
+    if not (first_frame and (b"Xing" in data[pos:pos + 64] or b"Info" in data[pos:pos + 64])):
+      duration += samples / sample_rate
+    frame_rate = frame_rate or sample_rate
+    first_frame = False
+    pos += frame_length
+  return (duration, frame_rate) if duration > 0 else (None, None)
+
+def probe_mp3_duration(path: str) -> float:
+  """Read the duration of an mp3 by walking its frame headers without decoding any audio."""
+  return probe_mp3(path)[0]
+
+def analyze_audio(audio: seg) -> (float, float):
+  """Compute the peak and RMS levels of decoded audio in dBFS."""
+  return audio.max_dBFS, audio.dBFS
+
+def write_metadata(audio_file: str, audio: seg = None) -> AudioMetadata:
+  """Measure the audio once and store its duration, peak and RMS next to it."""
+  if audio is None:
+    audio = seg.from_file(audio_file)
+  peak_dbfs, rms_dbfs = analyze_audio(audio)
+  stat = os.stat(audio_file)
+  metadata = AudioMetadata(audio.duration_seconds, peak_dbfs, rms_dbfs, stat.st_size, stat.st_mtime_ns)
+  with open(metadata_path(audio_file), "w") as f:
+    json.dump(asdict(metadata), f)
+  return metadata
+
+def read_metadata(audio_file: str) -> AudioMetadata:
+  """Read the stored metadata for the audio, or None if it is missing or the audio changed since."""
+  try:
+    with open(metadata_path(audio_file), "r") as f:
+      metadata = AudioMetadata(**json.load(f))
+    stat = os.stat(audio_file)
+  except (OSError, ValueError, TypeError):
+    return None
+  if metadata.size != stat.st_size or metadata.mtime_ns != stat.st_mtime_ns:
+    log(f"stale audio metadata for {audio_file}")
+    return None
+  return metadata
@@ -0,0 +1,227 @@
+import numpy as np
+from pydub import AudioSegment as seg
+
+# pydub pads with silence at 11025Hz mono and converts it to the format of the speech
+SILENCE_FRAME_RATE = 11025
+SAMPLE_TYPES = {2: np.int16, 4: np.int32}
+# pieces longer than this are copied as slices instead of gathered frame by frame
+LONG_PIECE_FRAMES = 256
+
+def apply_basic_segments(
+  audio: seg,
+  volume: int,
+  trim_in: int,
+  trim_out: int,
+  extend_in: int,
+  extend_out: int,
+  fade_in: int,
+  fade_out: int
+) -> seg:
+  """Apply the basic edits with pydub, creating a new segment for every step."""
+  if volume:
+    audio = audio + volume
+  if trim_in != 0:
+    audio = audio[trim_in:]
+  if trim_out != 0:
+    new_end = int(audio.duration_seconds * 1000) - trim_out
+    audio = audio[:new_end]
+  if extend_in != 0:
+    audio = seg.silent(extend_in) + audio
+  if extend_out != 0:
+    audio = audio + seg.silent(extend_out)
+  if fade_in != 0:
+    audio = audio.fade_in(fade_in)
+  if fade_out != 0:
+    audio = audio.fade_out(fade_out)
+  return audio
+
+def basic_edits_supported(audio: seg, extend_in: int, extend_out: int) -> bool:
+  """
+  Check whether the NumPy edits produce the same audio as pydub. Padding 8 bit audio or audio below 11025Hz
+  with pydub's silence resamples the speech itself, so those are left to pydub.
+  """
+  if audio.sample_width not in SAMPLE_TYPES:
+    return False
+  return audio.frame_rate >= SILENCE_FRAME_RATE or not (extend_in or extend_out)
+
+def _length_ms(frames: int, frame_rate: int) -> int:
+  return round(1000 * (float(frames) / frame_rate))
+
+def _position(ms, frames: int, frame_rate: int):
+  """Convert milliseconds to a frame position the way pydub does, counting negative positions from the end."""
+  length = _length_ms(frames, frame_rate)
+  ms = np.where(ms < 0, length - np.abs(ms), ms)
+  return np.trunc(ms * (frame_rate / 1000.0)).astype(np.int64)
+
+def _python_slice(start: np.ndarray, end: np.ndarray, frames: int) -> (np.ndarray, np.ndarray):
+  """Normalize start and end like a python slice, returning the first frame and the number of frames."""
+  def bound(x):
+    return np.where(x < 0, np.maximum(x + frames, 0), np.minimum(x, frames))
+  first, last = bound(start), bound(end)
+  return first, np.maximum(last - first, 0)
+
+def _chunks(start: np.ndarray, end: np.ndarray, frames: int, frame_rate: int) -> (np.ndarray, np.ndarray, np.ndarray):
+  """
+  Get the first frame, frame count and trailing silence for a run of pydub slices. Slices that run
+  a little past the end are padded with silence just like pydub does.
+  """
+  first, count = _python_slice(start, end, frames)
+  missing = (end - start) - count
+  if np.any(missing > 2 * (frame_rate / 1000.0)):
+    raise ValueError("slice runs more than 2ms past the end of the audio")
+  padding = np.where((missing > 0) & (count > 0), missing, 0)
+  return first, count, padding
+
+def _slice(frames: int, frame_rate: int, start_ms: float = None, end_ms: float = None) -> (np.ndarray, np.ndarray, np.ndarray):
+  """Get the pieces for audio[start_ms:end_ms]."""
+  length = _length_ms(frames, frame_rate)
+  start_ms = min(0 if start_ms is None else start_ms, length)
+  end_ms = min(length if end_ms is None else end_ms, length)
+  start = _position(np.array([start_ms], dtype=np.float64), frames, frame_rate)
+  end = _position(np.array([end_ms], dtype=np.float64), frames, frame_rate)
+  return _chunks(start, end, frames, frame_rate)
+
+def _fade(
+  frames: int,
+  frame_rate: int,
+  to_gain: float = 0,
+  from_gain: float = 0,
+  start: float = None,
+  end: float = None,
+  duration: int = None
+) -> (np.ndarray, np.ndarray, np.ndarray, np.ndarray):
+  """Get the pieces and their gains reproducing AudioSegment.fade, including its per millisecond steps for fades over 100ms."""
+  length = _length_ms(frames, frame_rate)
+  start = min(length, start) if start is not None else None
+  end = min(length, end) if end is not None else None
+  if start is not None and start < 0:
+    start += length
+  if end is not None and end < 0:
+    end += length
+  if duration:
+    if start is not None:
+      end = start + duration
+    elif end is not None:
+      start = end - duration
+  else:
+    duration = end - start
+
+  from_power = 10 ** (float(from_gain) / 20)
+  to_power = 10 ** (float(to_gain) / 20)
+  gain_delta = to_power - from_power
+  pieces = [(*_slice(frames, frame_rate, None, start), np.array([from_power if from_gain != 0 else 1.0]))]
+
+  if duration > 100:
+    steps = np.arange(duration)
+    ms = (start + steps).astype(np.float64)
+    first, count, padding = _chunks(_position(ms, frames, frame_rate), _position(ms + 1, frames, frame_rate), frames, frame_rate)
+    pieces.append((first, count, padding, from_power + gain_delta / duration * steps))
+  else:
+    start_frame = start * (frame_rate / 1000.0)
+    end_frame = end * (frame_rate / 1000.0)
+    fade_frames = end_frame - start_frame
+    steps = np.arange(int(fade_frames))
+    index = np.trunc(start_frame + steps).astype(np.int64)
+    # frames past either end are dropped, -1 reads an empty slice since it runs up to 0
+    valid = (index < frames) & ((index >= 0) | ((index >= -frames) & (index != -1)))
+    first = np.where(index < 0, index + frames, index)[valid]
+    pieces.append((first, np.ones_like(first), np.zeros_like(first), (from_power + gain_delta / fade_frames * steps)[valid]))
+
+  pieces.append((*_slice(frames, frame_rate, end, None), np.array([to_power if to_gain != 0 else 1.0])))
+  return tuple(np.concatenate(column) for column in zip(*pieces))
+
+def _multiply(samples: np.ndarray, gain) -> np.ndarray:
+  """Multiply integer samples by a gain, rounding down and clipping like audioop.mul."""
+  info = np.iinfo(samples.dtype)
+  scaled = samples * np.asarray(gain, dtype=np.float64)
+  np.floor(scaled, out=scaled)
+  np.clip(scaled, info.min, info.max, out=scaled)
+  return scaled.astype(samples.dtype)
+
+def _apply_gain(samples: np.ndarray, gain: float) -> np.ndarray:
+  """Apply a constant gain, through a lookup table of every 16 bit sample value when possible."""
+  if samples.dtype != np.int16:
+    return _multiply(samples, gain)
+  table = _multiply(np.arange(-32768, 32768, dtype=np.int16), gain)
+  return table[samples.view(np.uint16) ^ 0x8000]
+
+def _render(
+  samples: np.ndarray,
+  first: np.ndarray,
+  count: np.ndarray,
+  padding: np.ndarray,
+  gain: np.ndarray
+) -> np.ndarray:
+  """
+  Assemble the pieces into a new array. Long pieces are copied as slices and the short
+  per millisecond or per frame pieces of a fade ramp are gathered and scaled together.
+  """
+  lengths = count + padding
+  offsets = np.cumsum(lengths) - lengths
+  out = np.zeros((int(lengths.sum()), samples.shape[1]), dtype=samples.dtype)
+  long = lengths > LONG_PIECE_FRAMES
+  for i in np.flatnonzero(long):
+    piece = out[offsets[i]:offsets[i] + count[i]]
+    piece[:] = samples[first[i]:first[i] + count[i]]
+    if gain[i] != 1.0:
+      piece[:] = _multiply(piece, gain[i])
+  short = ~long & (count > 0)
+  if short.any():
+    counts = count[short]
+    within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    source = np.repeat(first[short], counts) + within
+    target = np.repeat(offsets[short], counts) + within
+    out[target] = _multiply(samples[source], np.repeat(gain[short], counts)[:, None])
+  return out
+
+def apply_basic_edits(
+  audio: seg,
+  volume: int,
+  trim_in: int,
+  trim_out: int,
+  extend_in: int,
+  extend_out: int,
+  fade_in: int,
+  fade_out: int
+) -> seg:
+  """
+  Apply the basic edits with NumPy, producing the same samples as apply_basic_segments. Trims are
+  views of the decoded samples so only the volume, the padding and each fade copy the audio.
+  """
+  if not basic_edits_supported(audio, extend_in, extend_out):
+    return apply_basic_segments(audio, volume, trim_in, trim_out, extend_in, extend_out, fade_in, fade_out)
+
+  frame_rate = audio.frame_rate
+  samples = np.frombuffer(audio.raw_data, dtype=SAMPLE_TYPES[audio.sample_width]).reshape(-1, audio.channels)
+  if volume:
+    samples = _apply_gain(samples, 10 ** (float(volume) / 20))
+
+  trims = []
+  if trim_in != 0:
+    trims.append((trim_in, None))
+  if trim_out != 0:
+    trims.append((None, -trim_out))
+  for start_ms, end_ms in trims:
+    if end_ms is not None:
+      end_ms += int(len(samples) / frame_rate * 1000)
+    first, count, padding = (int(x[0]) for x in _slice(len(samples), frame_rate, start_ms, end_ms))
+    samples = samples[first:first + count]
+    if padding:
+      samples = np.concatenate([samples, np.zeros((padding, samples.shape[1]), dtype=samples.dtype)])
+
+  if extend_in or extend_out:
+    silences = []
+    for ms in (extend_in, extend_out):
+      silent_frames = int(SILENCE_FRAME_RATE * (ms / 1000.0))
+      if silent_frames and frame_rate != SILENCE_FRAME_RATE:
+        # audioop.ratecv output length when resampling the silence to the speech frame rate
+        silent_frames = (silent_frames - 1) * frame_rate // SILENCE_FRAME_RATE + 1
+      silences.append(np.zeros((silent_frames, samples.shape[1]), dtype=samples.dtype))
+    samples = np.concatenate([silences[0], samples, silences[1]])
+
+  if fade_in != 0:
+    samples = _render(samples, *_fade(len(samples), frame_rate, from_gain=-120, duration=fade_in, start=0))
+  if fade_out != 0:
+    samples = _render(samples, *_fade(len(samples), frame_rate, to_gain=-120, duration=fade_out, end=float("inf")))
+
+  return audio._spawn(np.ascontiguousarray(samples).tobytes())
@@ -0,0 +1,105 @@
+import os, time, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable
+from pydub import AudioSegment as seg
+from diatribe.basic_edit import apply_basic_edits
+from diatribe.soundboard import Soundboard, apply_soundboard
+from diatribe.audio_metadata import write_metadata
+from diatribe.waveform import peaks_for_audio, write_peaks
+from diatribe.audio_cache import decoded_audio_cache
+from diatribe.utils import log
+
+BATCH_WORKERS = int(os.getenv("DIATRIBE_BATCH_WORKERS", str(os.cpu_count() or 1)))
+
+@dataclass(frozen=True)
+class BatchPreset:
+  volume: int = 0
+  fade_in: int = 0
+  fade_out: int = 0
+  extend_in: int = 0
+  extend_out: int = 0
+  soundboard: Soundboard = None
+
+  def basic_edits(self) -> dict:
+    return {
+      "volume": self.volume,
+      "trim_in": 0,
+      "trim_out": 0,
+      "extend_in": self.extend_in,
+      "extend_out": self.extend_out,
+      "fade_in": self.fade_in,
+      "fade_out": self.fade_out
+    }
+
+@dataclass
+class BatchResult:
+  audio_files: list[str] = field(default_factory=list)
+  failed: dict[str, str] = field(default_factory=dict)
+  elapsed: float = 0
+  audio_seconds: float = 0
+
+  @property
+  def lines_per_second(self) -> float:
+    return len(self.audio_files) / self.elapsed if self.elapsed else 0
+
+  @property
+  def realtime_factor(self) -> float:
+    return self.audio_seconds / self.elapsed if self.elapsed else 0
+
+_pool: ProcessPoolExecutor = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+  """Get the shared process pool, started on first use with spawned workers so they do not inherit the app's threads."""
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+      log(f"started {BATCH_WORKERS} batch edit workers")
+    return _pool
+
+def render_line(audio_file: str, preset: BatchPreset) -> float:
+  """Apply the preset to a line file in place, returning the duration of the new audio in seconds."""
+  audio = seg.from_file(audio_file)
+  audio = apply_basic_edits(audio, **preset.basic_edits())
+  audio, _ = apply_soundboard(audio, preset.soundboard)
+  part_file = f"{audio_file}.part"
+  audio.export(part_file, format="mp3")
+  os.replace(part_file, audio_file)
+  write_metadata(audio_file, audio)
+  write_peaks(audio_file, peaks_for_audio(audio))
+  return audio.duration_seconds
+
+def apply_preset(
+  audio_files: list[str],
+  preset: BatchPreset,
+  on_progress: Callable[[int, int], None] = None
+) -> BatchResult:
+  """
+  Apply the preset to every line file on the process pool. Decoding, the edits, pedalboard and the mp3
+  encode all run in the workers, so the lines are rendered in parallel across cores.
+  """
+  result = BatchResult()
+  start = time.perf_counter()
+  futures = {get_pool().submit(render_line, audio_file, preset): audio_file for audio_file in audio_files}
+  for completed, future in enumerate(as_completed(futures), 1):
+    audio_file = futures[future]
+    try:
+      result.audio_seconds += future.result()
+      result.audio_files.append(audio_file)
+      # the line was rewritten in a worker process, so drop this process's decoded copy
+      decoded_audio_cache.invalidate(audio_file)
+    except Exception as e:
+      log(f"batch edit failed for {audio_file}: {e}")
+      result.failed[audio_file] = str(e)
+    if on_progress:
+      on_progress(completed, len(audio_files))
+  order = {audio_file: i for i, audio_file in enumerate(audio_files)}
+  result.audio_files.sort(key=order.get)
+  result.elapsed = time.perf_counter() - start
+  log(
+    f"batch edited {len(result.audio_files)} lines in {result.elapsed:.2f}s "
+    f"({result.lines_per_second:.1f} lines/s, {result.realtime_factor:.1f}x realtime)"
+  )
+  return result
@@ -0,0 +1,149 @@
+import os, json, time, hashlib, threading
+import streamlit as st
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from diatribe.dialogues import parse_saved_dialogue
+from diatribe.utils import log
+
+CATALOG_CACHE_DIR = "./cache/catalog"
+# how often the indexes of session directories that no longer exist are removed
+PRUNE_INTERVAL_SECONDS = 600
+
+@dataclass
+class SaveEntry:
+  name: str
+  path: str
+  mtime_ns: int
+  size: int
+  line_count: int
+  character_count: int
+
+_catalogs: dict[str, dict[str, SaveEntry]] = {}
+_catalogs_lock = threading.Lock()
+_last_prune = 0.0
+
+def _index_path(directory: str) -> str:
+  digest = hashlib.sha256(os.path.abspath(directory).encode("utf-8")).hexdigest()[:16]
+  return os.path.join(CATALOG_CACHE_DIR, f"{digest}.json")
+
+def _read_index(directory: str) -> dict[str, SaveEntry]:
+  try:
+    with open(_index_path(directory), "r") as f:
+      return {e["path"]: SaveEntry(**e) for e in json.load(f)["entries"]}
+  except (OSError, ValueError, TypeError, KeyError):
+    return {}
+
+def _write_index(directory: str, entries: dict[str, SaveEntry]) -> None:
+  os.makedirs(CATALOG_CACHE_DIR, exist_ok=True)
+  temp_path = f"{_index_path(directory)}.part"
+  with open(temp_path, "w") as f:
+    json.dump({ "directory": os.path.abspath(directory), "entries": [asdict(e) for e in entries.values()] }, f)
+  os.replace(temp_path, _index_path(directory))
+
+def _remove_index(directory: str) -> None:
+  with _catalogs_lock:
+    _catalogs.pop(directory, None)
+  try:
+    os.remove(_index_path(directory))
+  except FileNotFoundError:
+    pass
+
+def prune_indexes() -> None:
+  """Remove the indexes of directories that no longer exist, such as the saves of expired sessions."""
+  global _last_prune
+  with _catalogs_lock:
+    if time.time() - _last_prune < PRUNE_INTERVAL_SECONDS:
+      return
+    _last_prune = time.time()
+    for directory in [d for d in _catalogs if not os.path.isdir(d)]:
+      del _catalogs[directory]
+  if not os.path.isdir(CATALOG_CACHE_DIR):
+    return
+  removed = 0
+  for file in os.scandir(CATALOG_CACHE_DIR):
+    if not file.name.endswith(".json"):
+      continue
+    try:
+      with open(file.path, "r") as f:
+        directory = json.load(f)["directory"]
+    except (OSError, ValueError, TypeError, KeyError):
+      # unreadable or written before indexes recorded their directory
+      directory = None
+    if directory is None or not os.path.isdir(directory):
+      try:
+        os.remove(file.path)
+        removed += 1
+      except FileNotFoundError:
+        pass
+  if removed:
+    log(f"removed {removed} stale saved dialogue indexes")
+
+def _index_file(path: str, name: str, stat: os.stat_result) -> SaveEntry:
+  with open(path, "r", encoding="utf-8") as f:
+    data = json.load(f)
+  return SaveEntry(
+    name,
+    path,
+    stat.st_mtime_ns,
+    stat.st_size,
+    len(data.get("dialogue", [])),
+    len(data.get("characters", []))
+  )
+
+def scan_directory(directory: str) -> dict[str, SaveEntry]:
+  """Get the catalog entries for the saved dialogues in a directory, only reading files added or changed since the last scan."""
+  with _catalogs_lock:
+    previous = _catalogs.get(directory)
+  if not os.path.isdir(directory):
+    if previous is not None:
+      _remove_index(directory)
+    return {}
+  if previous is None:
+    previous = _read_index(directory)
+
+  entries: dict[str, SaveEntry] = {}
+  changed = False
+  for file in os.scandir(directory):
+    if not file.name.endswith(".json") or not file.is_file():
+      continue
+    stat = file.stat()
+    entry = previous.get(file.path)
+    if entry is None or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size:
+      try:
+        entry = _index_file(file.path, file.name[:-len(".json")], stat)
+      except (OSError, ValueError) as e:
+        log(f"skipping unreadable saved dialogue {file.path}: {e}")
+        continue
+      changed = True
+    entries[file.path] = entry
+  changed = changed or len(entries) != len(previous)
+
+  if changed:
+    _write_index(directory, entries)
+    log(f"reindexed saved dialogues in {directory}: {len(entries)} entries")
+  with _catalogs_lock:
+    _catalogs[directory] = entries
+  return entries
+
+def load_catalog() -> dict[str, SaveEntry]:
+  """Get the catalog of global and session saved dialogues by name, session saves replace global saves with the same name."""
+  prune_indexes()
+  catalog: dict[str, SaveEntry] = {}
+  for directory in ["./saves", f"./session/{st.session_state.session_id}/saves"]:
+    for entry in scan_directory(directory).values():
+      catalog[entry.name] = entry
+  return dict(sorted(catalog.items()))
+
+def load_dialogues_with_names() -> (list[str], dict[str, SaveEntry]):
+  """Load saved dialogue names from the catalog of the saves directories."""
+  catalog = load_catalog()
+  return list(catalog.keys()), catalog
+
+@lru_cache(maxsize=32)
+def _read_saved_dialogue(path: str, mtime_ns: int, size: int) -> dict:
+  with open(path, "r", encoding="utf-8") as f:
+    return json.load(f)
+
+def load_saved_dialogue(entry: SaveEntry) -> dict:
+  """Load the characters, plot and dialogue for a catalog entry, built fresh so sessions never share them."""
+  return parse_saved_dialogue(_read_saved_dialogue(entry.path, entry.mtime_ns, entry.size))
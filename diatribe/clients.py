@@ -0,0 +1,179 @@
+import os, json, threading
+import httpx
+from dataclasses import dataclass
+from typing import Iterator
+from openai import OpenAI
+from diatribe.utils import log
+
+try:
+  import h2
+  HTTP2_AVAILABLE = True
+except ImportError:
+  HTTP2_AVAILABLE = False
+
+ELEVEN_BASE_URL = os.getenv("ELEVEN_BASE_URL", "https://api.elevenlabs.io/v1")
+MAX_CONNECTIONS = int(os.getenv("DIATRIBE_MAX_CONNECTIONS", "20"))
+KEEPALIVE_SECONDS = 60
+OPENAI_TIMEOUT = httpx.Timeout(180, connect=10)
+ELEVEN_TIMEOUT = httpx.Timeout(120, connect=10)
+
+class SpeechAPIError(Exception):
+  """An error response from the ElevenLabs API, carrying the status code so throttled requests can be retried."""
+
+  def __init__(self, status_code: int, message: str) -> None:
+    super().__init__(f"ElevenLabs API returned {status_code}: {message}")
+    self.status_code = status_code
+    self.message = message
+
+@dataclass
+class PoolStats:
+  name: str
+  clients: int
+  http2: bool
+  requests: int
+  connections: int
+  handshakes: int
+
+  @property
+  def reused(self) -> int:
+    """Requests sent over a connection that was already open."""
+    return max(0, self.requests - self.connections)
+
+class _PoolCounter:
+  """Counts the requests sent through a pool and the connections and TLS handshakes it had to make for them."""
+
+  def __init__(self) -> None:
+    self.requests = 0
+    self.connections = 0
+    self.handshakes = 0
+    self._lock = threading.Lock()
+
+  def trace(self, event: str, info: dict) -> None:
+    if event == "connection.connect_tcp.complete":
+      with self._lock:
+        self.connections += 1
+    elif event == "connection.start_tls.complete":
+      with self._lock:
+        self.handshakes += 1
+
+  def on_request(self, request: httpx.Request) -> None:
+    with self._lock:
+      self.requests += 1
+    request.extensions["trace"] = self.trace
+
+def _http_client(counter: _PoolCounter, timeout: httpx.Timeout, **kwargs) -> httpx.Client:
+  return httpx.Client(
+    http2=HTTP2_AVAILABLE,
+    timeout=timeout,
+    limits=httpx.Limits(
+      max_connections=MAX_CONNECTIONS,
+      max_keepalive_connections=MAX_CONNECTIONS,
+      keepalive_expiry=KEEPALIVE_SECONDS
+    ),
+    event_hooks={"request": [counter.on_request]},
+    **kwargs
+  )
+
+class ClientRegistry:
+  """
+  One OpenAI client and one ElevenLabs HTTP client for each API key, shared by every session and thread so
+  requests reuse open keep-alive connections instead of making a new connection and TLS handshake each time.
+  """
+
+  def __init__(self) -> None:
+    self._openai: dict[str, OpenAI] = {}
+    self._eleven: dict[str, httpx.Client] = {}
+    self._openai_counter = _PoolCounter()
+    self._eleven_counter = _PoolCounter()
+    self._lock = threading.Lock()
+
+  def openai(self, api_key: str) -> OpenAI:
+    """Get the OpenAI client for the API key."""
+    with self._lock:
+      client = self._openai.get(api_key)
+      if client is None:
+        http_client = _http_client(self._openai_counter, OPENAI_TIMEOUT)
+        client = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, http_client=http_client)
+        self._openai[api_key] = client
+        log(f"created OpenAI client (http2: {HTTP2_AVAILABLE})")
+      return client
+
+  def elevenlabs(self, api_key: str = None) -> httpx.Client:
+    """Get the ElevenLabs HTTP client for the API key, which defaults to the key set in the sidebar."""
+    api_key = api_key or os.getenv("ELEVEN_API_KEY", "")
+    with self._lock:
+      client = self._eleven.get(api_key)
+      if client is None:
+        client = _http_client(
+          self._eleven_counter,
+          ELEVEN_TIMEOUT,
+          base_url=ELEVEN_BASE_URL,
+          headers={"xi-api-key": api_key}
+        )
+        self._eleven[api_key] = client
+        log(f"created ElevenLabs client (http2: {HTTP2_AVAILABLE})")
+      return client
+
+  def stats(self) -> list[PoolStats]:
+    """Get the request, connection and handshake counters of the OpenAI and ElevenLabs pools."""
+    with self._lock:
+      pools = [("OpenAI", len(self._openai), self._openai_counter), ("ElevenLabs", len(self._eleven), self._eleven_counter)]
+    return [
+      PoolStats(name, clients, HTTP2_AVAILABLE, counter.requests, counter.connections, counter.handshakes)
+      for name, clients, counter in pools
+    ]
+
+  def close(self) -> None:
+    """Close every pooled connection."""
+    with self._lock:
+      for client in self._openai.values():
+        client.close()
+      for client in self._eleven.values():
+        client.close()
+      self._openai.clear()
+      self._eleven.clear()
+
+clients = ClientRegistry()
+
+def _raise_for_status(response: httpx.Response) -> None:
+  if response.status_code < 400:
+    return
+  response.read()
+  try:
+    detail = response.json().get("detail", response.text)
+  except (ValueError, AttributeError):
+    detail = response.text
+  if isinstance(detail, dict):
+    detail = detail.get("message", json.dumps(detail))
+  raise SpeechAPIError(response.status_code, str(detail))
+
+def _speech_request(text: str, model_id: str, voice_settings: dict) -> dict:
+  return {
+    "text": text,
+    "model_id": model_id,
+    "voice_settings": voice_settings
+  }
+
+def text_to_speech(voice_id: str, text: str, model_id: str, voice_settings: dict, api_key: str = None) -> bytes:
+  """Generate the mp3 audio for the text over the pooled ElevenLabs connection."""
+  response = clients.elevenlabs(api_key).post(
+    f"/text-to-speech/{voice_id}",
+    json=_speech_request(text, model_id, voice_settings)
+  )
+  _raise_for_status(response)
+  return response.content
+
+def text_to_speech_stream(voice_id: str, text: str, model_id: str, voice_settings: dict, api_key: str = None) -> Iterator[bytes]:
+  """Generate the mp3 audio for the text, yielding the chunks as they arrive over the pooled ElevenLabs connection."""
+  request = _speech_request(text, model_id, voice_settings)
+  with clients.elevenlabs(api_key).stream("POST", f"/text-to-speech/{voice_id}/stream", json=request) as response:
+    _raise_for_status(response)
+    for chunk in response.iter_bytes():
+      if chunk:
+        yield chunk
+
+def eleven_get(path: str, api_key: str = None) -> dict:
+  """Get a JSON resource from the ElevenLabs API over the pooled connection."""
+  response = clients.elevenlabs(api_key).get(path)
+  _raise_for_status(response)
+  return response.json()
@@ -0,0 +1,48 @@
+import os
+from diatribe.disk_cache import DiskCache
+
+DEFAULT_CACHE_DIR = "./cache/completions"
+DEFAULT_MAX_BYTES = int(os.getenv("DIATRIBE_COMPLETION_CACHE_MB", "64")) * 1024 * 1024
+# by default only completions requested at temperature 0 are reused, at higher temperatures asking again gives a new take
+DETERMINISTIC_ONLY = os.getenv("DIATRIBE_COMPLETION_CACHE_DETERMINISTIC_ONLY", "1") == "1"
+
+class CompletionCache(DiskCache):
+  """A cache of OpenAI completions keyed on the whole request, kept on disk and shared by every session."""
+
+  SUFFIX = ".txt"
+  NAME = "completion"
+
+  def __init__(
+    self,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    deterministic_only: bool = DETERMINISTIC_ONLY
+  ) -> None:
+    super().__init__(cache_dir, max_bytes)
+    self.deterministic_only = deterministic_only
+
+  @staticmethod
+  def make_key(
+    model: str,
+    temperature: float,
+    max_tokens: int,
+    system_prompt: str,
+    input_prompt: str
+  ) -> str:
+    """Hash everything sent to OpenAI into a cache key."""
+    return DiskCache.hash_request(model, temperature, max_tokens, system_prompt, input_prompt)
+
+  def cacheable(self, temperature: float) -> bool:
+    """Check whether completions requested at the temperature are reused."""
+    return not self.deterministic_only or temperature == 0
+
+  def get_text(self, key: str) -> str:
+    """Return the cached completion for the key or None."""
+    content = self.get(key)
+    return content.decode("utf-8") if content is not None else None
+
+  def put_text(self, key: str, content: str) -> None:
+    """Store the completion for the key."""
+    self.put(key, content.encode("utf-8"))
+
+completion_cache = CompletionCache()
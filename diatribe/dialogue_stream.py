@@ -0,0 +1,89 @@
+import re, json
+from diatribe.utils import log
+
+DIALOGUE_ARRAY = re.compile(r'"dialogue"\s*:\s*\[')
+# enough of the tail to find the start of the array when it is split across chunks
+SEARCH_OVERLAP = 64
+
+class DialogueRowParser:
+  """
+  Pull the rows of the "dialogue" array out of a JSON response while it is still streaming in. Each
+  row is returned as soon as its closing brace arrives, so the rest of the document can still be
+  incomplete.
+  """
+
+  def __init__(self) -> None:
+    self.rows = 0
+    self._buffer = ""
+    self._search_from = 0
+    self._pos = 0
+    self._in_array = False
+    self._done = False
+    self._depth = 0
+    self._row_start = None
+    self._in_string = False
+    self._escaped = False
+
+  @property
+  def done(self) -> bool:
+    return self._done
+
+  def feed(self, text: str) -> list[dict]:
+    """Add the next chunk of the response and return the rows it completed."""
+    if self._done:
+      return []
+    self._buffer += text
+    if not self._in_array:
+      match = DIALOGUE_ARRAY.search(self._buffer, self._search_from)
+      if match is None:
+        self._search_from = max(0, len(self._buffer) - SEARCH_OVERLAP)
+        return []
+      self._in_array = True
+      self._pos = match.end()
+
+    rows = []
+    buffer = self._buffer
+    while self._pos < len(buffer):
+      c = buffer[self._pos]
+      if self._in_string:
+        if self._escaped:
+          self._escaped = False
+        elif c == "\\":
+          self._escaped = True
+        elif c == '"':
+          self._in_string = False
+      elif c == '"':
+        self._in_string = True
+      elif c in "{[":
+        if self._depth == 0 and c == "{":
+          self._row_start = self._pos
+        self._depth += 1
+      elif c in "}]":
+        if self._depth == 0:
+          # the end of the dialogue array
+          self._done = True
+          break
+        self._depth -= 1
+        if self._depth == 0 and self._row_start is not None:
+          row = self._parse_row(buffer[self._row_start:self._pos + 1])
+          if row is not None:
+            rows.append(row)
+          self._row_start = None
+      self._pos += 1
+
+    if self._depth == 0:
+      # nothing before the scan position is needed any more
+      self._buffer = buffer[self._pos:]
+      self._pos = 0
+    return rows
+
+  def _parse_row(self, text: str) -> dict:
+    try:
+      row = json.loads(text)
+    except ValueError as e:
+      log(f"skipping unreadable dialogue row: {e}")
+      return None
+    if not isinstance(row, dict):
+      return None
+    self.rows += 1
+    return row
@@ -1,25 +1,46 @@
-import json, os, re
+import os, re
+import orjson
 import pandas as pd
 import streamlit as st
-from pathlib import Path
 from elevenlabs import Voice
-from diatribe.el_audio import get_voice_id
-from diatribe.utils import log
+from diatribe.el_audio import get_voice_ids
+from diatribe.utils import log, extract_name
 
 class Character:
+  """A speaker in the dialogue. Characters are treated as immutable once created so their dictionary form can be cached."""
+  __slots__ = ("name", "voice", "voice_id", "description", "_dict")
+
   def __init__(self, name: str, voice: str, voice_id: str, description: str = "") -> None:
     self.name = name
     self.voice = voice
     self.voice_id = voice_id
     self.description = description
+    self._dict = None
+  
+  @classmethod
+  def from_dataframe(cls, characters_df: pd.DataFrame, voices: list[Voice]) -> list["Character"]:
+    """Build characters from the columns of the character table without iterating over rows."""
+    if characters_df.empty:
+      return []
+    voice_ids = get_voice_ids(voices)
+    return [
+      cls(name, voice, voice_ids.get(extract_name(voice), "") if isinstance(voice, str) else "", description=description)
+      for name, voice, description in zip(
+        characters_df["Name"].tolist(),
+        characters_df["Voice"].tolist(),
+        characters_df["Description"].tolist()
+      )
+    ]
   
   def to_dict(self) -> dict:
-    return {
-      "Name": self.name,
-      "Voice": self.voice,
-      "Voice_ID": self.voice_id,
-      "Description": self.description
-    }
+    if self._dict is None:
+      self._dict = {
+        "Name": self.name,
+        "Voice": self.voice,
+        "Voice_ID": self.voice_id,
+        "Description": self.description
+      }
+    return self._dict
   
   def __str__(self):
     return f"{self.name};{self.voice};{self.voice_id}"
@@ -29,27 +50,86 @@ class Character:
 
 
 class Dialogue:
+  """A line of the dialogue. Lines are treated as immutable once created so their dictionary form can be cached."""
+  __slots__ = ("character", "line", "text", "_dict", "_dict_without_line")
+
   def __init__(self, character: Character, line: int, text: str):
     self.character = character
     self.line = line
     self.text = text
+    self._dict = None
+    self._dict_without_line = None
+  
+  @classmethod
+  def from_dataframe(cls, dialogue_df: pd.DataFrame, registry: "CharacterRegistry", line_offset: int = 0) -> list["Dialogue"]:
+    """Build dialogue lines from the columns of the dialogue table, skipping speakers that are not in the registry."""
+    if dialogue_df.empty:
+      return []
+    dialogue: list[Dialogue] = []
+    for index, speaker, text in zip(dialogue_df.index.tolist(), dialogue_df["Speaker"].tolist(), dialogue_df["Text"].tolist()):
+      character = registry.get(speaker)
+      if character is None:
+        log(f"{speaker} is not a valid character")
+        continue
+      dialogue.append(cls(character, index + line_offset, text))
+    return dialogue
   
   def to_dict(self, without_line: bool = False) -> dict:
     if without_line:
-      return {
-        "Speaker": self.character.name,
-        "Text": self.text
-      }
+      if self._dict_without_line is None:
+        self._dict_without_line = {
+          "Speaker": self.character.name,
+          "Text": self.text
+        }
+      return self._dict_without_line
     else:
-      return {
-        "Speaker": self.character.name,
-        "Line": self.line,
-        "Text": self.text
-      }
+      if self._dict is None:
+        self._dict = {
+          "Speaker": self.character.name,
+          "Line": self.line,
+          "Text": self.text
+        }
+      return self._dict
     
   def __str__(self):
     return f"[{self.line}] {self.character.name}: {self.text}"
 
+class CharacterRegistry:
+  """Characters indexed by name and voice ID so speakers resolve in constant time."""
+
+  def __init__(self, characters: list[Character] = None) -> None:
+    self.characters: list[Character] = []
+    self._by_name: dict[str, Character] = {}
+    self._by_voice_id: dict[str, Character] = {}
+    for character in characters or []:
+      self.add(character)
+
+  def add(self, character: Character) -> None:
+    """Add a character, the first character added with a name or voice ID wins lookups."""
+    self.characters.append(character)
+    self._by_name.setdefault(character.name, character)
+    self._by_voice_id.setdefault(character.voice_id, character)
+
+  def get(self, name: str) -> Character:
+    """Get the character with the name or None."""
+    return self._by_name.get(name)
+
+  def get_by_voice_id(self, voice_id: str) -> Character:
+    """Get the character using the voice ID or None."""
+    return self._by_voice_id.get(voice_id)
+
+  def names(self) -> list[str]:
+    return [c.name for c in self.characters]
+
+  def __contains__(self, name: str) -> bool:
+    return name in self._by_name
+
+  def __iter__(self):
+    return iter(self.characters)
+
+  def __len__(self) -> int:
+    return len(self.characters)
+
 def generate_dialogue_details(
   characters_df: pd.DataFrame, 
   dialogue_df: pd.DataFrame, 
@@ -57,51 +137,33 @@ def generate_dialogue_details(
   plot: str = None
 ) -> dict:
   """Generate dialogue details in a common format suitiable for JSON."""
-  characters: list[Character] = []
-  for i, c in characters_df.iterrows():
-    characters.append(Character(c["Name"], c["Voice"], get_voice_id(c["Voice"], voices), description=c["Description"]))
-  dialogue: list[Dialogue] = []
-  for i, d in dialogue_df.iterrows():
-    character = next((c for c in characters if c.name == d["Speaker"]), None)
-    dialogue.append(Dialogue(character, i, d["Text"]).to_dict()) 
+  characters = Character.from_dataframe(characters_df, voices)
+  dialogue = Dialogue.from_dataframe(dialogue_df, CharacterRegistry(characters))
   dialogue_details = {
     "characters": [c.to_dict() for c in characters],
     "plot": plot,
-    "dialogue": dialogue
+    "dialogue": [d.to_dict() for d in dialogue]
   }  
   return dialogue_details 
 
-def load_saved_dialogues() -> dict:
-  """Load saved dialogues from the saves directory."""
-  global_directory = Path("./saves")
-  session_directory = Path(f"./session/{st.session_state.session_id}/saves")
-  files = list(global_directory.glob("*.json")) + list(session_directory.glob("*.json"))
-  names = {}
-  for json_file in files:
-    characters = []
-    dialogues = []
-    with open(json_file, "r") as f:
-      data = json.load(f)
-      plot = data["plot"] if "plot" in data and data["plot"] is not None else ""
-
-      for character in data["characters"]:
-        characters.append(Character(
-          character["Name"], 
-          character["Voice"], 
-          character["Voice_ID"], 
-          description=character["Description"] if "Description" in character else ""
-        ))
-      for dialogue in data["dialogue"]:
-        character = next((c for c in characters if c.name == dialogue["Speaker"]), None)
-        dialogues.append(Dialogue(character, dialogue["Line"], dialogue["Text"]))
-    names[json_file.stem] = { "characters": characters, "plot": plot, "dialogue": dialogues }
-  return names
-
-def load_dialogues_with_names() -> (list[str], dict):
-  """Load saved dialogues with their names from the saves directory."""
-  saved_dialogues = load_saved_dialogues()
-  saved_names = list(saved_dialogues.keys())  
-  return saved_names, saved_dialogues
+def parse_saved_dialogue(data: dict) -> dict:
+  """Build the characters, plot and dialogue from the contents of a saved dialogue file."""
+  characters = []
+  dialogues = []
+  plot = data["plot"] if "plot" in data and data["plot"] is not None else ""
+
+  for character in data["characters"]:
+    characters.append(Character(
+      character["Name"], 
+      character["Voice"], 
+      character["Voice_ID"], 
+      description=character["Description"] if "Description" in character else ""
+    ))
+  registry = CharacterRegistry(characters)
+  for dialogue in data["dialogue"]:
+    character = registry.get(dialogue["Speaker"])
+    dialogues.append(Dialogue(character, dialogue["Line"], dialogue["Text"]))
+  return { "characters": characters, "plot": plot, "dialogue": dialogues }
 
 def convert_dialogue_import_into_details(data: str, voices: list[Voice]) -> dict:
   """Convert the imported dialogue into a common format."""
@@ -127,7 +189,6 @@ def convert_dialogue_import_into_details(data: str, voices: list[Voice]) -> dict
     if line.startswith("#"):
       continue
     speaker, text = line.split(":")
-    character = next((c for c in characters if c["Name"] == speaker), None)
     dialogues.append({ "Speaker": speaker, "Text": text.strip() })
   
   log(f"Importing: characters:{len(characters)}, plot:{len(plot) > 0}, dialogue:{len(dialogues)}")
@@ -166,21 +227,25 @@ def export_dialogue(
   dialogue_details = generate_dialogue_details(characters, dialogue, voices, plot=plot)
   dialogue_export = convert_dialogue_details_into_export(dialogue_details)
   os.makedirs(os.path.dirname(save_filename), exist_ok=True)     
-  with open(save_filename, "w") as f:
+  with open(save_filename, "w", encoding="utf-8") as f:
     f.write(dialogue_export)  
 
+def dumps_dialogue_details(dialogue_details: dict) -> str:
+  """Encode dialogue details as indented JSON with orjson, which writes UTF-8 rather than escaping it."""
+  return orjson.dumps(dialogue_details, option=orjson.OPT_INDENT_2).decode("utf-8")
+
 def save_dialogue(
   characters: pd.DataFrame, 
   dialogue: pd.DataFrame, 
   voices: list[Voice],
   save_filename: str
 ) -> None:
-  """Save a dialogue to a JSON file."""""
+  """Save a dialogue to a JSON file."""
   plot = st.session_state["plot"] if "plot" in st.session_state else None
   dialogue_details = generate_dialogue_details(characters, dialogue, voices, plot=plot) 
   os.makedirs(os.path.dirname(save_filename), exist_ok=True)     
-  with open(save_filename, "w") as f:
-    json.dump(dialogue_details, f, indent=2)  
+  with open(save_filename, "w", encoding="utf-8") as f:
+    f.write(dumps_dialogue_details(dialogue_details))
 
 def character_change(character_changes: dict) -> bool:
   """Check if characters where changed."""
@@ -209,7 +274,7 @@ def characters_match(characters: pd.DataFrame, dialogue: pd.DataFrame) -> bool:
   It is okay if there are more characters in characters than dialogue.
   """
   characters_in_dialogue = list(dialogue["Speaker"])
-  characters_in_character_table = list(characters["Name"])
+  characters_in_character_table = set(characters["Name"])
   missing = False
   for c in characters_in_dialogue:
     if c not in characters_in_character_table:
@@ -0,0 +1,110 @@
+import os, json, hashlib, threading, tempfile
+from dataclasses import dataclass
+from diatribe.utils import log
+
+@dataclass
+class CacheStats:
+  hits: int
+  misses: int
+  entries: int
+  size_bytes: int
+
+class DiskCache:
+  """A content addressed cache of files on disk shared by every session, evicting the least recently used entries."""
+
+  SUFFIX = ".bin"
+  NAME = "disk"
+
+  def __init__(self, cache_dir: str, max_bytes: int) -> None:
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    self.hits = 0
+    self.misses = 0
+    self._lock = threading.Lock()
+    self._entry_count = None
+    self._size_bytes = None
+
+  @staticmethod
+  def hash_request(*parts) -> str:
+    """Hash the JSON encoded parts of a request into a cache key."""
+    return hashlib.sha256(json.dumps(list(parts)).encode("utf-8")).hexdigest()
+
+  def _path(self, key: str) -> str:
+    return os.path.join(self.cache_dir, f"{key}{self.SUFFIX}")
+
+  def get(self, key: str) -> bytes:
+    """Return the cached content for the key or None, marking the entry as recently used."""
+    path = self._path(key)
+    try:
+      with open(path, "rb") as f:
+        content = f.read()
+      os.utime(path)
+    except FileNotFoundError:
+      with self._lock:
+        self.misses += 1
+      return None
+    with self._lock:
+      self.hits += 1
+    return content
+
+  def contains(self, key: str) -> bool:
+    """Check whether content is cached for the key without counting a hit or miss."""
+    return os.path.exists(self._path(key))
+
+  def put(self, key: str, content: bytes) -> None:
+    """Store the content for the key and evict the least recently used entries if over budget."""
+    path = self._path(key)
+    os.makedirs(self.cache_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+    with os.fdopen(fd, "wb") as f:
+      f.write(content)
+    with self._lock:
+      self._load_totals()
+      try:
+        replaced = os.path.getsize(path)
+      except FileNotFoundError:
+        replaced = None
+      os.replace(temp_path, path)
+      if replaced is None:
+        self._entry_count += 1
+      self._size_bytes += len(content) - (replaced or 0)
+      if self._size_bytes > self.max_bytes:
+        self._evict()
+
+  def _load_totals(self) -> None:
+    """Scan the cache once for its entry count and size, after that they are kept up to date as entries change."""
+    if self._size_bytes is None:
+      self._entry_count, self._size_bytes = self._scan()
+
+  def _entries(self) -> list[os.DirEntry]:
+    if not os.path.isdir(self.cache_dir):
+      return []
+    return [e for e in os.scandir(self.cache_dir) if e.name.endswith(self.SUFFIX)]
+
+  def _scan(self) -> (int, int):
+    entries = self._entries()
+    return len(entries), sum(e.stat().st_size for e in entries)
+
+  def _evict(self) -> None:
+    entries = sorted(self._entries(), key=lambda e: e.stat().st_mtime)
+    size = sum(e.stat().st_size for e in entries)
+    target = self.max_bytes * 0.9
+    evicted = 0
+    for entry in entries:
+      if size <= target:
+        break
+      try:
+        size -= entry.stat().st_size
+        os.remove(entry.path)
+        evicted += 1
+      except FileNotFoundError:
+        pass
+    self._entry_count = len(entries) - evicted
+    self._size_bytes = size
+    log(f"evicted {evicted} entries from the {self.NAME} cache")
+
+  def stats(self) -> CacheStats:
+    """Get the hit and miss counters along with the size of the cache."""
+    with self._lock:
+      self._load_totals()
+      return CacheStats(self.hits, self.misses, self._entry_count, self._size_bytes)
@@ -0,0 +1,102 @@
+import os, threading
+from dataclasses import dataclass
+from pydub import AudioSegment as seg
+from diatribe.audio_cache import load_audio
+from diatribe.audio_metadata import probe_mp3
+from diatribe.utils import log
+
+BUNDLED_EFFECTS_DIR = "./effects"
+EFFECT_FORMATS = {"mp3", "wav", "aiff", "aif", "flac", "ogg"}
+
+@dataclass(frozen=True)
+class EffectInfo:
+  name: str
+  path: str
+  format: str
+  duration: float
+  frame_rate: int
+  bundled: bool
+
+def effect_name(file: str) -> str:
+  """Get the display name of an effect from its filename."""
+  name = os.path.splitext(os.path.basename(file))[0]
+  return name.replace("_", " ")
+
+def _effect_files(directory: str) -> list[str]:
+  if not os.path.isdir(directory):
+    return []
+  files = [e.path for e in os.scandir(directory) if e.is_file()]
+  return sorted(f for f in files if os.path.splitext(f)[1][1:].lower() in EFFECT_FORMATS)
+
+class EffectIndex:
+  """
+  Index of the bundled and uploaded effects by name. The bundled effects are decoded once and kept in
+  memory, a session's uploads are indexed on first use and again only after a new upload.
+  """
+
+  def __init__(self, bundled_dir: str = BUNDLED_EFFECTS_DIR) -> None:
+    self.bundled_dir = bundled_dir
+    self._bundled: dict[str, EffectInfo] = None
+    self._decoded: dict[str, seg] = {}
+    self._sessions: dict[str, dict[str, EffectInfo]] = {}
+    self._lock = threading.Lock()
+
+  def _index_bundled(self) -> dict[str, EffectInfo]:
+    with self._lock:
+      if self._bundled is None:
+        bundled = {}
+        for path in _effect_files(self.bundled_dir):
+          file_format = os.path.splitext(path)[1][1:].lower()
+          try:
+            audio = seg.from_file(path)
+          except Exception as e:
+            # still list it, the effect is decoded again when it is used
+            log(f"could not decode effect {path}: {e}")
+            bundled[effect_name(path)] = EffectInfo(effect_name(path), path, file_format, None, None, True)
+            continue
+          self._decoded[os.path.abspath(path)] = audio
+          info = EffectInfo(effect_name(path), path, file_format, audio.duration_seconds, audio.frame_rate, True)
+          bundled[info.name] = info
+        self._bundled = bundled
+        log(f"indexed {len(bundled)} bundled effects")
+      return self._bundled
+
+  def _index_session(self, session_dir: str) -> dict[str, EffectInfo]:
+    with self._lock:
+      if session_dir in self._sessions:
+        return self._sessions[session_dir]
+    effects = {}
+    for path in _effect_files(session_dir):
+      file_format = os.path.splitext(path)[1][1:].lower()
+      duration, frame_rate = probe_mp3(path) if file_format == "mp3" else (None, None)
+      if duration is None:
+        audio = load_audio(path)
+        duration, frame_rate = audio.duration_seconds, audio.frame_rate
+      info = EffectInfo(effect_name(path), path, file_format, duration, frame_rate, False)
+      effects[info.name] = info
+    with self._lock:
+      self._sessions[session_dir] = effects
+    return effects
+
+  def effects(self, session_dir: str) -> dict[str, EffectInfo]:
+    """Get every effect available to the session, with bundled effects taking precedence over uploads of the same name."""
+    return {**self._index_session(session_dir), **self._index_bundled()}
+
+  def names(self, session_dir: str) -> list[str]:
+    return sorted(self.effects(session_dir))
+
+  def get(self, name: str, session_dir: str) -> EffectInfo:
+    return self.effects(session_dir).get(name)
+
+  def load(self, path: str) -> seg:
+    """Get the decoded effect, from memory for bundled effects and through the decoded audio cache otherwise."""
+    self._index_bundled()
+    audio = self._decoded.get(os.path.abspath(path))
+    return audio if audio is not None else load_audio(path)
+
+  def invalidate(self, session_dir: str) -> None:
+    """Forget the session's uploads so they are indexed again, called after an upload."""
+    with self._lock:
+      self._sessions.pop(session_dir, None)
+
+effect_index = EffectIndex()
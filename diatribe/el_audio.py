@@ -1,33 +1,23 @@
-import os, glob, shutil, io
+import os, glob, shutil, io, subprocess, itertools
+from contextlib import ExitStack
 import streamlit as st
-import numpy as np
 import matplotlib.pyplot as plt
 import diatribe.utils as utils
-from elevenlabs import Voice, VoiceSettings, Model, Models, voices as el_voices, generate as el_generate
+from elevenlabs import Voice, Voices, Model, Models
 from pydub import AudioSegment as seg
 from diatribe.sidebar import SidebarData
 from diatribe.utils import log
-from pedalboard import Pedalboard, Compressor, Chorus, Reverb, Distortion, NoiseGate, Limiter
-from pedalboard.io import AudioFile
-from dataclasses import dataclass
+from diatribe.tts_cache import tts_cache
+from diatribe.clients import text_to_speech, text_to_speech_stream, eleven_get
+from diatribe.scheduler import tts_schedulers
+from diatribe.audio_cache import load_audio, decoded_audio_cache
+from diatribe.waveform import render_waveform, render_peaks, cached_waveform, figure_png, pcm_array, PeakBuilder, peaks_for_audio, write_peaks, load_peaks, peaks_path
+from diatribe.audio_metadata import read_metadata, write_metadata, metadata_path, probe_mp3_duration
+from diatribe.basic_edit import apply_basic_edits
+from diatribe.effects import effect_index
+from diatribe.soundboard import Soundboard, NORMALIZATION_SOUNDBOARD, pedalboard_cache, pcm_to_float, float_to_pcm, apply_soundboard
 from pathlib import Path
-
-@dataclass
-class Soundboard:
-  compressor_threshold_db: float = 0
-  compressor_ratio: float = 0
-  chorus_rate_hz: float = 0
-  chorus_depth: float = 0
-  chorus_centre_delay: float = 0
-  chorus_feedback: float = 0
-  reverb_room_size: float = 0
-  reverb_damping: float = 0
-  reverb_web_level: float = 0
-  reverb_dry_level: float = 0
-  distortion_db: float = 0
-  noise_gate_threshold_db: float = 0
-  noise_gate_ratio: float = 0
-  limiter_threshold_db: float = 0
+from typing import Callable, Iterator
 
 class Basic:
   duration: int
@@ -89,7 +79,7 @@ class Basic:
 @st.cache_data
 def get_voices() -> list[Voice]:
   """Get a list of voices from the Eleven Labs API."""
-  voices: list[Voice] = list(el_voices())
+  voices: list[Voice] = list(Voices(**eleven_get("/voices")))
   voices.sort(key=lambda x: x.name)
   return voices
 
@@ -102,49 +92,153 @@ def get_voice_id(voice_name: str, voices: list[Voice]) -> str:
   else:
     return ""
 
+def get_voice_ids(voices: list[Voice]) -> dict[str, str]:
+  """Get the voice IDs keyed by voice name, the first voice with a name wins like get_voice_id."""
+  voice_ids: dict[str, str] = {}
+  for v in voices:
+    voice_ids.setdefault(v.name, v.voice_id)
+  return voice_ids
+
 @st.cache_data
 def get_models() -> list[Model]:
   """Get a list of speech models from the Eleven Labs API."""
-  return list(Models.from_api())
+  return list(Models(models=eleven_get("/models")))
+
+def get_cache_key(text: str, voice_id: str, sidebar_data: SidebarData) -> str:
+  """Get the speech cache key for the text spoken by the voice with the sidebar settings."""
+  return tts_cache.make_key(
+    text,
+    voice_id,
+    sidebar_data.model_id,
+    sidebar_data.stability,
+    sidebar_data.simarlity_boost,
+    sidebar_data.style
+  )
+
+def get_voice_settings(sidebar_data: SidebarData) -> dict:
+  """Get the voice settings from the sidebar."""
+  return {
+    "stability": sidebar_data.stability,
+    "similarity_boost": sidebar_data.simarlity_boost,
+    "style": sidebar_data.style,
+    "use_speaker_boost": True
+  }
 
 def generate(
   text: str,
   voice_id: str,
-  sidebar_data: SidebarData 
+  sidebar_data: SidebarData,
+  use_cache: bool = True
 ) -> bytes:
-  """Generate audio from a dialogue."""
-  audio = el_generate(
-    text=text,
-    model=sidebar_data.model_id,
-    voice = Voice(
-      voice_id=voice_id,
-      settings=VoiceSettings(
-        stability=sidebar_data.stability,
-        similarity_boost=sidebar_data.simarlity_boost,
-        style=sidebar_data.style
-      )
-    )
-  )  
+  """
+  Generate audio from a dialogue, reusing cached audio for identical requests.
+  Without the cache a new take is always requested and replaces the cached one.
+  """
+  cache_key = get_cache_key(text, voice_id, sidebar_data)
+  audio = tts_cache.get(cache_key) if use_cache else None
+  if audio is not None:
+    return audio
+  audio = tts_schedulers.get(sidebar_data.el_key).request(lambda: text_to_speech(
+    voice_id,
+    text,
+    sidebar_data.model_id,
+    get_voice_settings(sidebar_data),
+    sidebar_data.el_key
+  ))
+  tts_cache.put(cache_key, audio)
   return audio
 
+def generate_stream(
+  text: str,
+  voice_id: str,
+  sidebar_data: SidebarData,
+  use_cache: bool = True
+) -> Iterator[bytes]:
+  """Generate audio from a dialogue as chunks arrive, reusing cached audio for identical requests unless the cache is skipped."""
+  cache_key = get_cache_key(text, voice_id, sidebar_data)
+  audio = tts_cache.get(cache_key) if use_cache else None
+  if audio is not None:
+    yield audio
+    return
+  scheduler = tts_schedulers.get(sidebar_data.el_key)
+
+  def open_stream() -> (ExitStack, Iterator[bytes]):
+    # each attempt takes its own slot and gives it back if it fails, so the backoff does not hold a slot
+    slot = ExitStack()
+    slot.enter_context(scheduler.slot())
+    try:
+      # the request is only sent once the first chunk is read, so read it here where it can be retried
+      stream = text_to_speech_stream(
+        voice_id,
+        text,
+        sidebar_data.model_id,
+        get_voice_settings(sidebar_data),
+        sidebar_data.el_key
+      )
+      first_chunk = next(stream, b"")
+    except BaseException:
+      slot.close()
+      raise
+    return slot, itertools.chain([first_chunk], stream)
+
+  chunks: list[bytes] = []
+  slot, stream = scheduler.retry(open_stream)
+  with slot:
+    for chunk in stream:
+      chunks.append(chunk)
+      yield chunk
+  tts_cache.put(cache_key, b"".join(chunks))
+
+def get_audio_dir() -> str:
+  """Get the audio directory for the current session."""
+  return f"./session/{st.session_state.session_id}/audio"
+
 def generate_and_save(
   text: str,
   voice_id: str,
   line: int,
-  sidebar_data: SidebarData
+  sidebar_data: SidebarData,
+  audio_dir: str = None,
+  use_cache: bool = True
 ) -> str:
-  """Generate audio from a dialogue and save it to a file."""
-  audio = generate(text, voice_id, sidebar_data)
-  audio_file = f"./session/{st.session_state.session_id}/audio/line{line}.mp3"
+  """
+  Generate audio from a dialogue and save it to a file, skipping the speech cache to get a new take when use_cache is off.
+  When streaming is enabled the chunks are written to a partial file as they arrive, which is
+  renamed into place once complete so the line file only ever exists when it is ready to play.
+  """
+  audio_dir = audio_dir or get_audio_dir()
+  audio_file = f"{audio_dir}/line{line}.mp3"
   os.makedirs(os.path.dirname(audio_file), exist_ok=True)
-  with open(audio_file, "wb") as f:
-    f.write(audio)  
+  if sidebar_data.enable_streaming:
+    partial_file = f"{audio_file}.part"
+    try:
+      with open(partial_file, "wb") as f:
+        for chunk in generate_stream(text, voice_id, sidebar_data, use_cache):
+          f.write(chunk)
+    except Exception:
+      os.remove(partial_file)
+      raise
+    os.replace(partial_file, audio_file)
+  else:
+    audio = generate(text, voice_id, sidebar_data, use_cache)
+    with open(audio_file, "wb") as f:
+      f.write(audio)  
+  # a redo rewrites the line file, so drop the decoded copy of the old take
+  decoded_audio_cache.invalidate(audio_file)
+  write_sidecars(audio_file, load_audio(audio_file))
   return audio_file
 
+def write_sidecars(audio_file: str, audio: seg) -> None:
+  """Write the metadata and peaks files that let the UI show the audio without decoding it."""
+  write_metadata(audio_file, audio)
+  write_peaks(audio_file, peaks_for_audio(audio))
+
 def export_audio() -> None:
   """Export the audio files from the audio folder to the export folder."""
-  src_dir = f"./session/{st.session_state.session_id}/audio"
-  dst_dir = f"./session/{st.session_state.session_id}/export/audio"
+  export_audio_files(get_audio_dir(), f"./session/{st.session_state.session_id}/export/audio")
+
+def export_audio_files(src_dir: str, dst_dir: str) -> None:
+  """Copy the line audio files and their sidecars into an export folder."""
   if os.path.exists(dst_dir):
     shutil.rmtree(dst_dir)
   shutil.copytree(src_dir, dst_dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns("dialogue.mp3"))
@@ -162,76 +256,127 @@ def get_generated_audio() -> list[str]:
   return glob.glob(f"./session/{st.session_state.session_id}/audio/line*.mp3")
 
 def generate_waveform(audio: seg, y_max: float = None) -> (int, plt.Figure):
-  """Generate a waveform plot figure from the mp3 file."""  
-  audio_array = np.frombuffer(audio.raw_data, dtype=np.int16)
-  frame_rate = audio.frame_rate        
-  num_samples = len(audio_array)
-  length = num_samples / float(frame_rate)
-  time_axis = np.linspace(0, length, num_samples) 
-  fig, ax = plt.subplots()
-  plt.gca().axis("off")       
-  ax.plot(time_axis, audio_array)
-  
-  if y_max:
-    ax.set_ylim(-y_max, y_max)
-  _, max_y = ax.get_ylim()
-  fig.set_figheight(2)
-  
-  return max_y, fig
+  """Generate a min/max peak envelope waveform figure from the audio."""  
+  return render_waveform(audio, y_max)
+
+def generate_waveform_from_file(audio_file: str, y_max: float = None, start: float = 0, end: float = None) -> (int, bytes):
+  """Generate a waveform PNG for a time window of the file, using its peaks file when there is one."""
+  def render() -> (int, plt.Figure):
+    peaks = load_peaks(audio_file)
+    if peaks is None:
+      peaks = peaks_for_audio(load_audio(audio_file))
+      write_peaks(audio_file, peaks)
+    return render_peaks(peaks, y_max, start, end)
 
-def generate_waveform_from_file(audio_file: str, y_max: float = None) -> (int, plt.Figure):
   status = st.spinner("Generating waveform...")
   with status:
-    audio: seg = seg.from_mp3(audio_file)
-    result = generate_waveform(audio, y_max)
+    result = cached_waveform(audio_file, (y_max, start, end), render)
   return result
 
-def generate_waveform_from_bytes(audio_bytes: bytes, y_max: float) -> (int, plt.Figure):
+def generate_waveform_from_bytes(audio_bytes: bytes, y_max: float) -> (int, bytes):
   with st.spinner("Generating waveform..."):
     audio: seg = seg.from_wav(io.BytesIO(audio_bytes))
-    return generate_waveform(audio, y_max)
+    y_max, fig = generate_waveform(audio, y_max)
+    return y_max, figure_png(fig)
+
+PCM_FORMATS = {1: "u8", 2: "s16le", 4: "s32le"}
 
 def normalize_final_audio(audio: seg) -> seg:
   """Normalize the final audio."""
   log("applying audiobook normalization")
-  soundboard = Soundboard(compressor_threshold_db=-18, compressor_ratio=3, limiter_threshold_db=-3)   
-  final_audio, _ = apply_soundboard(audio, soundboard)
+  final_audio, _ = apply_soundboard(audio, NORMALIZATION_SOUNDBOARD)
   return final_audio
 
+def open_mp3_encoder(output_file: str, frame_rate: int, channels: int, sample_width: int) -> subprocess.Popen:
+  """Start an ffmpeg process that encodes PCM written to its stdin into an mp3 file."""
+  return subprocess.Popen(
+    [
+      seg.converter, "-y", "-loglevel", "error",
+      "-f", PCM_FORMATS[sample_width], "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0",
+      "-f", "mp3", output_file
+    ],
+    stdin=subprocess.PIPE,
+    stdout=subprocess.DEVNULL
+  )
+
+def join_audio_files(
+  audio_files: list[str],
+  output_file: str,
+  join_gap: int,
+  normalize: bool = False,
+  on_progress: Callable[[int, int], None] = None
+) -> None:
+  """
+  Join audio files with a gap in between in a single pass by decoding each file once and streaming
+  its PCM straight into an mp3 encoder, so time and memory stay linear in the length of the dialogue.
+  Normalization is applied chunk by chunk with the pedalboard state carried across lines.
+  """
+  first: seg = seg.from_mp3(audio_files[0])
+  frame_rate, channels, sample_width = first.frame_rate, first.channels, first.sample_width
+  gap = seg.silent(join_gap, frame_rate).set_channels(channels).set_sample_width(sample_width).raw_data
+  if normalize:
+    log("applying audiobook normalization")
+
+  peaks = PeakBuilder(channels, frame_rate)
+  encoder = open_mp3_encoder(output_file, frame_rate, channels, sample_width)
+  try:
+    with pedalboard_cache.borrow(NORMALIZATION_SOUNDBOARD if normalize else None) as board:
+      for i, file in enumerate(audio_files):
+        audio = first if i == 0 else seg.from_mp3(file)
+        audio = audio.set_frame_rate(frame_rate).set_channels(channels).set_sample_width(sample_width)
+        chunk = audio.raw_data if i == 0 else gap + audio.raw_data
+        if board is not None:
+          samples = board(pcm_to_float(chunk, sample_width, channels), frame_rate, reset=(i == 0))
+          chunk = float_to_pcm(samples, sample_width)
+        encoder.stdin.write(chunk)
+        peaks.add(pcm_array(chunk, sample_width, channels))
+        if on_progress:
+          on_progress(i + 1, len(audio_files))
+  finally:
+    encoder.stdin.close()
+    return_code = encoder.wait()
+  if return_code != 0:
+    raise RuntimeError(f"ffmpeg failed to encode {output_file} (exit code {return_code})")
+  write_peaks(output_file, peaks.finish())
+
 def join_audio(line_indices: list[int], join_gap: int, normalize: bool = False) -> None:
   """Join audio files found in the audio folder together with a gap in between with optional normalization."""
-  audio_files = [f"./session/{st.session_state.session_id}/audio/line{i}.mp3" for i in line_indices]
+  audio_files = [f"{get_audio_dir()}/line{i}.mp3" for i in line_indices]
+  audio_files = [f for f in audio_files if os.path.exists(f)]
   log(f"joining {len(audio_files)} audio files: {line_indices}")
   
-  gap = seg.silent(join_gap)
-  segments: list[seg] = []
   progress_text = "Joining audio..."
-  joining_audio_bar = st.progress(0, text=progress_text)          
-  for i, file in enumerate(audio_files):
-    if os.path.exists(file):
-      segments.append(seg.from_mp3(file))
-    joining_audio_bar.progress(round((i+1) / len(audio_files), 2), text=progress_text)
-    
-  final_audio = segments[0]
-  for i, s in enumerate(segments[1:]):
-    final_audio += gap + s
-    joining_audio_bar.progress(round((i+1) / len(segments[1:]), 2), text=progress_text)  
-  
-  if normalize:
-    final_audio = normalize_final_audio(final_audio)
-              
-  final_audio.export(f"./session/{st.session_state.session_id}/audio/dialogue.mp3", format="mp3") 
+  joining_audio_bar = st.progress(0, text=progress_text)
+  join_audio_files(
+    audio_files,
+    f"{get_audio_dir()}/dialogue.mp3",
+    join_gap,
+    normalize,
+    lambda completed, total: joining_audio_bar.progress(round(completed / total, 2), text=progress_text)
+  )
   if "background_added" in st.session_state:
     del st.session_state["background_added"]
   joining_audio_bar.empty()
   
+def remove_audio_file(audio_file: str) -> None:
+  """Remove an audio file along with its metadata and peaks files."""
+  for path in [audio_file, metadata_path(audio_file), peaks_path(audio_file)]:
+    if os.path.exists(path):
+      os.remove(path)
+  decoded_audio_cache.invalidate(audio_file)
+
 def clear_audio_files() -> None:
-  """Clear all audio files from the audio directory."""
+  """Clear all audio files and their sidecar files from the audio directory."""
   for file in glob.glob(f"./session/{st.session_state.session_id}/audio/*.mp3"):
-    os.remove(file)
+    remove_audio_file(file)
   if not os.path.isdir(f"./session/{st.session_state.session_id}/audio"):
     os.makedirs(f"./session/{st.session_state.session_id}/audio", exist_ok=True)
 
+def clear_joined_audio() -> None:
+  """Clear the joined dialogue audio while keeping the line audio."""
+  for file in glob.glob(f"{get_audio_dir()}/dialogue*.mp3"):
+    remove_audio_file(file)
+
 @st.cache_data    
 def get_background_audio() -> list[str]:
   """Return the names and audio for the background audio files."""
@@ -253,68 +398,6 @@ def segment_to_bytes(segment: seg) -> bytes:
   audio_bytes = buffer.getvalue()
   return audio_bytes 
 
-def apply_soundboard(audio: seg, soundboard: Soundboard) -> (seg, list[str]):
-  """Apply the soundboard to the audio."""
-  pedals = []
-  if soundboard.distortion_db != 0:
-    pedals.append(Distortion(
-      drive_db=soundboard.distortion_db
-    ))  
-  if soundboard.chorus_rate_hz != 0:
-    pedals.append(Chorus(
-      rate_hz=soundboard.chorus_rate_hz, 
-      depth=soundboard.chorus_depth, 
-      centre_delay_ms=soundboard.chorus_centre_delay, 
-      feedback=soundboard.chorus_feedback
-    ))
-  if soundboard.reverb_room_size != 0:
-    pedals.append(Reverb(
-      room_size=soundboard.reverb_room_size, 
-      damping=soundboard.reverb_damping,
-      wet_level=soundboard.reverb_web_level,
-      dry_level=soundboard.reverb_dry_level
-    ))
-  if soundboard.noise_gate_threshold_db != 0:
-    pedals.append(NoiseGate(
-      threshold_db=soundboard.noise_gate_threshold_db, 
-      ratio=soundboard.noise_gate_ratio
-    ))
-  if soundboard.limiter_threshold_db != 0:
-    pedals.append(Limiter(
-      threshold_db=soundboard.limiter_threshold_db
-    ))
-  if soundboard.compressor_threshold_db != 0:
-    pedals.append(Compressor(
-      threshold_db=soundboard.compressor_threshold_db, 
-      ratio=soundboard.compressor_ratio)
-  )    
-  if len(pedals) == 0:
-    return audio, pedals
-  applied_pedals = [pedal.__class__.__name__ for pedal in pedals]
-  temp_input_filepath = f"./session/{st.session_state.session_id}/temp/in.wav"
-  temp_output_filepath = f"./session/{st.session_state.session_id}/temp/out.wav"
-  os.makedirs(os.path.dirname(temp_input_filepath), exist_ok=True)
-  os.makedirs(os.path.dirname(temp_output_filepath), exist_ok=True)
-  
-  audio.export(temp_input_filepath, format="wav")
-  samplerate = 44100.0
-  with AudioFile(temp_input_filepath).resampled_to(samplerate) as f:
-    temp_in = f.read(f.frames)
-    
-  pedalboard = Pedalboard(pedals)  
-  samples = pedalboard(temp_in, samplerate)
-  with AudioFile(
-    temp_output_filepath, 
-    "w", 
-    samplerate, 
-    samples.shape[0]
-  ) as f:
-    f.write(samples)
-  new_audio = seg.from_wav(temp_output_filepath)
-  os.remove(temp_input_filepath)
-  os.remove(temp_output_filepath)
-  return new_audio, applied_pedals
-
 def edit_audio(
   speech_path: str, 
   basic: Basic = None,
@@ -326,23 +409,18 @@ def edit_audio(
   soundboard: Soundboard = None
 ) -> (seg, seg, list[str]):
   """Edit the audio file by changing the volume."""
-  audio: seg = seg.from_mp3(speech_path)
+  audio: seg = load_audio(speech_path)
   # basic settings
-  if basic.volume:
-    audio = audio + basic.volume
-  if basic.trim_in != 0:
-    audio = audio[basic.trim_in:]
-  if basic.trim_out != 0:
-    new_end = int(audio.duration_seconds * 1000) - basic.trim_out
-    audio = audio[:new_end]
-  if basic.extend_in != 0:
-    audio = seg.silent(basic.extend_in) + audio
-  if basic.extend_out != 0:
-    audio = audio + seg.silent(basic.extend_out)
-  if basic.fade_in != 0:
-    audio = audio.fade_in(basic.fade_in)
-  if basic.fade_out != 0:
-    audio = audio.fade_out(basic.fade_out)
+  audio = apply_basic_edits(
+    audio,
+    basic.volume,
+    basic.trim_in,
+    basic.trim_out,
+    basic.extend_in,
+    basic.extend_out,
+    basic.fade_in,
+    basic.fade_out
+  )
   
   # soundboard
   audio, pedals = apply_soundboard(audio, soundboard)
@@ -351,7 +429,7 @@ def edit_audio(
   effect = None
   if effect_path:
     
-    effect: seg = seg.from_file(effect_path)
+    effect: seg = effect_index.load(effect_path)
     if effect_volume:
       effect = effect + effect_volume
     if effect_repeat:
@@ -395,73 +473,61 @@ def preview_audio(
   )
   return segment_to_bytes(effect), segment_to_bytes(audio), pedals
 
-def get_default_effects() -> list[str]:
-  """Get the effects from the effects folder."""
-  return glob.glob("./effects/*")
-
-def get_session_effects() -> list[str]:
-  """Get the effects from the effects folder."""
-  return glob.glob(f"./session/{st.session_state.session_id}/effects/*")
-
-def process_effect_file(file: str) -> str:
-  """Process the effect filename."""
-  name = os.path.splitext(os.path.basename(file))[0]
-  name = name.replace("_", " ")
-  return name
-
-@st.cache_data
-def get_default_effect_names() -> list[str]:
-  """Get the effect names from the effects folder."""
-  names = [process_effect_file(f) for f in get_default_effects()]
-  return names
-
-def get_session_effect_names() -> list[str]:
-  """Get the effect names from the session effects folder."""
-  names = [process_effect_file(f) for f in get_session_effects()]
-  return names
+def get_session_effects_dir() -> str:
+  return f"./session/{st.session_state.session_id}/effects"
 
 def get_effect_names() -> list[str]:
-  default_effects = get_default_effect_names()
-  session_effects = get_session_effect_names()
-  return sorted(default_effects + session_effects)
+  """Get the names of the bundled effects and the effects uploaded in this session."""
+  return effect_index.names(get_session_effects_dir())
 
 def save_sound_effect(audio: bytes, name: str) -> None:
   audio: seg = seg.from_wav(io.BytesIO(audio))
   name = os.path.splitext(name)[0]
-  output_path = f"./session/{st.session_state.session_id}/effects/{name}.mp3"
+  output_path = f"{get_session_effects_dir()}/{name}.mp3"
   os.makedirs(os.path.dirname(output_path), exist_ok=True)
   audio.export(output_path, format="mp3") 
+  decoded_audio_cache.invalidate(output_path)
+  effect_index.invalidate(get_session_effects_dir())
 
 def get_audio_duration(filename: str) -> float:
-  """Get the duration of the speech in seconds."""
-  audio: seg = seg.from_mp3(filename)
+  """Get the duration of the speech in seconds from its metadata or mp3 frame headers."""
+  metadata = read_metadata(filename)
+  if metadata:
+    return metadata.duration
+  duration = probe_mp3_duration(filename) if filename.endswith(".mp3") else None
+  if duration is not None:
+    return duration
+  audio: seg = load_audio(filename)
   return audio.duration_seconds
 
 def get_audio_max_decibels(filename: str) -> (int, int):
   """Get the max volume of the audio."""
-  audio: seg = seg.from_mp3(filename)
-  return audio.max_dBFS
+  metadata = read_metadata(filename)
+  if metadata is None or metadata.peak_dbfs is None:
+    metadata = write_metadata(filename, load_audio(filename))
+  return metadata.peak_dbfs
 
 def get_effect_path(name: str) -> str:
   """Get the effect path from the effect name."""
-  name = name.replace(' ', '_')
-  files = glob.glob(f"./effects/{name}.*")
-  if files:
-    return files[0]
-  else:
-    files = glob.glob(f"./session/{st.session_state.session_id}/effects/{name}.*")
-    if files:
-      return files[0]
-    else:
-      return None
+  info = effect_index.get(name, get_session_effects_dir())
+  return info.path if info else None
 
-def apply_background_audio(background_name: str, fade_in: bool, fade_out: bool, lower_db: int, noramalize: bool) -> None:
-  """Apply the background audio to the dialogue audio."""
+def get_background_file(background_name: str) -> str:
+  """Get the path of a bundled background audio file from its name."""
   background_files = [str(x) for x in list(Path(".").glob("backgrounds/*.mp3"))]
   background_index = background_files.index(get_background_file_from_name(background_name))
-  background_file = background_files[background_index]
-  dialogue_file = f"./session/{st.session_state.session_id}/audio/dialogue.mp3"
-  
+  return background_files[background_index]
+
+def mix_background_audio(
+  background_file: str,
+  dialogue_file: str,
+  output_file: str,
+  fade_in: bool,
+  fade_out: bool,
+  lower_db: int,
+  noramalize: bool
+) -> None:
+  """Mix the background audio under the dialogue audio and save it along with its peaks."""
   dialogue: seg = seg.from_mp3(dialogue_file)
   background: seg = seg.from_mp3(background_file)
   if background.duration_seconds > dialogue.duration_seconds:
@@ -476,6 +542,18 @@ def apply_background_audio(background_name: str, fade_in: bool, fade_out: bool,
     background = normalize_final_audio(background)
   
   final_dialgoue = dialogue.overlay(background)
-  final_dialgoue.export(f"./session/{st.session_state.session_id}/audio/dialogue_background.mp3", format="mp3")  
+  final_dialgoue.export(output_file, format="mp3")  
+  write_peaks(output_file, peaks_for_audio(final_dialgoue))
+
+def apply_background_audio(background_name: str, fade_in: bool, fade_out: bool, lower_db: int, noramalize: bool) -> None:
+  """Apply the background audio to the dialogue audio."""
+  mix_background_audio(
+    get_background_file(background_name),
+    f"{get_audio_dir()}/dialogue.mp3",
+    f"{get_audio_dir()}/dialogue_background.mp3",
+    fade_in,
+    fade_out,
+    lower_db,
+    noramalize
+  )
   st.session_state["background_added"] = True
-   
\ No newline at end of file
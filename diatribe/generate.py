@@ -1,13 +1,20 @@
 import json
 import streamlit as st
+from typing import Callable, Iterator
 import pandas as pd
-from diatribe.dialogues import Character, Dialogue
-from openai import OpenAI
+from diatribe.dialogues import Character, CharacterRegistry, Dialogue
 from jsonschema import validate
 from diatribe.utils import log
+from diatribe.clients import clients
+from diatribe.completion_cache import completion_cache
+from diatribe.prompts import load_prompt
+from diatribe.dialogue_stream import DialogueRowParser
 from diatribe.sidebar import SidebarData
 from diatribe.saved_dialogues import get_selected_plot, SavedDialogueData
 
+# with a story summary the continue prompt only includes this many of the latest lines, the summary covers the rest
+CONTINUE_CONTEXT_LINES = 30
+
 openai_dialogue_schema = {
   "type": "object",
   "properties": {
@@ -37,9 +44,44 @@ openai_dialogue_schema = {
   }
 }
 
-def generate_dialogue(system_prompt: str, input_prompt: str, sidebar: SidebarData) -> str:
-  """Generate the dialogue using OpenAI."""
-  client = OpenAI(api_key=sidebar.openai_api_key, timeout=180)  
+def get_completion_key(system_prompt: str, input_prompt: str, sidebar: SidebarData) -> str:
+  """Get the completion cache key for the request, or None if the response should not be reused."""
+  if not sidebar.openai_cache or not completion_cache.cacheable(sidebar.openai_temp):
+    return None
+  return completion_cache.make_key(
+    sidebar.openai_model,
+    sidebar.openai_temp,
+    sidebar.openai_max_tokens,
+    system_prompt,
+    input_prompt
+  )
+
+def cache_completion(cache_key: str, content: str, validate_response: Callable[[str], object] = None) -> None:
+  """Store a finished completion, unless it fails the validation its caller will apply so it is never replayed."""
+  if validate_response:
+    try:
+      validate_response(content)
+    except Exception as e:
+      log(f"not caching an invalid response: {e}")
+      return
+  completion_cache.put_text(cache_key, content)
+
+def generate_dialogue(
+  system_prompt: str,
+  input_prompt: str,
+  sidebar: SidebarData,
+  validate_response: Callable[[str], object] = None
+) -> str:
+  """
+  Generate the dialogue using OpenAI, reusing the response to an identical earlier request.
+  A response is only reused if it passes validate_response, which should raise for an invalid response.
+  """
+  cache_key = get_completion_key(system_prompt, input_prompt, sidebar)
+  if cache_key:
+    new_dialogue = completion_cache.get_text(cache_key)
+    if new_dialogue is not None:
+      return new_dialogue
+  client = clients.openai(sidebar.openai_api_key)
   messages = [
     {"role": "system", "content": system_prompt},
     {"role": "user", "content": input_prompt}
@@ -55,25 +97,92 @@ def generate_dialogue(system_prompt: str, input_prompt: str, sidebar: SidebarDat
     messages=messages
   )
   new_dialogue = response.choices[0].message.content
+  if cache_key and response.choices[0].finish_reason == "stop":
+    cache_completion(cache_key, new_dialogue, validate_response)
   return new_dialogue
 
+def generate_dialogue_stream(
+  system_prompt: str,
+  input_prompt: str,
+  sidebar: SidebarData,
+  validate_response: Callable[[str], object] = None
+) -> Iterator[str]:
+  """Generate the dialogue using OpenAI, yielding the text as it arrives or all at once when an identical request was cached."""
+  cache_key = get_completion_key(system_prompt, input_prompt, sidebar)
+  if cache_key:
+    content = completion_cache.get_text(cache_key)
+    if content is not None:
+      yield content
+      return
+  client = clients.openai(sidebar.openai_api_key)
+  messages = [
+    {"role": "system", "content": system_prompt},
+    {"role": "user", "content": input_prompt}
+  ]
+  response = client.chat.completions.create(
+    model=sidebar.openai_model,
+    temperature=sidebar.openai_temp,
+    max_tokens=sidebar.openai_max_tokens,
+    messages=messages,
+    stream=True
+  )
+  content = []
+  finish_reason = None
+  for chunk in response:
+    if chunk.choices and chunk.choices[0].delta.content:
+      content.append(chunk.choices[0].delta.content)
+      yield chunk.choices[0].delta.content
+    if chunk.choices and chunk.choices[0].finish_reason:
+      finish_reason = chunk.choices[0].finish_reason
+  if cache_key and finish_reason == "stop":
+    cache_completion(cache_key, "".join(content), validate_response)
+
+def parse_dialogue_rows(content: str) -> list[dict]:
+  """Parse and validate a complete dialogue response."""
+  dialogue = json.loads(content)
+  validate(instance=dialogue, schema=openai_dialogue_schema)
+  return dialogue["dialogue"]
+
+def generate_dialogue_rows(system_prompt: str, input_prompt: str, sidebar: SidebarData) -> Iterator[dict]:
+  """
+  Generate the dialogue rows using OpenAI. With streaming enabled each row is validated and yielded
+  as soon as it has been written, otherwise the rows are yielded once the whole response is in.
+  """
+  if not sidebar.enable_streaming:
+    yield from parse_dialogue_rows(generate_dialogue(system_prompt, input_prompt, sidebar, parse_dialogue_rows))
+    return
+  parser = DialogueRowParser()
+  content = []
+  for text in generate_dialogue_stream(system_prompt, input_prompt, sidebar, parse_dialogue_rows):
+    content.append(text)
+    for row in parser.feed(text):
+      validate(instance=row, schema=openai_dialogue_schema["properties"]["dialogue"]["items"])
+      yield row
+  if parser.rows == 0:
+    # the response did not have the expected layout, so fall back to parsing it whole
+    yield from parse_dialogue_rows("".join(content))
+
+def show_dialogue_rows(rows: Iterator[dict], registry: CharacterRegistry, lines: list[dict]) -> list[dict]:
+  """Add the rows spoken by known characters to the lines, showing the table grow as the rows arrive."""
+  table = st.empty()
+  for row in rows:
+    if row.get("Speaker") in registry and "Text" in row:
+      lines.append({ "Speaker": row["Speaker"], "Text": row["Text"] })
+      table.dataframe(pd.DataFrame(lines, columns=["Speaker", "Text"]), use_container_width=True)
+  table.empty()
+  return lines
+
 def load_dialogue_system_prompt() -> str:
   """Load the dialogue system prompt from the file."""
-  with open("prompts/openai_dialogue_system_prompt.txt", "r") as f:
-    system_prompt = f.read()
-    return system_prompt
+  return load_prompt("openai_dialogue_system_prompt.txt")
   
 def load_continue_dialogue_system_prompt() -> str:
   """Load the continue dialogue system prompt from the file."""
-  with open("prompts/openai_continue_system_prompt.txt", "r") as f:
-    system_prompt = f.read()
-    return system_prompt
+  return load_prompt("openai_continue_system_prompt.txt")
     
 def load_plot_system_prompt() -> str:
   """Load the plot system prompt from the file."""
-  with open("prompts/openai_plot_system_prompt.txt", "r") as f:
-    system_prompt = f.read()
-    return system_prompt
+  return load_prompt("openai_plot_system_prompt.txt")
 
 def generate_plot_input_prompt(characters: list[Character]) -> dict:
   input_prompt = "CHARACTERS:\n"
@@ -88,8 +197,11 @@ def generate_dialogue_input_prompt(characters: list[Character], number_of_lines:
   input_prompt += f"PLOT:\n<Plot>{plot}</Plot>\n\n\n"
   return input_prompt
   
-def generate_continue_dialogue_input_prompt(characters: list[Character], number_of_lines: int, plot: str, dialogue: list[Dialogue]) -> dict:
+def generate_continue_dialogue_input_prompt(characters: list[Character], number_of_lines: int, plot: str, dialogue: list[Dialogue], summary: str = None) -> dict:
   input_prompt = generate_dialogue_input_prompt(characters, number_of_lines, plot)
+  if len(dialogue) > CONTINUE_CONTEXT_LINES and summary:
+    input_prompt += f"STORY SO FAR:\n<Summary>{summary}</Summary>\n\n\n"
+    dialogue = dialogue[-CONTINUE_CONTEXT_LINES:]
   input_prompt += f"EXISTING LINES:\n"
   for line in dialogue:
     input_prompt += f"<Dialogue><Speaker>{line.character.name}</Speaker>\n<Number>{line.line}</Number><Text>{line.text}</Text></Dialogue>\n\n\n"
@@ -101,7 +213,8 @@ def create_continue_dialogue(sidebar: SidebarData, characters: list[Character],
       characters, 
       st.session_state["number_of_lines"] if "number_of_lines" in st.session_state else 10, 
       st.session_state["plot"] if "plot" in st.session_state else "", 
-      dialogue
+      dialogue,
+      st.session_state.get("story_summary")
     )
     system_prompt = load_continue_dialogue_system_prompt()
     try:
@@ -111,13 +224,9 @@ def create_continue_dialogue(sidebar: SidebarData, characters: list[Character],
         del st.session_state["final_audio"]
         
       lines = [d.to_dict(without_line=True) for d in dialogue]
-      dialogue = generate_dialogue(system_prompt, input_prompt, sidebar)
-      dialogue = json.loads(dialogue)
-      validate(instance=dialogue, schema=openai_dialogue_schema)
-      for line in dialogue["dialogue"]:
-        character_found = next((c for c in characters if c.name == line["Speaker"]), None)
-        if character_found:
-          lines.append({ "Speaker": line["Speaker"], "Text": line["Text"] })
+      registry = CharacterRegistry(characters)
+      rows = generate_dialogue_rows(system_prompt, input_prompt, sidebar)
+      lines = show_dialogue_rows(rows, registry, lines)
       log(f"continued lines produced: {len(lines)}")
       result = pd.DataFrame(lines, columns=["Speaker", "Text"])
       return result
@@ -155,12 +264,30 @@ def create_dialogue_generation(sidebar: SidebarData, saves: SavedDialogueData, c
       if "plot" in st.session_state and st.session_state["plot"] != plot:
         st.session_state["plot"] = plot
         
-      number_of_lines = st.slider(
-        "Approximate Number of Dialogue Lines", 
-        5, 50, 10, 5, 
-        help="Will tell OpenAI to generate this many lines of dialogue. OpenAI may generate more or less lines than this number."
+      long_form = st.toggle(
+        "Long-Form Script",
+        False,
+        help="Split the plot into scenes and write the scenes at the same time, for scripts of up to 500 lines."
       )
+      if long_form:
+        number_of_lines = st.slider(
+          "Approximate Number of Dialogue Lines",
+          50, 500, 100, 25,
+          help="Will tell OpenAI to generate this many lines of dialogue, shared out between the scenes. OpenAI may generate more or less lines than this number."
+        )
+      else:
+        number_of_lines = st.slider(
+          "Approximate Number of Dialogue Lines", 
+          5, 50, 10, 5, 
+          help="Will tell OpenAI to generate this many lines of dialogue. OpenAI may generate more or less lines than this number."
+        )
       st.session_state["number_of_lines"] = number_of_lines
+      voice_while_generating = st.toggle(
+        "Generate Audio While Writing",
+        False,
+        disabled=not sidebar.el_key or long_form,
+        help="Start generating the audio for each line as soon as OpenAI has written it instead of waiting for the whole dialogue."
+      )
       generate_dialogue_btn = st.button(
         "Generate Dialogue", 
         use_container_width=True, 
@@ -168,6 +295,22 @@ def create_dialogue_generation(sidebar: SidebarData, saves: SavedDialogueData, c
       )    
       
       if generate_dialogue_btn:
+        # the summary of an earlier long-form script does not apply to the new dialogue
+        st.session_state.pop("story_summary", None)
+      if generate_dialogue_btn and long_form:
+        # the scenes are written by a background job started from the app
+        st.session_state["scenes_request"] = {
+          "plot": plot,
+          "number_of_lines": number_of_lines
+        }
+      elif generate_dialogue_btn and voice_while_generating:
+        # the audio is generated by a background job started from the app
+        st.session_state["pipeline_request"] = {
+          "system_prompt": load_dialogue_system_prompt(),
+          "input_prompt": generate_dialogue_input_prompt(characters, number_of_lines, plot),
+          "expected_lines": number_of_lines
+        }
+      elif generate_dialogue_btn:
         with st.spinner("Generating dialogue..."):
           input_prompt = generate_dialogue_input_prompt(characters, number_of_lines, plot)
           system_prompt = load_dialogue_system_prompt()
@@ -177,14 +320,9 @@ def create_dialogue_generation(sidebar: SidebarData, saves: SavedDialogueData, c
             if "final_audio" in st.session_state:
               del st.session_state["final_audio"]
               
-            dialogue = generate_dialogue(system_prompt, input_prompt, sidebar)
-            dialogue = json.loads(dialogue)
-            validate(instance=dialogue, schema=openai_dialogue_schema)
-            lines = []
-            for line in dialogue["dialogue"]:
-              character_found = next((c for c in characters if c.name == line["Speaker"]), None)
-              if character_found:
-                lines.append({ "Speaker": line["Speaker"], "Text": line["Text"] })
+            registry = CharacterRegistry(characters)
+            rows = generate_dialogue_rows(system_prompt, input_prompt, sidebar)
+            lines = show_dialogue_rows(rows, registry, [])
             log(f"lines produced: {len(lines)}")
             result = pd.DataFrame(lines, columns=["Speaker", "Text"])
           except Exception as e:
@@ -0,0 +1,142 @@
+import os, json, time, uuid, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable
+from diatribe.utils import log
+
+JOB_WORKERS = int(os.getenv("DIATRIBE_JOB_WORKERS", "4"))
+ACTIVE_STATUSES = ("queued", "running")
+# progress and partial data are written to the job table at most this often, status changes are always written
+WRITE_INTERVAL_SECONDS = 1.0
+# finished jobs are dropped from memory once collected or after this long, the job table on disk keeps them
+FINISHED_JOB_TTL_SECONDS = 600
+
+@dataclass
+class Job:
+  job_id: str
+  session_id: str
+  kind: str
+  status: str = "queued"
+  progress: float = 0
+  message: str = ""
+  data: dict = field(default_factory=dict)
+  result: Any = None
+  error: str = None
+  created: float = field(default_factory=time.time)
+  updated: float = field(default_factory=time.time)
+
+  @property
+  def active(self) -> bool:
+    return self.status in ACTIVE_STATUSES
+
+class JobContext:
+  """Handed to a job function so it can report progress and partial data back to the job table."""
+
+  def __init__(self, job: Job) -> None:
+    self.job = job
+
+  def progress(self, completed: int, total: int, message: str = None) -> None:
+    _update(self.job, progress=round(completed / total, 2) if total else 1.0, message=message or self.job.message)
+
+  def update(self, **data) -> None:
+    _update(self.job, data={**self.job.data, **data})
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="diatribe-job")
+_jobs: dict[str, Job] = {}
+_written: dict[str, float] = {}
+_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+def _jobs_dir(session_id: str) -> str:
+  return f"./session/{session_id}/jobs"
+
+def _write(snapshot: dict) -> None:
+  """Write a snapshot of a job, taken while holding the job lock, to the session's job table."""
+  with _write_lock:
+    os.makedirs(_jobs_dir(snapshot["session_id"]), exist_ok=True)
+    path = f"{_jobs_dir(snapshot['session_id'])}/{snapshot['job_id']}.json"
+    with open(f"{path}.part", "w") as f:
+      json.dump(snapshot, f, default=str)
+    os.replace(f"{path}.part", path)
+
+def _update(job: Job, **changes) -> None:
+  with _lock:
+    status = job.status
+    for name, value in changes.items():
+      setattr(job, name, value)
+    job.updated = time.time()
+    if job.status == status and job.updated - _written.get(job.job_id, 0) < WRITE_INTERVAL_SECONDS:
+      return
+    _written[job.job_id] = job.updated
+    snapshot = asdict(job)
+  _write(snapshot)
+
+def _prune() -> None:
+  """Drop finished jobs that have not been collected from memory, called while holding the job lock."""
+  expired = time.time() - FINISHED_JOB_TTL_SECONDS
+  for job_id in [job_id for job_id, job in _jobs.items() if not job.active and job.updated < expired]:
+    del _jobs[job_id]
+    _written.pop(job_id, None)
+
+def _run(job: Job, fn: Callable, args: tuple, kwargs: dict) -> None:
+  _update(job, status="running")
+  log(f"job {job.kind} {job.job_id} started")
+  try:
+    result = fn(JobContext(job), *args, **kwargs)
+  except Exception as e:
+    log(f"job {job.kind} {job.job_id} failed: {e}")
+    traceback.print_exc()
+    _update(job, status="failed", error=str(e))
+    return
+  _update(job, status="done", progress=1.0, result=result)
+  log(f"job {job.kind} {job.job_id} finished in {job.updated - job.created:.2f}s")
+
+def submit_job(session_id: str, kind: str, fn: Callable, *args, **kwargs) -> Job:
+  """
+  Run fn(context, *args, **kwargs) on the job workers and record it in the session's job table.
+  The return value of fn must be JSON serializable since it is stored as the job result.
+  """
+  job = Job(str(uuid.uuid4()), session_id, kind)
+  with _lock:
+    _prune()
+    _jobs[job.job_id] = job
+    _written[job.job_id] = job.updated
+    snapshot = asdict(job)
+  _write(snapshot)
+  _executor.submit(_run, job, fn, args, kwargs)
+  return job
+
+def get_job(session_id: str, job_id: str) -> Job:
+  """Get a job from memory or from the session's job table on disk."""
+  with _lock:
+    if job_id in _jobs:
+      return _jobs[job_id]
+  path = f"{_jobs_dir(session_id)}/{job_id}.json"
+  if not os.path.exists(path):
+    return None
+  with open(path, "r") as f:
+    job = Job(**json.load(f))
+  if job.active:
+    # the job table outlived the process that was running it
+    job.status = "failed"
+    job.error = "The job was interrupted before it finished."
+    _write(asdict(job))
+  return job
+
+def forget_job(job_id: str) -> None:
+  """Drop a finished job from memory once its result has been collected, it can still be read from the job table."""
+  with _lock:
+    job = _jobs.get(job_id)
+    if job is not None and not job.active:
+      del _jobs[job_id]
+      _written.pop(job_id, None)
+
+def get_jobs(session_id: str, kind: str = None) -> list[Job]:
+  """Get the session's jobs, newest first."""
+  directory = _jobs_dir(session_id)
+  if not os.path.isdir(directory):
+    return []
+  job_ids = [f[:-len(".json")] for f in os.listdir(directory) if f.endswith(".json")]
+  jobs = [job for job in (get_job(session_id, job_id) for job_id in job_ids) if job is not None]
+  jobs = [job for job in jobs if kind is None or job.kind == kind]
+  return sorted(jobs, key=lambda job: job.created, reverse=True)
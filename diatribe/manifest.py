@@ -0,0 +1,130 @@
+import os, json, glob
+from dataclasses import dataclass, field
+from diatribe.dialogues import Dialogue
+from diatribe.sidebar import SidebarData
+from diatribe.tts_cache import TTSCache
+from diatribe.utils import log
+
+MANIFEST_NAME = "manifest.json"
+
+@dataclass
+class ManifestPlan:
+  keep: list[Dialogue] = field(default_factory=list)
+  moves: dict[int, int] = field(default_factory=dict)
+  synthesize: list[Dialogue] = field(default_factory=list)
+  remove: list[int] = field(default_factory=list)
+
+def line_key(line: Dialogue, sidebar_data: SidebarData) -> str:
+  """Get the key describing everything that produced the audio for a line."""
+  return TTSCache.make_key(
+    line.text,
+    line.character.voice_id,
+    sidebar_data.model_id,
+    sidebar_data.stability,
+    sidebar_data.simarlity_boost,
+    sidebar_data.style
+  )
+
+def load_manifest(audio_dir: str) -> dict[int, dict]:
+  """Load the manifest of which request produced each line file."""
+  manifest_path = os.path.join(audio_dir, MANIFEST_NAME)
+  if not os.path.exists(manifest_path):
+    return {}
+  try:
+    with open(manifest_path, "r") as f:
+      data = json.load(f)
+    return {int(line): entry for line, entry in data["lines"].items()}
+  except (ValueError, KeyError) as e:
+    log(f"ignoring unreadable audio manifest: {e}")
+    return {}
+
+def save_manifest(audio_dir: str, manifest: dict[int, dict]) -> None:
+  """Save the manifest of which request produced each line file."""
+  os.makedirs(audio_dir, exist_ok=True)
+  lines = {str(line): manifest[line] for line in sorted(manifest)}
+  with open(os.path.join(audio_dir, MANIFEST_NAME), "w") as f:
+    json.dump({"lines": lines}, f, indent=2)
+
+def manifest_entry(line: Dialogue, sidebar_data: SidebarData) -> dict:
+  return {
+    "key": line_key(line, sidebar_data),
+    "speaker": line.character.name,
+    "text": line.text
+  }
+
+def update_manifest_line(audio_dir: str, line: Dialogue, sidebar_data: SidebarData) -> None:
+  """Record that a single line file was regenerated."""
+  manifest = load_manifest(audio_dir)
+  manifest[line.line] = manifest_entry(line, sidebar_data)
+  save_manifest(audio_dir, manifest)
+
+def plan_resynthesis(dialogue: list[Dialogue], sidebar_data: SidebarData, audio_dir: str) -> ManifestPlan:
+  """
+  Diff the dialogue against the manifest to find which line files can be kept, which can be
+  moved to a new line number because rows were inserted or deleted, and which need to be synthesized.
+  """
+  plan = ManifestPlan()
+  manifest = load_manifest(audio_dir)
+  existing = {
+    line: entry["key"] for line, entry in manifest.items()
+    if os.path.exists(os.path.join(audio_dir, f"line{line}.mp3"))
+  }
+  keys = {line.line: line_key(line, sidebar_data) for line in dialogue}
+  claimed: set[int] = set()
+
+  unmatched: list[Dialogue] = []
+  for line in dialogue:
+    if existing.get(line.line) == keys[line.line]:
+      plan.keep.append(line)
+      claimed.add(line.line)
+    else:
+      unmatched.append(line)
+
+  sources: dict[str, list[int]] = {}
+  for old_line, key in sorted(existing.items()):
+    if old_line not in claimed:
+      sources.setdefault(key, []).append(old_line)
+  for line in unmatched:
+    candidates = sources.get(keys[line.line])
+    if candidates:
+      old_line = candidates.pop(0)
+      plan.moves[old_line] = line.line
+      claimed.add(old_line)
+    else:
+      plan.synthesize.append(line)
+
+  plan.remove = [line for line in existing if line not in claimed]
+  log(f"resynthesis plan: keep {len(plan.keep)}, move {len(plan.moves)}, synthesize {len(plan.synthesize)}, remove {len(plan.remove)}")
+  return plan
+
+def manifest_signature(audio_dir: str) -> tuple:
+  """Describe the manifest and line files by name and mtime, so a plan made from them can tell when it is stale."""
+  signature = []
+  for path in sorted(glob.glob(os.path.join(glob.escape(audio_dir), "line*.mp3"))) + [os.path.join(audio_dir, MANIFEST_NAME)]:
+    try:
+      signature.append((os.path.basename(path), os.stat(path).st_mtime_ns))
+    except FileNotFoundError:
+      pass
+  return tuple(signature)
+
+def line_files(audio_dir: str, line: int) -> list[str]:
+  """Get the audio file for the line along with any sidecar files written next to it."""
+  return glob.glob(os.path.join(glob.escape(audio_dir), f"line{line}.*"))
+
+def apply_plan(plan: ManifestPlan, audio_dir: str) -> None:
+  """Rename moved line files into place and delete line files no longer in the dialogue."""
+  staged: list[(str, str)] = []
+  for old_line, new_line in plan.moves.items():
+    for path in line_files(audio_dir, old_line):
+      suffix = os.path.basename(path)[len(f"line{old_line}"):]
+      staging_path = os.path.join(audio_dir, f".moving.{os.path.basename(path)}")
+      os.replace(path, staging_path)
+      staged.append((staging_path, os.path.join(audio_dir, f"line{new_line}{suffix}")))
+  for line in plan.remove:
+    for path in line_files(audio_dir, line):
+      os.remove(path)
+  for line in plan.synthesize:
+    for path in line_files(audio_dir, line.line):
+      os.remove(path)
+  for staging_path, path in staged:
+    os.replace(staging_path, path)
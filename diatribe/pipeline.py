@@ -0,0 +1,131 @@
+import os, time
+import diatribe.el_audio as el_audio
+import diatribe.manifest as manifest
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+from diatribe.dialogues import Dialogue, CharacterRegistry
+from diatribe.sidebar import SidebarData
+from diatribe.utils import log
+
+@dataclass
+class PipelineMetrics:
+  lines: int = 0
+  reused: int = 0
+  # seconds since the pipeline started
+  first_row: float = None
+  first_audio: float = None
+  generation: float = 0
+  total: float = 0
+  # over the lines that were synthesized
+  synthesis: float = 0
+  average_synthesis: float = 0
+  average_queue_wait: float = 0
+
+@dataclass
+class PipelineResult:
+  rows: list[dict] = field(default_factory=list)
+  audio_files: list[str] = field(default_factory=list)
+  failed_line: Dialogue = None
+  error: Exception = None
+  metrics: PipelineMetrics = field(default_factory=PipelineMetrics)
+
+def remove_lines_after(audio_dir: str, entries: dict[int, dict], last_line: int) -> None:
+  """Remove the line files and manifest entries of a previous, longer dialogue."""
+  for line in [line for line in entries if line > last_line]:
+    for path in manifest.line_files(audio_dir, line):
+      os.remove(path)
+    del entries[line]
+
+def run_pipeline(
+  rows: Iterable[dict],
+  registry: CharacterRegistry,
+  sidebar_data: SidebarData,
+  audio_dir: str,
+  max_workers: int = 4,
+  on_row: Callable[[list[dict]], None] = None,
+  on_line_ready: Callable[[int, Dialogue], None] = None
+) -> PipelineResult:
+  """
+  Voice dialogue rows while the rest of the dialogue is still being generated. Each row is queued for
+  synthesis as soon as it is parsed, so the language model and the speech requests overlap.
+  Lines whose existing audio was made from the same text and settings are kept, including any edits.
+  The callbacks run on the calling thread. After the first failure no more lines are queued, but the
+  remaining rows are still collected so the written dialogue is complete.
+  """
+  result = PipelineResult()
+  metrics = result.metrics
+  futures: dict[Future, Dialogue] = {}
+  completed: dict[int, str] = {}
+  timings: list[(float, float)] = []
+  start = time.perf_counter()
+  entries = manifest.load_manifest(audio_dir)
+
+  def synthesize(line: Dialogue, queued: float) -> (str, float, float):
+    started = time.perf_counter()
+    audio_file = el_audio.generate_and_save(line.text, line.character.voice_id, line.line, sidebar_data, audio_dir)
+    return audio_file, started - queued, time.perf_counter() - started
+
+  def collect(future: Future) -> None:
+    line = futures.pop(future)
+    try:
+      audio_file, queue_wait, synthesis = future.result()
+    except Exception as e:
+      log(e)
+      if result.failed_line is None or line.line < result.failed_line.line:
+        result.failed_line = line
+        result.error = e
+      return
+    if metrics.first_audio is None:
+      metrics.first_audio = time.perf_counter() - start
+    completed[line.line] = audio_file
+    timings.append((queue_wait, synthesis))
+    if on_line_ready:
+      on_line_ready(len(completed), line)
+
+  lines: list[Dialogue] = []
+  with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+    for row in rows:
+      if row.get("Speaker") not in registry or not row.get("Text"):
+        continue
+      if metrics.first_row is None:
+        metrics.first_row = time.perf_counter() - start
+      result.rows.append({ "Speaker": row["Speaker"], "Text": row["Text"] })
+      line = Dialogue(registry.get(row["Speaker"]), len(result.rows), row["Text"])
+      lines.append(line)
+      if on_row:
+        on_row(result.rows)
+      audio_file = f"{audio_dir}/line{line.line}.mp3"
+      existing = entries.get(line.line)
+      if existing and existing["key"] == manifest.line_key(line, sidebar_data) and os.path.exists(audio_file):
+        completed[line.line] = audio_file
+        metrics.reused += 1
+        if on_line_ready:
+          on_line_ready(len(completed), line)
+      elif result.failed_line is None:
+        futures[executor.submit(synthesize, line, time.perf_counter())] = line
+      for future in [future for future in futures if future.done()]:
+        collect(future)
+    metrics.generation = time.perf_counter() - start
+    for future in as_completed(list(futures)):
+      collect(future)
+
+  voiced = [line for line in lines if line.line in completed]
+  result.audio_files = [completed[line.line] for line in voiced]
+  # lines that were not voiced keep their old audio and entries, so the next resynthesis can still reuse them
+  entries.update({line.line: manifest.manifest_entry(line, sidebar_data) for line in voiced})
+  if result.failed_line is None:
+    remove_lines_after(audio_dir, entries, len(lines))
+  manifest.save_manifest(audio_dir, entries)
+
+  metrics.lines = len(voiced)
+  metrics.total = time.perf_counter() - start
+  metrics.synthesis = sum(synthesis for _, synthesis in timings)
+  if timings:
+    metrics.average_synthesis = metrics.synthesis / len(timings)
+    metrics.average_queue_wait = sum(queue_wait for queue_wait, _ in timings) / len(timings)
+  log(
+    f"pipeline voiced {metrics.lines}/{len(result.rows)} lines in {metrics.total:.2f}s "
+    f"(first row {metrics.first_row or 0:.2f}s, first audio {metrics.first_audio or 0:.2f}s, generation {metrics.generation:.2f}s)"
+  )
+  return result
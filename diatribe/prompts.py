@@ -0,0 +1,22 @@
+import os, threading
+from diatribe.utils import log
+
+PROMPTS_DIR = "prompts"
+
+_prompts: dict[str, (int, str)] = {}
+_lock = threading.Lock()
+
+def load_prompt(name: str) -> str:
+  """Load a system prompt from the prompts folder, reading the file again only after it has changed."""
+  path = os.path.join(PROMPTS_DIR, name)
+  modified = os.stat(path).st_mtime_ns
+  with _lock:
+    cached = _prompts.get(path)
+    if cached is not None and cached[0] == modified:
+      return cached[1]
+  with open(path, "r") as f:
+    prompt = f.read()
+  with _lock:
+    _prompts[path] = (modified, prompt)
+  log(f"loaded prompt {name}")
+  return prompt
@@ -0,0 +1,47 @@
+from dataclasses import dataclass, field
+from diatribe.dialogues import Dialogue
+from diatribe.sidebar import SidebarData
+from diatribe.tts_cache import tts_cache
+from diatribe.manifest import line_key
+
+@dataclass
+class QuotaPlan:
+  lines: list[Dialogue] = field(default_factory=list)
+  cached: list[Dialogue] = field(default_factory=list)
+  deferred: list[Dialogue] = field(default_factory=list)
+  billed_characters: int = 0
+  deferred_characters: int = 0
+  remaining_characters: int = None
+
+  @property
+  def fits(self) -> bool:
+    return not self.deferred
+
+def billed_characters(line: Dialogue) -> int:
+  """Get the number of characters the speech API bills for a line."""
+  return len(line.text)
+
+def remaining_characters(usage: dict) -> int:
+  """Get the characters left in the subscription from the usage lookup."""
+  return max(0, usage["limit"] - usage["count"])
+
+def plan_quota(lines: list[Dialogue], sidebar_data: SidebarData, remaining: int = None) -> QuotaPlan:
+  """
+  Work out how many characters synthesizing the lines will bill once cache hits are subtracted.
+  Cached lines are free and go first, the rest are taken in dialogue order until the remaining
+  characters run out and anything after that is deferred until the quota resets.
+  """
+  plan = QuotaPlan(remaining_characters=remaining)
+  for line in sorted(lines, key=lambda x: x.line):
+    if tts_cache.contains(line_key(line, sidebar_data)):
+      plan.cached.append(line)
+      continue
+    characters = billed_characters(line)
+    if plan.deferred or (remaining is not None and plan.billed_characters + characters > remaining):
+      plan.deferred.append(line)
+      plan.deferred_characters += characters
+      continue
+    plan.lines.append(line)
+    plan.billed_characters += characters
+  plan.lines = plan.cached + plan.lines
+  return plan
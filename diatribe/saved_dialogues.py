@@ -1,13 +1,14 @@
-import os, json, shutil
+import os, shutil
 import streamlit as st
-from diatribe.dialogues import Character, Dialogue, load_dialogues_with_names, convert_dialogue_import_into_details
+from diatribe.dialogues import Character, Dialogue, convert_dialogue_import_into_details, dumps_dialogue_details
+from diatribe.catalog import SaveEntry, load_dialogues_with_names, load_saved_dialogue
 from dataclasses import dataclass
 from elevenlabs import Voice
 from diatribe.el_audio import import_audio
 
 @dataclass
 class SavedDialogueData:
-  saved_dialogues: dict
+  saved_dialogues: dict[str, SaveEntry]
   selected_save_name: str
   save_dialogue_name: str
   save_dialogue: bool
@@ -26,31 +27,31 @@ def on_load_saved() -> None:
 def get_selected_characters(save_dialogue_data: SavedDialogueData) -> list[Character]:
   """Get the characters from the selected saved dialogue."""
   if save_dialogue_data.selected_save_name:
-    return save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name]["characters"]
+    return load_saved_dialogue(save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name])["characters"]
   return []
 
 def get_selected_dialogue(save_dialogue_data: SavedDialogueData) -> list[Dialogue]:
   """Get the dialogue from the selected saved dialogue."""
   if save_dialogue_data.selected_save_name:
-    return save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name]["dialogue"]
+    return load_saved_dialogue(save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name])["dialogue"]
   return []
 
 def get_selected_plot(save_dialogue_data: SavedDialogueData) -> str:
   """Get the plot from the selected saved dialogue."""
   if save_dialogue_data.selected_save_name:
-    return save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name]["plot"]
+    return load_saved_dialogue(save_dialogue_data.saved_dialogues[save_dialogue_data.selected_save_name])["plot"]
   return None
 
 def save_imported_dialogue(data: bytes, voices: list[Voice], file_id: str, import_name: str) -> None:
   uploaded_string = data.decode("utf-8")
   dialogue_details = convert_dialogue_import_into_details(uploaded_string, voices)
   if dialogue_details:
-    data = json.dumps(dialogue_details, indent=2)
+    data = dumps_dialogue_details(dialogue_details)
     import_name = import_name.replace(".txt", ".json")
     
     import_path = f"./session/{st.session_state.session_id}/saves/{import_name}"
     os.makedirs(os.path.dirname(import_path), exist_ok=True)                            
-    with open(import_path, "w") as f:
+    with open(import_path, "w", encoding="utf-8") as f:
       f.write(data)
       st.session_state["imported_file"] = file_id
       st.toast("Dialogue has been uploaded. You will have to click refresh to see it.", icon="👍")  
@@ -159,7 +160,8 @@ def create_saved_dialogues(voices: list[Voice]):
           if st.session_state["export_type"] == "export":
             file_name = f"{download_dialogue_name}.txt"
             mime = "plain/txt"
-            read_type = "r"
+            # the export is written as UTF-8, so hand the bytes over as they are
+            read_type = "rb"
           else:
             file_name = f"{download_dialogue_name}.zip" 
             mime = "application/zip"
@@ -0,0 +1,149 @@
+import os, re, json, math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable
+from jsonschema import validate
+from diatribe.dialogues import Character, CharacterRegistry
+from diatribe.generate import generate_dialogue, parse_dialogue_rows, generate_dialogue_input_prompt, generate_plot_input_prompt
+from diatribe.sidebar import SidebarData
+from diatribe.prompts import load_prompt
+from diatribe.utils import log
+
+SCENE_LINES = int(os.getenv("DIATRIBE_SCENE_LINES", "25"))
+SCENE_CONCURRENCY = int(os.getenv("DIATRIBE_SCENE_CONCURRENCY", "4"))
+SCENE_ATTEMPTS = 2
+# the summaries of the latest scenes are kept whole, earlier scenes are cut to their first sentence
+ROLLING_SCENES = 3
+
+openai_outline_schema = {
+  "type": "object",
+  "properties": {
+    "scenes": {
+      "type": "array",
+      "items": {
+        "type": "object",
+        "properties": {
+          "Scene": {
+            "type": "integer"
+          },
+          "Summary": {
+            "type": "string"
+          }
+        },
+        "required": ["Summary"]
+      }
+    }
+  },
+  "required": ["scenes"]
+}
+
+@dataclass
+class Scene:
+  number: int
+  summary: str
+  lines: int
+
+def load_outline_system_prompt() -> str:
+  """Load the scene outline system prompt from the file."""
+  return load_prompt("openai_scene_outline_system_prompt.txt")
+
+def load_scene_system_prompt() -> str:
+  """Load the scene system prompt from the file."""
+  return load_prompt("openai_scene_system_prompt.txt")
+
+def generate_outline_input_prompt(characters: list[Character], number_of_lines: int, number_of_scenes: int, plot: str) -> str:
+  input_prompt = f"NUMBER OF SCENES:\n<Scenes>{number_of_scenes}</Scenes>\n\n\n"
+  input_prompt += generate_dialogue_input_prompt(characters, number_of_lines, plot)
+  return input_prompt
+
+def generate_scene_input_prompt(characters: list[Character], plot: str, scene: Scene, story_so_far: str, next_scene: Scene) -> str:
+  input_prompt = f"NUMBER OF LINES:\n<Lines>{scene.lines}</Lines>\n\n\n"
+  input_prompt += generate_plot_input_prompt(characters)
+  input_prompt += f"PLOT:\n<Plot>{plot}</Plot>\n\n\n"
+  input_prompt += f"STORY SO FAR:\n<Summary>{story_so_far}</Summary>\n\n\n"
+  input_prompt += f"THIS SCENE:\n<Summary>{scene.summary}</Summary>\n\n\n"
+  input_prompt += f"NEXT SCENE:\n<Summary>{next_scene.summary if next_scene else ''}</Summary>\n\n\n"
+  return input_prompt
+
+def first_sentence(text: str) -> str:
+  match = re.match(r".+?[.!?](\s|$)", text.strip())
+  return match.group(0).strip() if match else text.strip()
+
+def rolling_summary(scenes: list[Scene], index: int) -> str:
+  """Summarize the story before the scene at the index, with older scenes shortened so the prompt stays bounded."""
+  earlier = scenes[:index]
+  cutoff = len(earlier) - ROLLING_SCENES
+  return " ".join(first_sentence(s.summary) if i < cutoff else s.summary for i, s in enumerate(earlier))
+
+def parse_outline(content: str) -> list[str]:
+  """Parse and validate a scene outline response into the scene summaries."""
+  outline = json.loads(content)
+  validate(instance=outline, schema=openai_outline_schema)
+  summaries = [s["Summary"].strip() for s in outline["scenes"] if s["Summary"].strip()]
+  if not summaries:
+    raise ValueError("the scene outline has no scenes")
+  return summaries
+
+def plan_scenes(characters: list[Character], plot: str, number_of_lines: int, sidebar: SidebarData) -> list[Scene]:
+  """Split the plot into scenes with OpenAI and share the lines out evenly between them."""
+  number_of_scenes = max(1, math.ceil(number_of_lines / SCENE_LINES))
+  input_prompt = generate_outline_input_prompt(characters, number_of_lines, number_of_scenes, plot)
+  summaries = parse_outline(generate_dialogue(load_outline_system_prompt(), input_prompt, sidebar, parse_outline))
+  base, extra = divmod(number_of_lines, len(summaries))
+  scenes = [Scene(i + 1, summary, base + (1 if i < extra else 0)) for i, summary in enumerate(summaries)]
+  log(f"planned {len(scenes)} scenes for {number_of_lines} lines")
+  return scenes
+
+def generate_scene(
+  characters: list[Character],
+  plot: str,
+  scenes: list[Scene],
+  index: int,
+  sidebar: SidebarData
+) -> list[dict]:
+  """Generate and validate the rows of one scene, trying again if the response cannot be parsed."""
+  scene = scenes[index]
+  next_scene = scenes[index + 1] if index + 1 < len(scenes) else None
+  input_prompt = generate_scene_input_prompt(characters, plot, scene, rolling_summary(scenes, index), next_scene)
+  system_prompt = load_scene_system_prompt()
+  registry = CharacterRegistry(characters)
+  for attempt in range(1, SCENE_ATTEMPTS + 1):
+    try:
+      rows = parse_dialogue_rows(generate_dialogue(system_prompt, input_prompt, sidebar, parse_dialogue_rows))
+      return [
+        { "Speaker": row["Speaker"], "Text": row["Text"] }
+        for row in rows if row.get("Speaker") in registry and row.get("Text")
+      ]
+    except Exception as e:
+      log(f"scene {scene.number} attempt {attempt} failed: {e}")
+      if attempt == SCENE_ATTEMPTS:
+        raise
+
+def generate_long_dialogue(
+  characters: list[Character],
+  plot: str,
+  number_of_lines: int,
+  sidebar: SidebarData,
+  on_scene: Callable[[int, int], None] = None
+) -> (list[dict], list[Scene]):
+  """
+  Generate a long script one scene at a time. The plot is first split into scene summaries, then every
+  scene is written concurrently with only the summaries of the scenes before it as context, and the rows
+  are stitched back together in scene order.
+  """
+  scenes = plan_scenes(characters, plot, number_of_lines, sidebar)
+  results: dict[int, list[dict]] = {}
+  with ThreadPoolExecutor(max_workers=max(1, min(SCENE_CONCURRENCY, len(scenes)))) as executor:
+    futures = {executor.submit(generate_scene, characters, plot, scenes, i, sidebar): scene for i, scene in enumerate(scenes)}
+    try:
+      for completed, future in enumerate(as_completed(futures), 1):
+        results[futures[future].number] = future.result()
+        if on_scene:
+          on_scene(completed, len(scenes))
+    except Exception:
+      for pending in futures:
+        pending.cancel()
+      raise
+  rows = [row for scene in scenes for row in results[scene.number]]
+  log(f"generated {len(rows)} lines over {len(scenes)} scenes")
+  return rows, scenes
@@ -0,0 +1,180 @@
+import os, time, random, threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+from diatribe.utils import log
+
+T = TypeVar("T")
+
+# concurrent request limits for each ElevenLabs subscription tier
+TIER_CONCURRENCY = {
+  "free": 2,
+  "starter": 3,
+  "creator": 5,
+  "pro": 10,
+  "scale": 15,
+  "business": 15
+}
+DEFAULT_CONCURRENCY = 2
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+@dataclass
+class SchedulerStats:
+  requests: int
+  retries: int
+  throttled: int
+  failures: int
+  concurrency: int
+  in_flight: int
+  average_latency: float
+  p95_latency: float
+
+def concurrency_for_tier(tier: str) -> int:
+  """Get the number of concurrent requests allowed for a subscription tier."""
+  if not tier:
+    return DEFAULT_CONCURRENCY
+  return TIER_CONCURRENCY.get(tier.split("_")[0].lower(), DEFAULT_CONCURRENCY)
+
+def status_code(error: Exception) -> int:
+  """Get the HTTP status code from an error raised by the speech API or its HTTP client, if there is one."""
+  code = getattr(error, "status_code", None)
+  if code is None:
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+  if code is None and "RateLimit" in error.__class__.__name__:
+    code = 429
+  if code is None and "too_many_concurrent_requests" in str(error):
+    code = 429
+  return code
+
+class RequestScheduler:
+  """
+  Paces requests to the speech API with a token bucket, keeps the number in flight within the account's
+  concurrency allowance, and retries throttled or failed requests with jittered exponential backoff.
+  """
+
+  def __init__(
+    self,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate: float = float(os.getenv("DIATRIBE_TTS_RATE", "5")),
+    max_retries: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0
+  ) -> None:
+    self.concurrency = concurrency
+    self.rate = rate
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self._condition = threading.Condition()
+    self._in_flight = 0
+    self._tokens = float(concurrency)
+    self._refilled = time.monotonic()
+    self._latencies: deque[float] = deque(maxlen=500)
+    self._requests = 0
+    self._retries = 0
+    self._throttled = 0
+    self._failures = 0
+
+  def set_concurrency(self, concurrency: int) -> None:
+    """Update the concurrency allowance, for example after the subscription tier is known."""
+    with self._condition:
+      if concurrency != self.concurrency:
+        log(f"speech request concurrency set to {concurrency}")
+      self.concurrency = max(1, concurrency)
+      self._condition.notify_all()
+
+  def _take_token(self) -> float:
+    """Take a token if one is available, otherwise return how long until the next one."""
+    now = time.monotonic()
+    self._tokens = min(float(self.concurrency), self._tokens + (now - self._refilled) * self.rate)
+    self._refilled = now
+    if self._tokens >= 1:
+      self._tokens -= 1
+      return 0
+    return (1 - self._tokens) / self.rate
+
+  @contextmanager
+  def slot(self):
+    """Wait for a free concurrency slot and a rate token, recording the latency of the work done while holding it."""
+    with self._condition:
+      while True:
+        if self._in_flight < self.concurrency:
+          wait = self._take_token()
+          if wait == 0:
+            break
+        else:
+          wait = None
+        self._condition.wait(wait)
+      self._in_flight += 1
+      self._requests += 1
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      latency = time.perf_counter() - start
+      with self._condition:
+        self._in_flight -= 1
+        self._latencies.append(latency)
+        self._condition.notify()
+
+  def retry(self, fn: Callable[[], T]) -> T:
+    """Call fn, retrying with jittered exponential backoff when the API throttles or has a server error."""
+    attempt = 0
+    while True:
+      try:
+        return fn()
+      except Exception as e:
+        code = status_code(e)
+        if code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+          with self._condition:
+            self._failures += 1
+          raise
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+        with self._condition:
+          self._retries += 1
+          if code == 429:
+            self._throttled += 1
+        log(f"speech request returned {code}, retrying in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+        time.sleep(delay)
+        attempt += 1
+
+  def request(self, fn: Callable[[], T]) -> T:
+    """Call fn inside a scheduled slot with retries, releasing the slot while backing off."""
+    def attempt() -> T:
+      with self.slot():
+        return fn()
+    return self.retry(attempt)
+
+  def stats(self) -> SchedulerStats:
+    with self._condition:
+      latencies = sorted(self._latencies)
+      return SchedulerStats(
+        self._requests,
+        self._retries,
+        self._throttled,
+        self._failures,
+        self.concurrency,
+        self._in_flight,
+        sum(latencies) / len(latencies) if latencies else 0,
+        latencies[int(len(latencies) * 0.95)] if latencies else 0
+      )
+
+class SchedulerRegistry:
+  """One scheduler for each ElevenLabs API key, since the concurrency allowance belongs to the account and not the process."""
+
+  def __init__(self) -> None:
+    self._schedulers: dict[str, RequestScheduler] = {}
+    self._lock = threading.Lock()
+
+  def get(self, api_key: str) -> RequestScheduler:
+    """Get the scheduler for the API key, created with the default allowance until the account's tier is known."""
+    with self._lock:
+      scheduler = self._schedulers.get(api_key)
+      if scheduler is None:
+        scheduler = RequestScheduler()
+        self._schedulers[api_key] = scheduler
+      return scheduler
+
+tts_schedulers = SchedulerRegistry()
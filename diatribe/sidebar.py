@@ -2,8 +2,13 @@ import os, diatribe.el_audio as el_audio, diatribe.utils as utils, datetime
 import streamlit as st
 from elevenlabs import Voice, User, set_api_key
 from dataclasses import dataclass
-from openai import OpenAI
 from streamlit_js_eval import streamlit_js_eval
+from diatribe.tts_cache import tts_cache
+from diatribe.completion_cache import completion_cache
+from diatribe.scheduler import tts_schedulers, concurrency_for_tier
+from diatribe.clients import clients, eleven_get
+
+USAGE_TTL_SECONDS = 300
 
 @dataclass
 class SidebarData:
@@ -18,14 +23,18 @@ class SidebarData:
   simarlity_boost: float
   style: float
   join_gap: int  
+  synthesis_concurrency: int
+  enable_streaming: bool
   openai_api_key: str
   openai_model: str
   openai_temp: float
   openai_max_tokens: int
+  openai_cache: bool
 
-def get_usage_percent() -> dict:
-  """Get the character usage percent from the Eleven Labs API."""
-  user_info = User.from_api()
+@st.cache_data(ttl=USAGE_TTL_SECONDS, show_spinner=False)
+def get_usage_percent(el_key: str) -> dict:
+  """Get the character usage percent from the Eleven Labs API, refreshed at most once per TTL for each API key."""
+  user_info = User(**eleven_get("/user", el_key))
   percent = user_info.subscription.character_count / user_info.subscription.character_limit * 100
   resets = user_info.subscription.next_character_count_reset_unix
   resets = datetime.datetime.fromtimestamp(resets).strftime("%m/%d")
@@ -33,7 +42,8 @@ def get_usage_percent() -> dict:
     "usage": percent,
     "reset": resets,
     "count": user_info.subscription.character_count,
-    "limit": user_info.subscription.character_limit
+    "limit": user_info.subscription.character_limit,
+    "tier": getattr(user_info.subscription, "tier", None)
   }
 
 def get_voice_by_name(name: str, voices: list[Voice]) -> Voice:
@@ -76,7 +86,7 @@ def voice_names_with_filter(
 @st.cache_data
 def get_models(openai_api_key: str) -> list[str]:
   """Get a list of OpenAI models."""
-  client = OpenAI(api_key=openai_api_key)
+  client = clients.openai(openai_api_key)
   response = client.models.list()
   model_ids = [m.id for m in response.data]
   return sorted(model_ids)
@@ -146,7 +156,19 @@ def create_sidebar() -> SidebarData:
           step=10,
           value=200,
           help="The gap between spoken lines in milliseconds."
-        )        
+        )
+        synthesis_concurrency = st.slider(
+          "Concurrent Requests",
+          1,
+          10,
+          value=4,
+          help="How many dialogue lines are generated at the same time. Lower this if your subscription has a small concurrency limit."
+        )
+        enable_streaming = st.toggle(
+          "Enable Streaming",
+          value=True,
+          help="Streams the dialogue and the speech as they are generated, showing each line as soon as its text or audio is ready instead of waiting for the whole dialogue."
+        )
       
       with st.expander("OpenAI Options"):
         openai_api_key = st.text_input("API Key _(optional)_", os.getenv("OPENAI_API_KEY"), type="password")
@@ -159,10 +181,17 @@ def create_sidebar() -> SidebarData:
           openai_model = st.selectbox("Model", openai_models, index=gpt4_index)
           openai_temp = st.slider("Temperature", 0.0, 1.5, 1.3, 0.1,  help="The higher the temperature, the more creative the text.")
           openai_max_tokens = st.slider("Max Tokens", 1024, 10000, 3072, 1024, help="Check the official documentation on maximum token size for the selected model.")
+          openai_cache = st.toggle(
+            "Reuse Identical Responses",
+            value=True,
+            disabled=not completion_cache.cacheable(openai_temp),
+            help="At a temperature of 0, reuses the response to an identical earlier request instead of asking OpenAI again. At higher temperatures every request gets a new response."
+          )
         else:
           openai_model = None
           openai_temp = None
           openai_max_tokens = None
+          openai_cache = False
       
       
       with st.expander("Voice Explorer"):
@@ -197,11 +226,27 @@ def create_sidebar() -> SidebarData:
           st.markdown(f"_Voice ID: {el_voice_id}_") 
       
       with st.expander("Usage"):
-        usage = get_usage_percent()
+        usage = get_usage_percent(el_key)
         st.markdown(f"**Character Percent:** {usage['usage']:.1f}%")
         st.markdown(f"**Character Count:** {usage['count']:,}")
         st.markdown(f"**Character Limit:** {usage['limit']:,}")
         st.markdown(f"**Reset:** {usage['reset']}")
+        scheduler = tts_schedulers.get(el_key)
+        scheduler.set_concurrency(concurrency_for_tier(usage["tier"]))
+        scheduler_stats = scheduler.stats()
+        st.markdown(f"**Concurrency Allowance:** {scheduler_stats.concurrency}")
+        st.markdown(f"**Request Latency:** {scheduler_stats.average_latency:.2f}s avg, {scheduler_stats.p95_latency:.2f}s p95")
+        st.markdown(f"**Retries/Throttled:** {scheduler_stats.retries:,}/{scheduler_stats.throttled:,}")
+        cache_stats = tts_cache.stats()
+        st.markdown(f"**Cached Lines:** {cache_stats.entries:,} ({cache_stats.size_bytes / 1024 / 1024:.1f} MB)")
+        st.markdown(f"**Cache Hits/Misses:** {cache_stats.hits:,}/{cache_stats.misses:,}")
+        completion_stats = completion_cache.stats()
+        st.markdown(f"**Cached Responses:** {completion_stats.entries:,} ({completion_stats.hits:,} hits, {completion_stats.misses:,} misses)")
+        for pool in clients.stats():
+          st.markdown(
+            f"**{pool.name} Connections:** {pool.connections:,} opened for {pool.requests:,} requests "
+            f"({pool.reused:,} reused{', HTTP/2' if pool.http2 else ''})"
+          )
       
       clear_dialogue = st.button("Clear Dialogue", help=":warning: Clear everything and start over. :warning:", use_container_width=True)
       if clear_dialogue:
@@ -219,10 +264,13 @@ def create_sidebar() -> SidebarData:
         simarlity_boost=simarlity_boost,
         style=style,
         join_gap=join_gap,
+        synthesis_concurrency=synthesis_concurrency,
+        enable_streaming=enable_streaming,
         openai_api_key=openai_api_key,
         openai_model=openai_model,
         openai_temp=openai_temp,
-        openai_max_tokens=openai_max_tokens
+        openai_max_tokens=openai_max_tokens,
+        openai_cache=openai_cache
       )
     else:
       return SidebarData(
@@ -237,10 +285,13 @@ def create_sidebar() -> SidebarData:
         simarlity_boost=0.80,
         style=0.0,
         join_gap=200,
+        synthesis_concurrency=4,
+        enable_streaming=True,
         openai_api_key="",
         openai_model="",
         openai_temp=1.5,
-        openai_max_tokens=4096
+        openai_max_tokens=4096,
+        openai_cache=False
       )   
 
   
\ No newline at end of file
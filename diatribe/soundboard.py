@@ -0,0 +1,151 @@
+import threading, functools
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+from pydub import AudioSegment as seg
+from pedalboard import Pedalboard, Compressor, Chorus, Reverb, Distortion, NoiseGate, Limiter
+from diatribe.utils import log
+
+MAX_CONFIGURATIONS = 32
+MAX_IDLE_BOARDS = 4
+
+@dataclass(frozen=True)
+class Soundboard:
+  compressor_threshold_db: float = 0
+  compressor_ratio: float = 0
+  chorus_rate_hz: float = 0
+  chorus_depth: float = 0
+  chorus_centre_delay: float = 0
+  chorus_feedback: float = 0
+  reverb_room_size: float = 0
+  reverb_damping: float = 0
+  reverb_web_level: float = 0
+  reverb_dry_level: float = 0
+  distortion_db: float = 0
+  noise_gate_threshold_db: float = 0
+  noise_gate_ratio: float = 0
+  limiter_threshold_db: float = 0
+
+NORMALIZATION_SOUNDBOARD = Soundboard(compressor_threshold_db=-18, compressor_ratio=3, limiter_threshold_db=-3)
+
+def build_pedals(soundboard: Soundboard) -> list:
+  """Build the pedalboard plugins enabled by the soundboard."""
+  pedals = []
+  if soundboard.distortion_db != 0:
+    pedals.append(Distortion(
+      drive_db=soundboard.distortion_db
+    ))
+  if soundboard.chorus_rate_hz != 0:
+    pedals.append(Chorus(
+      rate_hz=soundboard.chorus_rate_hz,
+      depth=soundboard.chorus_depth,
+      centre_delay_ms=soundboard.chorus_centre_delay,
+      feedback=soundboard.chorus_feedback
+    ))
+  if soundboard.reverb_room_size != 0:
+    pedals.append(Reverb(
+      room_size=soundboard.reverb_room_size,
+      damping=soundboard.reverb_damping,
+      wet_level=soundboard.reverb_web_level,
+      dry_level=soundboard.reverb_dry_level
+    ))
+  if soundboard.noise_gate_threshold_db != 0:
+    pedals.append(NoiseGate(
+      threshold_db=soundboard.noise_gate_threshold_db,
+      ratio=soundboard.noise_gate_ratio
+    ))
+  if soundboard.limiter_threshold_db != 0:
+    pedals.append(Limiter(
+      threshold_db=soundboard.limiter_threshold_db
+    ))
+  if soundboard.compressor_threshold_db != 0:
+    pedals.append(Compressor(
+      threshold_db=soundboard.compressor_threshold_db,
+      ratio=soundboard.compressor_ratio)
+  )
+  return pedals
+
+@functools.lru_cache(maxsize=128)
+def pedal_names(soundboard: Soundboard) -> tuple[str]:
+  """Get the names of the effects the soundboard enables."""
+  return tuple(pedal.__class__.__name__ for pedal in build_pedals(soundboard))
+
+class PedalboardCache:
+  """
+  Keeps built pedalboards for recently used soundboard settings. A pedalboard holds the state of its
+  effects, so each one is lent to a single caller at a time and callers reset it on their first buffer.
+  """
+
+  def __init__(self, max_configurations: int = MAX_CONFIGURATIONS, max_idle: int = MAX_IDLE_BOARDS) -> None:
+    self.max_configurations = max_configurations
+    self.max_idle = max_idle
+    self.built = 0
+    self.reused = 0
+    self._idle: OrderedDict[Soundboard, list[Pedalboard]] = OrderedDict()
+    self._lock = threading.Lock()
+
+  def _take(self, soundboard: Soundboard) -> Pedalboard:
+    with self._lock:
+      boards = self._idle.get(soundboard)
+      if boards:
+        self._idle.move_to_end(soundboard)
+        self.reused += 1
+        return boards.pop()
+      self.built += 1
+    return Pedalboard(build_pedals(soundboard))
+
+  def _give_back(self, soundboard: Soundboard, board: Pedalboard) -> None:
+    with self._lock:
+      boards = self._idle.setdefault(soundboard, [])
+      self._idle.move_to_end(soundboard)
+      if len(boards) < self.max_idle:
+        boards.append(board)
+      while len(self._idle) > self.max_configurations:
+        self._idle.popitem(last=False)
+
+  @contextmanager
+  def borrow(self, soundboard: Soundboard) -> Iterator[Pedalboard]:
+    """Lend a pedalboard for the soundboard, or None when the soundboard has no effects enabled."""
+    if soundboard is None or not pedal_names(soundboard):
+      yield None
+      return
+    board = self._take(soundboard)
+    try:
+      yield board
+    finally:
+      self._give_back(soundboard, board)
+
+  def clear(self) -> None:
+    with self._lock:
+      self._idle.clear()
+    log("cleared pedalboard cache")
+
+pedalboard_cache = PedalboardCache()
+
+def pcm_to_float(raw_data: bytes, sample_width: int, channels: int) -> np.ndarray:
+  """Convert interleaved PCM bytes into a float32 (channels, frames) array in the range -1 to 1."""
+  if sample_width == 1:
+    samples = (np.frombuffer(raw_data, dtype=np.uint8).astype(np.float32) - 128) / 128
+  else:
+    dtype = np.int16 if sample_width == 2 else np.int32
+    samples = np.frombuffer(raw_data, dtype=dtype).astype(np.float32) / float(np.iinfo(dtype).max + 1)
+  return samples.reshape(-1, channels).T
+
+def float_to_pcm(samples: np.ndarray, sample_width: int) -> bytes:
+  """Convert a float (channels, frames) array back into interleaved PCM bytes."""
+  samples = np.clip(samples.T, -1.0, 1.0)
+  if sample_width == 1:
+    return (samples * 127 + 128).astype(np.uint8).tobytes()
+  dtype = np.int16 if sample_width == 2 else np.int32
+  return (samples * np.iinfo(dtype).max).astype(dtype).tobytes()
+
+def apply_soundboard(audio: seg, soundboard: Soundboard) -> (seg, list[str]):
+  """Apply the soundboard to the audio."""
+  with pedalboard_cache.borrow(soundboard) as board:
+    if board is None:
+      return audio, []
+    samples = board(pcm_to_float(audio.raw_data, audio.sample_width, audio.channels), audio.frame_rate, reset=True)
+  new_audio = audio._spawn(float_to_pcm(samples, audio.sample_width))
+  return new_audio, list(pedal_names(soundboard))
@@ -0,0 +1,106 @@
+import time
+import diatribe.el_audio as el_audio
+import diatribe.manifest as manifest
+import diatribe.quota as quota
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable
+from diatribe.dialogues import Dialogue
+from diatribe.sidebar import SidebarData
+from diatribe.utils import log
+
+@dataclass
+class SynthesisResult:
+  audio_files: list[str] = field(default_factory=list)
+  failed_line: Dialogue = None
+  deferred: list[Dialogue] = field(default_factory=list)
+  error: Exception = None
+  elapsed: float = 0
+
+def synthesize_dialogue(
+  dialogue: list[Dialogue],
+  sidebar_data: SidebarData,
+  audio_dir: str,
+  max_workers: int = 4,
+  on_progress: Callable[[int, int, Dialogue], None] = None
+) -> SynthesisResult:
+  """
+  Generate the audio for the dialogue lines with a bounded number of concurrent requests.
+  The progress callback runs on the calling thread as each line completes, so it is safe to update streamlit elements from it.
+  The first failure stops any lines that have not started yet and is reported on the result.
+  """
+  result = SynthesisResult()
+  completed: dict[int, str] = {}
+  start = time.perf_counter()
+  log(f"synthesizing {len(dialogue)} lines with {max_workers} concurrent requests")
+
+  with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+    futures = {
+      executor.submit(
+        el_audio.generate_and_save,
+        line.text,
+        line.character.voice_id,
+        line.line,
+        sidebar_data,
+        audio_dir
+      ): line
+      for line in dialogue
+    }
+    for future in as_completed(futures):
+      line = futures[future]
+      if future.cancelled():
+        continue
+      try:
+        completed[line.line] = future.result()
+      except Exception as e:
+        log(e)
+        if result.failed_line is None or line.line < result.failed_line.line:
+          result.failed_line = line
+          result.error = e
+        for pending in futures:
+          pending.cancel()
+        continue
+      if on_progress and result.failed_line is None:
+        on_progress(len(completed), len(dialogue), line)
+
+  result.audio_files = [completed[line.line] for line in dialogue if line.line in completed]
+  result.elapsed = time.perf_counter() - start
+  log(f"synthesized {len(result.audio_files)} lines in {result.elapsed:.2f}s")
+  return result
+
+def resynthesize_dialogue(
+  dialogue: list[Dialogue],
+  sidebar_data: SidebarData,
+  audio_dir: str,
+  max_workers: int = 4,
+  on_progress: Callable[[int, int, Dialogue], None] = None,
+  remaining_characters: int = None
+) -> SynthesisResult:
+  """
+  Only synthesize the lines whose text, speaker or voice settings changed since the audio was last generated.
+  Line files for rows that moved because of inserted or deleted rows are renamed instead of regenerated.
+  Lines that would bill more than the remaining characters are deferred and left without audio.
+  """
+  plan = manifest.plan_resynthesis(dialogue, sidebar_data, audio_dir)
+  manifest.apply_plan(plan, audio_dir)
+  quota_plan = quota.plan_quota(plan.synthesize, sidebar_data, remaining_characters)
+  if quota_plan.deferred:
+    log(f"deferring {len(quota_plan.deferred)} lines ({quota_plan.deferred_characters:,} characters) that do not fit the remaining quota")
+  reused = len(dialogue) - len(plan.synthesize)
+  total = len(dialogue) - len(quota_plan.deferred)
+
+  def report(completed: int, _: int, line: Dialogue) -> None:
+    if on_progress:
+      on_progress(reused + completed, total, line)
+
+  result = synthesize_dialogue(quota_plan.lines, sidebar_data, audio_dir, max_workers, report)
+  result.deferred = quota_plan.deferred
+  generated = {line.line for line in plan.synthesize}
+  synthesized = set(result.audio_files)
+  available = [
+    line for line in dialogue
+    if line.line not in generated or f"{audio_dir}/line{line.line}.mp3" in synthesized
+  ]
+  manifest.save_manifest(audio_dir, {line.line: manifest.manifest_entry(line, sidebar_data) for line in available})
+  result.audio_files = [f"{audio_dir}/line{line.line}.mp3" for line in available]
+  return result
@@ -0,0 +1,121 @@
+import os, shutil
+from dataclasses import asdict
+import diatribe.el_audio as el_audio
+import diatribe.generate as generate
+from diatribe.dialogues import Character, CharacterRegistry, Dialogue
+from diatribe.jobs import JobContext
+from diatribe.sidebar import SidebarData
+from diatribe.synthesis import resynthesize_dialogue
+from diatribe.batch_edit import BatchPreset, apply_preset
+from diatribe.pipeline import run_pipeline
+from diatribe.scenes import generate_long_dialogue, rolling_summary
+
+def synthesize_task(
+  context: JobContext,
+  dialogue: list[Dialogue],
+  sidebar_data: SidebarData,
+  audio_dir: str,
+  max_workers: int,
+  remaining_characters: int = None
+) -> dict:
+  """Generate the changed dialogue lines, publishing each line number as its audio becomes ready."""
+  ready_lines: list[int] = []
+
+  def on_line_ready(completed: int, total: int, line: Dialogue) -> None:
+    ready_lines.append(line.line)
+    context.update(ready_lines=list(ready_lines))
+    context.progress(completed, total)
+
+  result = resynthesize_dialogue(dialogue, sidebar_data, audio_dir, max_workers, on_line_ready, remaining_characters)
+  failed = None
+  if result.failed_line:
+    line = result.failed_line
+    failed = f"{line.character.name} with the voice {line.character.voice} (voice_id: {line.character.voice_id})"
+  return {
+    "audio_files": result.audio_files,
+    "failed": failed,
+    "deferred_lines": [line.line for line in result.deferred],
+    "elapsed": result.elapsed
+  }
+
+def join_task(context: JobContext, audio_files: list[str], output_file: str, join_gap: int, normalize: bool) -> str:
+  """Join the line audio into the final dialogue."""
+  el_audio.join_audio_files(audio_files, output_file, join_gap, normalize, context.progress)
+  return output_file
+
+def background_task(
+  context: JobContext,
+  background_file: str,
+  dialogue_file: str,
+  output_file: str,
+  fade_in: bool,
+  fade_out: bool,
+  lower_db: int,
+  normalize: bool
+) -> str:
+  """Mix background audio under the final dialogue."""
+  el_audio.mix_background_audio(background_file, dialogue_file, output_file, fade_in, fade_out, lower_db, normalize)
+  return output_file
+
+def project_task(context: JobContext, audio_dir: str, export_dir: str, project_dir: str) -> str:
+  """Bundle the exported dialogue and line audio into a project zip."""
+  el_audio.export_audio_files(audio_dir, f"{export_dir}/audio")
+  context.progress(1, 2, "Zipping project...")
+  os.makedirs(project_dir, exist_ok=True)
+  return shutil.make_archive(f"{project_dir}/project", "zip", export_dir)
+
+def batch_edit_task(context: JobContext, audio_files: list[str], preset: BatchPreset) -> dict:
+  """Apply the same edits to many line files on the process pool."""
+  result = apply_preset(audio_files, preset, context.progress)
+  return {
+    "audio_files": result.audio_files,
+    "failed": result.failed,
+    "elapsed": result.elapsed,
+    "lines_per_second": result.lines_per_second,
+    "realtime_factor": result.realtime_factor
+  }
+
+def pipeline_task(
+  context: JobContext,
+  system_prompt: str,
+  input_prompt: str,
+  characters: list[Character],
+  sidebar_data: SidebarData,
+  audio_dir: str,
+  max_workers: int,
+  expected_lines: int
+) -> dict:
+  """Generate the dialogue and voice each line as soon as it is written, publishing the rows and ready lines as they arrive."""
+  ready_lines: list[int] = []
+
+  def on_row(rows: list[dict]) -> None:
+    context.update(rows=list(rows))
+
+  def on_line_ready(completed: int, line: Dialogue) -> None:
+    ready_lines.append(line.line)
+    context.update(ready_lines=list(ready_lines))
+    context.progress(completed, max(expected_lines, completed))
+
+  rows = generate.generate_dialogue_rows(system_prompt, input_prompt, sidebar_data)
+  result = run_pipeline(rows, CharacterRegistry(characters), sidebar_data, audio_dir, max_workers, on_row, on_line_ready)
+  failed = None
+  if result.failed_line:
+    line = result.failed_line
+    failed = f"{line.character.name} with the voice {line.character.voice} (voice_id: {line.character.voice_id})"
+  return {
+    "rows": result.rows,
+    "audio_files": result.audio_files,
+    "failed": failed,
+    "metrics": asdict(result.metrics)
+  }
+
+def scenes_task(context: JobContext, characters: list[Character], plot: str, number_of_lines: int, sidebar_data: SidebarData) -> dict:
+  """Generate a long script scene by scene, reporting each finished scene."""
+  def on_scene(completed: int, total: int) -> None:
+    context.progress(completed, total, f"Writing scenes ({completed}/{total})...")
+
+  rows, scenes = generate_long_dialogue(characters, plot, number_of_lines, sidebar_data, on_scene)
+  return {
+    "rows": rows,
+    "summary": rolling_summary(scenes, len(scenes))
+  }
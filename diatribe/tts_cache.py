@@ -0,0 +1,28 @@
+import os
+from diatribe.disk_cache import DiskCache
+
+DEFAULT_CACHE_DIR = "./cache/tts"
+DEFAULT_MAX_BYTES = int(os.getenv("DIATRIBE_TTS_CACHE_MB", "512")) * 1024 * 1024
+
+class TTSCache(DiskCache):
+  """A content addressed cache of generated speech shared by every session."""
+
+  SUFFIX = ".mp3"
+  NAME = "speech"
+
+  def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+    super().__init__(cache_dir, max_bytes)
+
+  @staticmethod
+  def make_key(
+    text: str,
+    voice_id: str,
+    model_id: str,
+    stability: float,
+    similarity_boost: float,
+    style: float
+  ) -> str:
+    """Hash everything that changes the generated speech into a cache key."""
+    return DiskCache.hash_request(text, voice_id, model_id, stability, similarity_boost, style)
+
+tts_cache = TTSCache()
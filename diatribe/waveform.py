@@ -0,0 +1,200 @@
+import os, io, threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from matplotlib.figure import Figure
+from pydub import AudioSegment as seg
+
+WAVEFORM_COLUMNS = 1200
+WAVEFORM_HEIGHT = 2
+WAVEFORM_CACHE_SIZE = 64
+PEAKS_SUFFIX = ".peaks"
+# samples per peak for each zoom level, every level is a whole multiple of the one before it
+PEAK_LEVELS = [256, 1024, 4096, 16384]
+
+# rendered images rather than figures, matplotlib figures must not be shared between sessions
+_waveform_cache: OrderedDict[tuple, (float, bytes)] = OrderedDict()
+_waveform_cache_lock = threading.Lock()
+
+@dataclass
+class Peaks:
+  frame_rate: int
+  frames: int
+  levels: dict[int, (np.ndarray, np.ndarray)]
+
+  @property
+  def duration(self) -> float:
+    return self.frames / self.frame_rate
+
+def pcm_array(raw_data: bytes, sample_width: int, channels: int) -> np.ndarray:
+  """Get interleaved PCM bytes as a (channels, frames) array."""
+  if sample_width == 1:
+    # 8 bit PCM is unsigned with silence at 128
+    samples = np.frombuffer(raw_data, dtype=np.uint8).astype(np.int16) - 128
+  else:
+    samples = np.frombuffer(raw_data, dtype={2: np.int16, 4: np.int32}[sample_width])
+  return samples.reshape(-1, channels).T
+
+def sample_array(audio: seg) -> np.ndarray:
+  """Get the samples of the audio as a (channels, frames) array without interleaving the channels."""
+  return pcm_array(audio.raw_data, audio.sample_width, audio.channels)
+
+def _reduce(mins: np.ndarray, maxs: np.ndarray, factor: int) -> (np.ndarray, np.ndarray):
+  channels, count = mins.shape
+  bins = -(-count // factor)
+  padding = ((0, 0), (0, bins * factor - count))
+  mins = np.pad(mins, padding, mode="edge").reshape(channels, bins, factor)
+  maxs = np.pad(maxs, padding, mode="edge").reshape(channels, bins, factor)
+  return mins.min(axis=2), maxs.max(axis=2)
+
+class PeakBuilder:
+  """Build multi resolution peaks from audio that arrives in chunks."""
+
+  def __init__(self, channels: int, frame_rate: int) -> None:
+    self.frame_rate = frame_rate
+    self.frames = 0
+    self._channels = channels
+    self._remainder = None
+    self._mins: list[np.ndarray] = []
+    self._maxs: list[np.ndarray] = []
+
+  def add(self, samples: np.ndarray) -> None:
+    """Add (channels, frames) samples."""
+    self.frames += samples.shape[1]
+    if self._remainder is not None:
+      samples = np.concatenate([self._remainder, samples], axis=1)
+    base = PEAK_LEVELS[0]
+    usable = samples.shape[1] // base * base
+    if usable:
+      bins = samples[:, :usable].reshape(self._channels, -1, base)
+      self._mins.append(bins.min(axis=2))
+      self._maxs.append(bins.max(axis=2))
+    self._remainder = samples[:, usable:] if usable < samples.shape[1] else None
+
+  def finish(self) -> Peaks:
+    if self._remainder is not None:
+      self._mins.append(self._remainder.min(axis=1, keepdims=True))
+      self._maxs.append(self._remainder.max(axis=1, keepdims=True))
+      self._remainder = None
+    if not self._mins:
+      empty = np.zeros((self._channels, 1), dtype=np.int16)
+      self._mins, self._maxs = [empty], [empty]
+    mins, maxs = np.concatenate(self._mins, axis=1), np.concatenate(self._maxs, axis=1)
+    levels = {PEAK_LEVELS[0]: (mins, maxs)}
+    for previous, level in zip(PEAK_LEVELS, PEAK_LEVELS[1:]):
+      mins, maxs = _reduce(mins, maxs, level // previous)
+      levels[level] = (mins, maxs)
+    return Peaks(self.frame_rate, self.frames, levels)
+
+def peaks_for_audio(audio: seg) -> Peaks:
+  """Build multi resolution peaks for decoded audio."""
+  builder = PeakBuilder(audio.channels, audio.frame_rate)
+  builder.add(sample_array(audio))
+  return builder.finish()
+
+def peaks_path(audio_file: str) -> str:
+  return os.path.splitext(audio_file)[0] + PEAKS_SUFFIX
+
+def write_peaks(audio_file: str, peaks: Peaks) -> None:
+  """Write the peaks next to the audio file, tagged with the audio's size and mtime."""
+  stat = os.stat(audio_file)
+  arrays = {}
+  for level, (mins, maxs) in peaks.levels.items():
+    arrays[f"min_{level}"] = mins
+    arrays[f"max_{level}"] = maxs
+  with open(peaks_path(audio_file), "wb") as f:
+    np.savez(
+      f,
+      info=np.array([peaks.frame_rate, peaks.frames, stat.st_size, stat.st_mtime_ns], dtype=np.int64),
+      **arrays
+    )
+
+def load_peaks(audio_file: str) -> Peaks:
+  """Load the peaks written for the audio file, or None if they are missing or the audio changed since."""
+  try:
+    stat = os.stat(audio_file)
+    with np.load(peaks_path(audio_file)) as data:
+      frame_rate, frames, size, mtime_ns = (int(x) for x in data["info"])
+      if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+        return None
+      levels = {level: (data[f"min_{level}"], data[f"max_{level}"]) for level in PEAK_LEVELS}
+  except (OSError, KeyError, ValueError):
+    return None
+  return Peaks(frame_rate, frames, levels)
+
+def peak_envelope(samples: np.ndarray, columns: int = WAVEFORM_COLUMNS) -> (np.ndarray, np.ndarray):
+  """Reduce (channels, frames) samples to per column min and max values."""
+  channels, frames = samples.shape
+  columns = max(1, min(columns, frames))
+  if frames == 0:
+    empty = np.zeros((channels, 1), dtype=samples.dtype)
+    return empty, empty
+  # split the frames into equal sized bins, the last bin is padded with its own edge values
+  bin_size = -(-frames // columns)
+  padded = np.pad(samples, ((0, 0), (0, bin_size * columns - frames)), mode="edge")
+  bins = padded.reshape(channels, columns, bin_size)
+  return bins.min(axis=2), bins.max(axis=2)
+
+def render_envelope(mins: np.ndarray, maxs: np.ndarray, duration: float, y_max: float = None) -> (float, Figure):
+  """Draw the min/max envelope with one row per channel, returning the y limit used and the figure."""
+  channels, columns = mins.shape
+  if not y_max:
+    peak = float(max(np.abs(mins).max(), np.abs(maxs).max()))
+    y_max = peak * 1.05 if peak > 0 else 1.0
+  time_axis = np.linspace(0, duration, columns)
+  fig = Figure()
+  axes = fig.subplots(channels, 1, sharex=True, squeeze=False)[:, 0]
+  for channel, ax in enumerate(axes):
+    ax.axis("off")
+    ax.fill_between(time_axis, mins[channel], maxs[channel], linewidth=0.5)
+    ax.set_ylim(-y_max, y_max)
+  fig.set_figheight(WAVEFORM_HEIGHT)
+  return y_max, fig
+
+def render_waveform(audio: seg, y_max: float = None, columns: int = WAVEFORM_COLUMNS) -> (float, Figure):
+  """Render a waveform figure for decoded audio."""
+  mins, maxs = peak_envelope(sample_array(audio), columns)
+  return render_envelope(mins, maxs, audio.duration_seconds, y_max)
+
+def render_peaks(
+  peaks: Peaks,
+  y_max: float = None,
+  start: float = 0,
+  end: float = None,
+  columns: int = WAVEFORM_COLUMNS
+) -> (float, Figure):
+  """Render a waveform figure for a time window from precomputed peaks using the coarsest level that fills the columns."""
+  end = peaks.duration if end is None else min(end, peaks.duration)
+  start_frame = int(max(0, start) * peaks.frame_rate)
+  end_frame = max(start_frame + 1, int(end * peaks.frame_rate))
+  level = PEAK_LEVELS[0]
+  for candidate in PEAK_LEVELS:
+    if (end_frame - start_frame) / candidate >= columns:
+      level = candidate
+  mins, maxs = peaks.levels[level]
+  window = slice(start_frame // level, -(-end_frame // level))
+  mins, _ = peak_envelope(mins[:, window], columns)
+  _, maxs = peak_envelope(maxs[:, window], columns)
+  return render_envelope(mins, maxs, (end_frame - start_frame) / peaks.frame_rate, y_max)
+
+def figure_png(fig: Figure) -> bytes:
+  """Render the figure to PNG bytes."""
+  buffer = io.BytesIO()
+  fig.savefig(buffer, format="png", bbox_inches="tight")
+  return buffer.getvalue()
+
+def cached_waveform(path: str, options: tuple, render) -> (float, bytes):
+  """Return the waveform image for the file, rendering it only if the file or render options changed."""
+  stat = os.stat(path)
+  key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, options)
+  with _waveform_cache_lock:
+    if key in _waveform_cache:
+      _waveform_cache.move_to_end(key)
+      return _waveform_cache[key]
+  y_max, fig = render()
+  result = (y_max, figure_png(fig))
+  with _waveform_cache_lock:
+    _waveform_cache[key] = result
+    while len(_waveform_cache) > WAVEFORM_CACHE_SIZE:
+      _waveform_cache.popitem(last=False)
+  return result